@@ -13,6 +13,7 @@ TOPIC_SESSIONS="${TOPIC_SESSIONS:-station.sessions}"
 TOPIC_DECISIONS="${TOPIC_DECISIONS:-sop.decisions}"
 TOPIC_ACTIONS="${TOPIC_ACTIONS:-workflow.actions}"
 TOPIC_AUDIT="${TOPIC_AUDIT:-audit.events}"
+TOPIC_DEAD_LETTER="${TOPIC_DEAD_LETTER:-agents.dead_letter}"
 
 topics=(
   "$TOPIC_CLIPS"
@@ -21,6 +22,7 @@ topics=(
   "$TOPIC_DECISIONS"
   "$TOPIC_ACTIONS"
   "$TOPIC_AUDIT"
+  "$TOPIC_DEAD_LETTER"
 )
 
 PARTITIONS="${PARTITIONS:-3}"
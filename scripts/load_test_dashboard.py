@@ -0,0 +1,113 @@
+from __future__ import annotations
+import argparse
+import statistics
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+# Simulates N open dashboard tabs at the UI's cadence: one long-lived
+# /events/stream SSE connection per tab plus /kpi every 15s and
+# /stream/status every 3s. With --polling-fallback each tab instead polls
+# /recent every 1s, as the UI does while the stream is down. Reports
+# per-endpoint latency percentiles; for the stream that is time to first
+# byte, alongside the number of audit events received.
+STREAM = "/events/stream?limit=260"
+ENDPOINTS = [
+    ("/kpi", 15.0),
+    ("/stream/status", 3.0),
+]
+FALLBACK = ("/recent?limit=260", 1.0)
+
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    s = sorted(values)
+    k = min(len(s) - 1, max(0, int(round(p / 100.0 * (len(s) - 1)))))
+    return s[k]
+
+
+def _poller(base: str, endpoints: List[Tuple[str, float]], deadline: float, lat: Dict[str, List[float]], errors: Dict[str, int], lock: threading.Lock) -> None:
+    next_at = {path: time.time() for path, _ in endpoints}
+    while time.time() < deadline:
+        now = time.time()
+        for path, every in endpoints:
+            if now < next_at[path]:
+                continue
+            next_at[path] = now + every
+            t0 = time.perf_counter()
+            try:
+                with urllib.request.urlopen(base + path, timeout=30) as r:
+                    r.read()
+                ms = (time.perf_counter() - t0) * 1000.0
+                with lock:
+                    lat[path].append(ms)
+            except Exception:
+                with lock:
+                    errors[path] += 1
+        time.sleep(max(0.0, min(next_at.values()) - time.time()))
+
+
+def _streamer(base: str, deadline: float, lat: Dict[str, List[float]], errors: Dict[str, int], events: Dict[str, int], lock: threading.Lock) -> None:
+    # Holds the SSE connection open until the deadline, reconnecting like
+    # EventSource does if the server drops it. The server sends a keepalive
+    # every 15s, so the read timeout only fires on a stalled stream.
+    while time.time() < deadline:
+        t0 = time.perf_counter()
+        try:
+            with urllib.request.urlopen(base + STREAM, timeout=30) as r:
+                first = True
+                while time.time() < deadline:
+                    line = r.readline()
+                    if not line:
+                        break
+                    if first:
+                        with lock:
+                            lat[STREAM].append((time.perf_counter() - t0) * 1000.0)
+                        first = False
+                    if line.startswith(b"event: audit"):
+                        with lock:
+                            events[STREAM] += 1
+        except Exception:
+            with lock:
+                errors[STREAM] += 1
+            time.sleep(min(3.0, max(0.0, deadline - time.time())))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Dashboard load test: N concurrent clients against the Sentinel API.")
+    ap.add_argument("--base-url", default="http://127.0.0.1:8000")
+    ap.add_argument("--clients", type=int, default=10)
+    ap.add_argument("--duration", type=float, default=60.0, help="seconds")
+    ap.add_argument("--polling-fallback", action="store_true", help="poll /recent every 1s instead of holding an /events/stream connection")
+    args = ap.parse_args()
+
+    lat: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    events: Dict[str, int] = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.time() + args.duration
+    base = args.base_url.rstrip("/")
+    polled = ENDPOINTS + [FALLBACK] if args.polling_fallback else list(ENDPOINTS)
+    mode = "polling /recent" if args.polling_fallback else "SSE"
+    print(f"[loadtest] {args.clients} clients x {args.duration:.0f}s against {base} ({mode})")
+    with ThreadPoolExecutor(max_workers=args.clients * 2) as ex:
+        for _ in range(args.clients):
+            ex.submit(_poller, base, polled, deadline, lat, errors, lock)
+            if not args.polling_fallback:
+                ex.submit(_streamer, base, deadline, lat, errors, events, lock)
+
+    paths = [path for path, _ in polled] + ([] if args.polling_fallback else [STREAM])
+    print(f"{'endpoint':<26}{'n':>8}{'err':>6}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for path in paths:
+        v = lat.get(path, [])
+        mean = statistics.fmean(v) if v else 0.0
+        print(f"{path:<26}{len(v):>8}{errors.get(path, 0):>6}{_pct(v, 50):>10.1f}{_pct(v, 99):>10.1f}{mean:>10.1f}")
+    if not args.polling_fallback:
+        print(f"[loadtest] {STREAM}: {events.get(STREAM, 0)} audit events received across {args.clients} connections")
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,14 @@ from __future__ import annotations
 import json
 import time
 from datetime import datetime, timezone
-from typing import Any, Dict, List
-from vertexai.generative_models import GenerativeModel
+from typing import Any, Dict, List, Optional
 from ...config.settings import Settings
 from ...shared.events import DecisionEvent, ActionEvent
 from ...shared.kafka_client import make_consumer, make_producer, consume_loop, produce_model
-from ...shared.vertex_client import init_vertex
+from ...shared.model_backend import MAX_OUTPUT_TOKENS, ModelBackend, ModelOutputError, TASK_DOER, make_model_backend, parse_output
+from ...shared.model_outputs import DoerPlan
+from ...shared.dead_letter import make_dead_letter
+from ...shared.tracing import Spans, carry, finish_stage, stamp
 from .prompts import DOER_SYSTEM
 
 
@@ -29,24 +31,23 @@ def _canonical_priority(p: str) -> str:
     return "P2"
 
 
-def _parse_json_soft(text: str) -> Dict[str, Any]:
+def _parse_plan(text: Optional[str]) -> Dict[str, Any]:
+    # An unusable plan (or no text at all) falls back to the thinker's own actions.
     try:
-        start = text.find("{")
-        end = text.rfind("}")
-        if start >= 0 and end > start:
-            return json.loads(text[start : end + 1])
-    except Exception:
+        if text is not None:
+            return parse_output(TASK_DOER, DoerPlan, text).model_dump()
+    except ModelOutputError:
         pass
     return {"actions": []}
 
 
 class DoerService:
-    def __init__(self, cfg: Settings):
+    def __init__(self, cfg: Settings, model: Optional[ModelBackend] = None):
         self.cfg = cfg
-        init_vertex(cfg)
-        self.model = GenerativeModel(cfg.gemini_thinker_model)
+        self.model = model or make_model_backend(cfg, cfg.gemini_thinker_model)
         self.producer = make_producer(cfg)
         self.consumer = make_consumer(cfg, group_id="doer-llm-v1", topics=[cfg.topic_decisions],offset_reset="latest")
+        self.dead_letter = make_dead_letter(cfg, "doer-llm-v1", self.producer)
         self.last: Dict[str, float] = {}
 
     def _dedup(self, key: str, cooldown_s: int = 20) -> bool:
@@ -56,7 +57,7 @@ class DoerService:
         self.last[key] = now
         return True
 
-    def _llm_enrich_actions(self, dec: DecisionEvent) -> List[Dict[str, Any]]:
+    def _llm_enrich_actions(self, dec: DecisionEvent, spans: Spans) -> List[Dict[str, Any]]:
         in_actions = dec.recommended_actions or []
         safe_actions = []
         for a in in_actions:
@@ -79,11 +80,20 @@ class DoerService:
             "evidence": dec.evidence,
             "recommended_actions": safe_actions,
         }
-        raw = self.model.generate_content(
-            [DOER_SYSTEM, f"DECISION={json.dumps(prompt_obj)}"],
-            generation_config={"temperature": 0.2, "max_output_tokens": 10000},
-        ).text
-        out = _parse_json_soft(raw)
+        stamp(spans, "doer.model_start")
+        try:
+            raw: Optional[str] = self.model.generate(
+                TASK_DOER,
+                [DOER_SYSTEM, f"DECISION={json.dumps(prompt_obj)}"],
+                temperature=0.2,
+                max_output_tokens=MAX_OUTPUT_TOKENS[TASK_DOER],
+                response_schema=DoerPlan,
+            ).text
+        except ModelOutputError as e:
+            print(f"[doer] {e}")
+            raw = None
+        stamp(spans, "doer.model_end")
+        out = _parse_plan(raw)
         actions = out.get("actions", [])
         if not isinstance(actions, list) or not actions:
             return safe_actions
@@ -109,9 +119,12 @@ class DoerService:
 
     def handle_decision(self, dec_msg: dict):
         dec = DecisionEvent(**dec_msg)
+        spans = stamp(carry(dec.spans), "doer.consume")
         sev = str(dec.assessment.get("severity", "low")).lower()
         base_key = f"{dec.camera_id}:{dec.use_case}:{sev}"
-        enriched_actions = self._llm_enrich_actions(dec)
+        t0 = time.time()
+        enriched_actions = self._llm_enrich_actions(dec, spans)
+        model = {"name": self.model.name, "latency_ms": int((time.time() - t0) * 1000)}
         for a in enriched_actions:
             a_type = _canonical_action_type(str(a.get("type", "")))
             key = f"{base_key}:{a_type}"
@@ -125,6 +138,8 @@ class DoerService:
                     action=a,
                     status="skipped",
                     provider="dedup",
+                    model=model,
+                    spans=stamp(dict(spans), "doer.produce"),
                 )
                 produce_model(self.producer, self.cfg.topic_actions, evt, key=dec.camera_id)
                 continue
@@ -143,9 +158,12 @@ class DoerService:
                 ts=datetime.now(timezone.utc),
                 action=a,
                 status="sent",
-                provider="gemini",
+                provider=self.model.name,
+                model=model,
+                spans=stamp(dict(spans), "doer.produce"),
             )
             produce_model(self.producer, self.cfg.topic_actions, evt, key=dec.camera_id)
+            finish_stage("doer", dec.use_case, dec.trace_id, evt.spans)
 
     def run(self):
-        consume_loop(self.consumer, self.handle_decision)
\ No newline at end of file
+        consume_loop(self.consumer, self.handle_decision, dead_letter=self.dead_letter)
\ No newline at end of file
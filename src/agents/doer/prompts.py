@@ -8,17 +8,6 @@ Rules:
 - Do NOT change the action "type" (stop_line vs alert). Only improve the message/instructions.
 - Be concise and operational.
 - If evidence is weak/uncertain, keep message conservative.
-- Output STRICT JSON ONLY as:
-{
-  "actions": [
-    {
-      "type": "stop_line|alert",
-      "target": "console",
-      "priority": "P1|P2|P3",
-      "message": "operator-facing instruction",
-      "execution_steps": ["...","..."],
-      "notes": "optional short note"
-    }
-  ]
-}
+- Answer in the response schema: one entry in "actions" per recommended action, with an operator-facing
+  "message", short "execution_steps" and an optional "notes".
 """
\ No newline at end of file
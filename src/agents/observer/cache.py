@@ -0,0 +1,86 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+from ...shared.metrics import CACHE_REQUESTS
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def observation_key(content_sha256: str, prompt_sha: str, model: str) -> str:
+    return hashlib.sha256(f"{content_sha256}\x1f{prompt_sha}\x1f{model}".encode("utf-8")).hexdigest()
+
+
+class ObservationCache:
+    # Parsed observer output per (clip bytes, prompt, model). An LRU dict sits
+    # in front of a SQLite table; the prompt hash is stored per row so entries
+    # for a changed prompt can be purged without touching the others.
+    def __init__(self, path: str = "", memory_entries: int = 10000):
+        self.path = path
+        self.memory_entries = max(0, int(memory_entries))
+        self._mem: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS observations ("
+                "k TEXT PRIMARY KEY, prompt_sha TEXT NOT NULL, model TEXT NOT NULL, v TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS observations_prompt ON observations (prompt_sha)")
+            self._db.commit()
+
+    def _remember(self, k: str, v: Dict[str, Any]) -> None:
+        if self.memory_entries <= 0:
+            return
+        self._mem[k] = v
+        self._mem.move_to_end(k)
+        while len(self._mem) > self.memory_entries:
+            self._mem.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            v = self._mem.get(key)
+            if v is not None:
+                self._mem.move_to_end(key)
+                CACHE_REQUESTS.labels("observation", "hit").inc()
+                return v
+            if self._db is not None:
+                row = self._db.execute("SELECT v FROM observations WHERE k = ?", (key,)).fetchone()
+                if row is not None:
+                    v = json.loads(row[0])
+                    self._remember(key, v)
+                    CACHE_REQUESTS.labels("observation", "disk_hit").inc()
+                    return v
+        CACHE_REQUESTS.labels("observation", "miss").inc()
+        return None
+
+    def put(self, key: str, prompt_sha: str, model: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO observations (k, prompt_sha, model, v, created) VALUES (?, ?, ?, ?, ?)",
+                    (key, prompt_sha, model, json.dumps(value), time.time()),
+                )
+                self._db.commit()
+
+    def purge_stale(self, current_prompt_shas: Iterable[str]) -> int:
+        keep = sorted(set(current_prompt_shas))
+        if self._db is None or not keep:
+            return 0
+        with self._lock:
+            cur = self._db.execute(
+                f"DELETE FROM observations WHERE prompt_sha NOT IN ({','.join('?' * len(keep))})", keep
+            )
+            self._db.commit()
+            return cur.rowcount
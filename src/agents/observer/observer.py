@@ -1,47 +1,108 @@
 from __future__ import annotations
-import json, re, time
+import json
+import time
 from datetime import datetime, timezone
-from typing import Any, Dict
-from vertexai.generative_models import GenerativeModel, Part
+from typing import Any, Dict, Optional
 from ...config.settings import Settings
 from ...shared.events import ClipEvent, ObservationEvent
 from ...shared.kafka_client import make_consumer, make_producer, consume_loop, produce_model
-from ...shared.gcs_client import GcsClient
-from ...shared.vertex_client import init_vertex
+from ...shared.gcs_client import make_blob_store, sha256_bytes
+from ...shared.dead_letter import make_dead_letter
+from ...shared.model_backend import (
+    MAX_OUTPUT_TOKENS,
+    MediaPart,
+    ModelBackend,
+    ModelOutputError,
+    TASK_OBSERVER_ASSEMBLY,
+    TASK_OBSERVER_SECURITY,
+    make_model_backend,
+    parse_output,
+)
+from ...shared.model_outputs import AssemblyObservation, SecurityObservation
+from ...shared.tracing import carry, finish_stage, stamp
+from .cache import ObservationCache, observation_key, prompt_hash
 from .prompts import ASSEMBLY_OBSERVER_PROMPT, SECURITY_OBSERVER_PROMPT
 
-def _parse_json(text: str) -> Dict[str, Any]:
-    m = re.search(r"\{.*\}", text, re.DOTALL)
-    if not m:
-        return {"summary": text.strip(), "signals": {"uncertainty": "high", "confidence_note": "no_json"}}
-    return json.loads(m.group(0))
+def _parse_observation(task: str, schema: Any, text: Optional[str]) -> Dict[str, Any]:
+    # text is None when the model returned nothing usable (empty or truncated).
+    if text is not None:
+        try:
+            return parse_output(task, schema, text).model_dump()
+        except ModelOutputError:
+            pass
+    return {"summary": (text or "").strip()[:300], "signals": {"uncertainty": "high", "confidence_note": "no_json"}}
+
+
+def _prompt_version(prompt: str, schema: Any) -> str:
+    # The response schema is part of the request contract, so it versions cached output too.
+    return prompt_hash(prompt + json.dumps(schema.model_json_schema(), sort_keys=True))
 
 
 class ObserverService:
-    def __init__(self, cfg: Settings):
+    def __init__(self, cfg: Settings, model: Optional[ModelBackend] = None):
         self.cfg = cfg
-        init_vertex(cfg)
-        self.gcs = GcsClient(project=cfg.gcp_project)
-        self.model = GenerativeModel(cfg.gemini_observer_model)
+        self.gcs = make_blob_store(cfg)
+        self.model = model or make_model_backend(cfg, cfg.gemini_observer_model)
         self.producer = make_producer(cfg)
         self.consumer = make_consumer(cfg, group_id="observer-v2", topics=[cfg.topic_clips], offset_reset="latest")
-    
+        self.dead_letter = make_dead_letter(cfg, "observer-v2", self.producer)
+        self.cache = self._make_cache(cfg)
+
+    @staticmethod
+    def _make_cache(cfg: Settings) -> Optional[ObservationCache]:
+        path = "" if cfg.observation_cache_path.lower() in ("none", "off") else cfg.observation_cache_path
+        if not path and cfg.observation_cache_entries <= 0:
+            return None
+        cache = ObservationCache(path, cfg.observation_cache_entries)
+        purged = cache.purge_stale(
+            [_prompt_version(ASSEMBLY_OBSERVER_PROMPT, AssemblyObservation), _prompt_version(SECURITY_OBSERVER_PROMPT, SecurityObservation)]
+        )
+        if purged:
+            print(f"[observer] dropped {purged} cached observations from older prompts")
+        return cache
 
     def handle_clip(self, clip_msg: dict):
         clip = ClipEvent(**clip_msg)
+        spans = stamp(carry(clip.spans), "observer.consume")
         t0 = time.time()
-        video_bytes = self.gcs.download_bytes(clip.gcs_uri)
-        if not video_bytes or len(video_bytes) < 1024:
-            return
-        prompt = ASSEMBLY_OBSERVER_PROMPT if clip.use_case == "assembly" else SECURITY_OBSERVER_PROMPT
-        resp = self.model.generate_content(
-            [
-                prompt,
-                Part.from_data(data=video_bytes, mime_type="video/mp4"),
-            ],
-            generation_config={"temperature": 0.0, "max_output_tokens": 10000},
-        )
-        out = _parse_json(resp.text)
+        if clip.use_case == "assembly":
+            prompt, task, schema = ASSEMBLY_OBSERVER_PROMPT, TASK_OBSERVER_ASSEMBLY, AssemblyObservation
+        else:
+            prompt, task, schema = SECURITY_OBSERVER_PROMPT, TASK_OBSERVER_SECURITY, SecurityObservation
+        prompt_sha = _prompt_version(prompt, schema)
+        cache_key = observation_key(clip.content_sha256, prompt_sha, self.model.name) if self.cache and clip.content_sha256 else None
+        out = self.cache.get(cache_key) if cache_key else None
+        model_name, cached = self.model.name, out is not None
+        if out is None:
+            stamp(spans, "observer.download_start")
+            video_bytes = self.gcs.download_bytes(clip.gcs_uri)
+            stamp(spans, "observer.download_end")
+            if not video_bytes or len(video_bytes) < 1024:
+                return
+            if self.cache and cache_key is None:
+                cache_key = observation_key(sha256_bytes(video_bytes), prompt_sha, self.model.name)
+                out = self.cache.get(cache_key)
+                cached = out is not None
+        if out is None:
+            stamp(spans, "observer.model_start")
+            try:
+                resp = self.model.generate(
+                    task,
+                    [prompt, MediaPart(data=video_bytes, mime_type="video/mp4")],
+                    temperature=0.0,
+                    max_output_tokens=MAX_OUTPUT_TOKENS[task],
+                    response_schema=schema,
+                )
+                text, model_name = resp.text, resp.model
+            except ModelOutputError as e:
+                print(f"[observer] {e}")
+                text = None
+            stamp(spans, "observer.model_end")
+            out = _parse_observation(task, schema, text)
+            # The no_json fallback is a transient model failure, not an answer worth replaying.
+            no_json = isinstance(out.get("signals"), dict) and out["signals"].get("confidence_note") == "no_json"
+            if self.cache and cache_key and not no_json:
+                self.cache.put(cache_key, prompt_sha, self.model.name, out)
         latency_ms = int((time.time() - t0) * 1000)
         summary = out.get("summary", "")
         signals = out.get("signals", {}) if isinstance(out.get("signals", {}), dict) else {}
@@ -53,12 +114,16 @@ class ObserverService:
             use_case=clip.use_case,
             clip_index=clip.clip_index,
             ts=datetime.now(timezone.utc),
+            clip_start_ts=clip.clip_start_ts,
+            clip_end_ts=clip.clip_end_ts,
             summary=summary,
             entities=[],
             signals=signals,
-            model={"name": self.cfg.gemini_observer_model, "latency_ms": latency_ms},
+            model={"name": model_name, "latency_ms": latency_ms, "cache": "hit" if cached else "miss"},
         )
+        obs.spans = stamp(spans, "observer.produce")
         produce_model(self.producer, self.cfg.topic_observations, obs, key=clip.camera_id)
+        finish_stage("observer", clip.use_case, clip.trace_id, spans)
 
     def run(self):
-        consume_loop(self.consumer, self.handle_clip)
\ No newline at end of file
+        consume_loop(self.consumer, self.handle_clip, dead_letter=self.dead_letter)
\ No newline at end of file
@@ -18,19 +18,8 @@ you MUST label the phase accordingly, even if other details are uncertain.
 Your job is to classify the station lifecycle phase for the foreground board.
 Do NOT reference SOP step IDs.
 
-Return STRICT JSON ONLY:
-{
-  "summary": "one sentence describing what happened",
-  "signals": {
-    "phase": "idle|board_in|work|board_out|uncertain",
-    "board_present": "yes|no|uncertain",
-    "motion": "left_to_right|none|uncertain",
-    "primary_action": "acquire|place|insert|inspect|use_tool|advance|none|uncertain",
-    "tools_seen": ["..."],
-    "uncertainty": "low|medium|high",
-    "confidence_note": "short reason"
-  }
-}
+Answer in the response schema: "summary" is one sentence describing what happened; "signals" classifies the clip
+("confidence_note" is a short reason).
 
 PHASE DEFINITIONS (IN ORDER OF PRIORITY):
 1) phase=board_in
@@ -56,7 +45,6 @@ DECISION RULES:
 - Only use phase=uncertain if you genuinely cannot tell.
 
 If unsure, set uncertainty=high and explain briefly in confidence_note.
-Return JSON only. No markdown.
 """
 
 
@@ -73,33 +61,9 @@ Detect specific hazards, including:
 
 You MUST NOT guess. If visual evidence is obstructed, mark as 'uncertain'.
 
-Return STRICT JSON ONLY:
-{
-  "summary": "One sentence describing the primary event or violation.",
-  "signals": {
-    "people_present": "yes|no|uncertain",
-    "people_count": "0|1|2|3+|uncertain",
-    "walkway_violation": "yes|no|uncertain",
-    "restricted_area_entry": "yes|no|uncertain",
-    "machine_operating": "yes|no|uncertain",
-    "panel_open": "yes|no|uncertain",
-    "guard_open": "yes|no|uncertain",
-    "unsafe_proximity_to_machine": "yes|no|uncertain",
-    "safety_flags": [
-      "walkway_violation",
-      "restricted_area",
-      "panel_open_while_operating",
-      "guard_open_while_operating",
-      "unsafe_proximity",
-      "distracted_operator",
-      "ppe_missing",
-      "near_miss"
-    ],
-    "notable_actions": ["list specific behaviors observed, e.g., 'Operator looking at phone', 'Electrical cabinet door ajar'"],
-    "uncertainty": "low|medium|high",
-    "confidence_note": "Brief explanation of why the rating was chosen (e.g., 'Clear view of open cabinet door while press cycles')."
-  }
-}
+Answer in the response schema: "summary" is one sentence describing the primary event or violation; "signals" rates each hazard.
+"notable_actions" lists specific behaviors observed (e.g. 'Operator looking at phone', 'Electrical cabinet door ajar').
+"confidence_note" briefly explains the rating (e.g. 'Clear view of open cabinet door while press cycles').
 
 Rules:
 - "machine_operating": Set to 'yes' if moving parts, strobes, or cycling is visible.
@@ -107,6 +71,4 @@ Rules:
 - "guard_open": Specifically refers to physical safety barriers or light curtains being bypassed.
 - If "panel_open" AND "machine_operating" are both 'yes', you MUST include "panel_open_while_operating" in safety_flags.
 - "walkway_violation": Set to 'yes' if a person is standing on or crossing the unmarked grey floor outside of designated colored paths.
-
-Return JSON only.
 """
\ No newline at end of file
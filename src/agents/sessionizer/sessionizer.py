@@ -8,8 +8,10 @@ from datetime import datetime, timezone
 from typing import Dict, Any, List, Optional
 from ...config.settings import Settings
 from ...shared.events import ObservationEvent, StationSessionEvent
-from ...shared.kafka_client import make_consumer, make_producer, consume_loop, produce_model
-from ...shared.gcs_client import GcsClient
+from ...shared.kafka_client import header_filter, make_consumer, make_producer, consume_loop, produce_model
+from ...shared.gcs_client import make_blob_store
+from ...shared.dead_letter import make_dead_letter
+from ...shared.tracing import Spans, carry, finish_stage, stamp
 
 
 @dataclass
@@ -25,12 +27,13 @@ class OpenSession:
     last_clip_index: int
     clip_uris: List[str]
     timeline: List[Dict[str, Any]]
+    spans: Spans
 
 
 class SessionizerService:
     def __init__(self, cfg: Settings):
         self.cfg = cfg
-        self.gcs = GcsClient(project=cfg.gcp_project)
+        self.gcs = make_blob_store(cfg)
         self.producer = make_producer(cfg)
         self.consumer = make_consumer(
             cfg,
@@ -38,6 +41,7 @@ class SessionizerService:
             topics=[cfg.topic_observations],
             offset_reset="latest",
         )
+        self.dead_letter = make_dead_letter(cfg, "sessionizer-simple-v1", self.producer, on_dead_letter=self._drop_session)
         self.open_sessions: Dict[str, OpenSession] = {}
 
     def _make_montage(self, sess: OpenSession) -> Optional[str]:
@@ -91,6 +95,14 @@ class SessionizerService:
         finally:
             shutil.rmtree(tmpdir, ignore_errors=True)
 
+    def _drop_session(self, payload: Optional[Dict[str, Any]]) -> None:
+        # The observation was dead-lettered: whatever session it was closing
+        # or extending is abandoned, so the camera's next board starts clean.
+        cam = (payload or {}).get("camera_id")
+        sess = self.open_sessions.pop(cam, None) if cam else None
+        if sess is not None:
+            print(f"[sessionizer] DROP cam={cam} clips={sess.start_clip_index}-{sess.last_clip_index} (dead-lettered)")
+
     def _start_session(self, obs: ObservationEvent):
         cam = obs.camera_id
         self.open_sessions[cam] = OpenSession(
@@ -99,31 +111,43 @@ class SessionizerService:
             use_case=obs.use_case,
             station_id=None,
             sku_id=None,
-            start_ts=obs.ts,
+            start_ts=obs.clip_start_ts or obs.ts,
             start_clip_index=obs.clip_index,
-            last_ts=obs.ts,
+            last_ts=obs.clip_end_ts or obs.ts,
             last_clip_index=obs.clip_index,
             clip_uris=[obs.clip_gcs_uri],
             timeline=[{"clip_index": obs.clip_index, "summary": obs.summary, "signals": obs.signals or {}}],
+            spans=carry(obs.spans),
         )
         print(f"[sessionizer] START cam={cam} clip={obs.clip_index}")
 
     def _append(self, obs: ObservationEvent):
         cam = obs.camera_id
         sess = self.open_sessions.get(cam)
-        if not sess:
+        if not sess or obs.clip_index <= sess.last_clip_index:
             return
-        sess.last_ts = obs.ts
+        sess.last_ts = obs.clip_end_ts or obs.ts
         sess.last_clip_index = obs.clip_index
         sess.clip_uris.append(obs.clip_gcs_uri)
         sess.timeline.append({"clip_index": obs.clip_index, "summary": obs.summary, "signals": obs.signals or {}})
+        sess.spans = carry(obs.spans)
 
     def _close_session(self, cam: str):
-        sess = self.open_sessions.pop(cam, None)
+        # Only drop the session once its event is out, so a failed produce is
+        # retried with the session still open; if the observation ends up on
+        # the DLQ, _drop_session abandons it.
+        sess = self.open_sessions.get(cam)
         if not sess:
             print(f"[debug][sessionizer][END ] cam={cam} (no open session to close)")
             return
-        montage_uri = self._make_montage(sess)
+        stamp(sess.spans, "sessionizer.montage_start")
+        try:
+            montage_uri = self._make_montage(sess)
+        except Exception as e:
+            # The montage is optional: the thinker falls back to the timeline.
+            print(f"[sessionizer] montage failed cam={cam}: {type(e).__name__}: {e}")
+            montage_uri = None
+        stamp(sess.spans, "sessionizer.montage_end")
         summary = f"Board session {sess.start_clip_index}->{sess.last_clip_index}. Last: {sess.timeline[-1]['summary'] if sess.timeline else ''}"
 
         evt = StationSessionEvent(
@@ -141,13 +165,17 @@ class SessionizerService:
             timeline=sess.timeline,
             summary=summary,
         )
+        evt.spans = stamp(sess.spans, "sessionizer.produce")
         produce_model(self.producer, self.cfg.topic_sessions, evt, key=sess.camera_id)
+        self.open_sessions.pop(cam, None)
+        finish_stage("sessionizer", sess.use_case, sess.trace_id, sess.spans)
         print(f"[sessionizer] END cam={cam} clips={len(sess.clip_uris)} montage={bool(montage_uri)}")
 
     def handle_observation(self, msg: dict):
         obs = ObservationEvent(**msg)
         if obs.use_case != "assembly":
             return
+        stamp(obs.spans, "sessionizer.consume")
         phase = str((obs.signals or {}).get("phase", "uncertain")).lower()
         cam = obs.camera_id
         if phase == "board_in":
@@ -161,4 +189,4 @@ class SessionizerService:
                 self._close_session(cam)
 
     def run(self):
-        consume_loop(self.consumer, self.handle_observation)
\ No newline at end of file
+        consume_loop(self.consumer, self.handle_observation, dead_letter=self.dead_letter, accept=header_filter(use_case="assembly"))
\ No newline at end of file
@@ -0,0 +1,98 @@
+from __future__ import annotations
+import uuid
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+
+
+@dataclass
+class Incident:
+    camera_id: str
+    rule_id: str
+    start_clip: int
+    end_clip: int
+    start_ts: datetime
+    end_ts: datetime
+    hits: int = 1
+    incident_id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    # Hit count when the last evaluation declined to act; None while the
+    # incident is unevaluated or was acted on.
+    rejected_at_hits: Optional[int] = None
+
+    @property
+    def clip_range(self) -> List[int]:
+        return [self.start_clip, self.end_clip]
+
+
+@dataclass
+class _CameraWindow:
+    clips: Deque[Tuple[int, Optional[str], datetime]] = field(default_factory=deque)
+    last_clip: Optional[int] = None
+    open: Dict[str, Incident] = field(default_factory=dict)
+
+
+class SecurityWindow:
+    # k-of-n trigger over the last n clip indices of each camera (event time,
+    # not arrival time). Consecutive hits of the same rule extend one open
+    # incident; it closes once the rule has no hit left in the window. An
+    # incident whose evaluation was rejected is handed back for another look
+    # after k further hits, so a violation that keeps going is re-checked.
+    def __init__(self, window_clips: int = 4, min_hits: int = 2, rule_min_hits: Optional[Dict[str, int]] = None):
+        self.n = max(1, int(window_clips))
+        self.k = max(1, min(int(min_hits), self.n))
+        self.rule_min_hits = {r: max(1, min(int(v), self.n)) for r, v in (rule_min_hits or {}).items()}
+        self._cams: Dict[str, _CameraWindow] = {}
+
+    def _k(self, rule_id: str) -> int:
+        return self.rule_min_hits.get(rule_id, self.k)
+
+    def observe(
+        self, camera_id: str, clip_index: int, ts: datetime, rule_id: Optional[str]
+    ) -> Tuple[Optional[Incident], List[Incident]]:
+        st = self._cams.setdefault(camera_id, _CameraWindow())
+        closed: List[Incident] = []
+        if st.last_clip is not None:
+            if clip_index == st.last_clip:
+                return None, closed
+            # A lower index means the source restarted (stream stop/start,
+            # producer restart, replay): start a fresh window for the camera.
+            if clip_index < st.last_clip or clip_index - st.last_clip >= self.n:
+                closed.extend(st.open.values())
+                st.open.clear()
+                st.clips.clear()
+        st.last_clip = clip_index
+        st.clips.append((clip_index, rule_id, ts))
+        while st.clips and st.clips[0][0] <= clip_index - self.n:
+            st.clips.popleft()
+        counts = Counter(r for _, r, _ in st.clips if r)
+        for r in [r for r in st.open if not counts.get(r)]:
+            closed.append(st.open.pop(r))
+        if not rule_id:
+            return None, closed
+        inc = st.open.get(rule_id)
+        if inc is not None:
+            inc.end_clip = clip_index
+            inc.end_ts = ts
+            inc.hits += 1
+            if inc.rejected_at_hits is not None and inc.hits - inc.rejected_at_hits >= self._k(rule_id):
+                inc.rejected_at_hits = None
+                return inc, closed
+            return None, closed
+        if counts[rule_id] < self._k(rule_id):
+            return None, closed
+        start, start_ts = next((i, t) for i, r, t in st.clips if r == rule_id)
+        inc = Incident(
+            camera_id=camera_id,
+            rule_id=rule_id,
+            start_clip=start,
+            end_clip=clip_index,
+            start_ts=start_ts,
+            end_ts=ts,
+            hits=counts[rule_id],
+        )
+        st.open[rule_id] = inc
+        return inc, closed
+
+    def reject(self, incident: Incident) -> None:
+        incident.rejected_at_hits = incident.hits
@@ -11,21 +11,12 @@ Task:
 2) Identify missing steps (the earliest missing in sequence is most important).
 3) Recommend actions.
 
-Return STRICT JSON ONLY:
-{
-  "completed_steps":[{"step_id":"...","evidence":"...","confidence":0-1}],
-  "missing_steps":[{"step_id":"...","why_missing":"...","confidence":0-1}],
-  "assessment":{"sop_violation":true|false,"severity":"low|medium|high","confidence":0-1,"risk":"..."},
-  "recommended_actions":[{"type":"stop_line|alert","target":"console","message":"...","priority":"P1|P2|P3"}],
-  "rationale":{"short":"...","citations":[{"chunk_id":"...","step_id":"...","sop_version":"..."}]},
-  "evidence":{"reason":"...","clip_range":[start_clip_index,end_clip_index]}
-}
+Answer in the response schema. "evidence.clip_range" is [start_clip_index, end_clip_index] of the session; recommend at most one action.
 
 Rules:
 - Use ONLY the SOP chunks and session timeline/video provided.
 - If uncertain, sop_violation=false and explain.
 - Cite SOP chunks for any missing step.
-JSON only.
 """
 
 SECURITY_THINKER_SYSTEM = """
@@ -37,25 +28,11 @@ Your job:
 - Choose an action: stop_line for high-severity hazards; alert for lower severity hazards.
 - Be conservative: do not guess beyond the signals provided.
 
-Return STRICT JSON ONLY:
-{
-  "assessment": {
-    "violation": true|false,
-    "rule_id": "walkway_violation|unsafe_proximity_while_operating|panel_open_while_operating|guard_open_while_operating|restricted_area_entry|other",
-    "severity": "low|medium|high",
-    "confidence": 0.0-1.0,
-    "risk": "short risk statement"
-  },
-  "recommended_actions": [
-    {"type":"stop_line|alert","target":"console","message":"...", "priority":"P1|P2|P3"}
-  ],
-  "rationale": {"short":"...", "citations":[]},
-  "evidence": {"reason":"security_single_clip", "clip_range":[start_clip_index,end_clip_index]}
-}
+Answer in the response schema. "assessment.rule_id" is one of walkway_violation, unsafe_proximity_while_operating,
+panel_open_while_operating, guard_open_while_operating, restricted_area_entry or other;
+"evidence.clip_range" is [start_clip_index, end_clip_index]; recommend at most one action.
 
 Rules for action type:
 - stop_line for: panel_open while operating, guard_open while operating, unsafe proximity while operating, restricted area entry near operating machine.
 - alert for: walkway violations, uncertain/low-severity issues.
-
-Output JSON only.
 """
\ No newline at end of file
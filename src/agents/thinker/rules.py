@@ -0,0 +1,113 @@
+from __future__ import annotations
+import json
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+TRI_STATE = ("yes", "no", "uncertain")
+
+
+def _yn(v: object) -> str:
+    if isinstance(v, str):
+        s = v.strip().lower()
+        if s in TRI_STATE:
+            return s
+    return "uncertain"
+
+
+@dataclass(frozen=True)
+class SecurityRule:
+    rule_id: str
+    checks: Tuple[Tuple[str, FrozenSet[str]], ...]
+    severity: str
+    confidence: float
+    risk: str
+    action: Dict[str, Any]
+    llm_confirm: bool
+    min_hits: Optional[int] = None
+
+
+@dataclass(frozen=True)
+class RuleMatch:
+    rule: SecurityRule
+
+    @property
+    def rule_id(self) -> str:
+        return self.rule.rule_id
+
+
+def _compile_rule(r: Dict[str, Any]) -> SecurityRule:
+    when = r.get("when") or {}
+    if not isinstance(when, dict) or not when:
+        raise ValueError(f"rule {r.get('rule_id')!r} has no 'when' predicates")
+    checks = []
+    for sig, want in when.items():
+        vals = want if isinstance(want, list) else [want]
+        norm = frozenset(_yn(v) for v in vals)
+        checks.append((str(sig), norm))
+    action = dict(r.get("action") or {})
+    action.setdefault("type", "alert")
+    action.setdefault("target", "console")
+    action.setdefault("priority", "P2")
+    action.setdefault("message", "Action recommended.")
+    return SecurityRule(
+        rule_id=str(r["rule_id"]),
+        checks=tuple(checks),
+        severity=str(r.get("severity", "medium")),
+        confidence=float(r.get("confidence", 0.5)),
+        risk=str(r.get("risk", "security_risk")),
+        action=action,
+        llm_confirm=bool(r.get("llm_confirm", True)),
+        min_hits=(int(r["min_hits"]) if r.get("min_hits") is not None else None),
+    )
+
+
+class SecurityRuleEngine:
+    def __init__(self, rules: List[SecurityRule], version: str = ""):
+        self.rules = rules
+        self.version = version
+        self._signals = tuple(sorted({sig for r in rules for sig, _ in r.checks}))
+
+    @classmethod
+    def from_dict(cls, spec: Dict[str, Any]) -> "SecurityRuleEngine":
+        return cls([_compile_rule(r) for r in spec.get("rules", [])], version=str(spec.get("version", "")))
+
+    @classmethod
+    def from_file(cls, path: str) -> "SecurityRuleEngine":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    def min_hits(self) -> Dict[str, int]:
+        return {r.rule_id: r.min_hits for r in self.rules if r.min_hits is not None}
+
+    def evaluate(self, signals: Optional[Dict[str, Any]]) -> Optional[RuleMatch]:
+        s = signals or {}
+        norm = {k: _yn(s.get(k)) for k in self._signals}
+        for r in self.rules:
+            if all(norm[sig] in want for sig, want in r.checks):
+                return RuleMatch(r)
+        return None
+
+
+# Used when no rules file is configured: same trigger order as the original
+# hard-coded chain, every match confirmed by the LLM.
+DEFAULT_RULES: Dict[str, Any] = {
+    "version": "builtin",
+    "rules": [
+        {"rule_id": "panel_open_while_operating", "when": {"panel_open": "yes", "machine_operating": "yes"}},
+        {"rule_id": "guard_open_while_operating", "when": {"guard_open": "yes", "machine_operating": "yes"}},
+        {"rule_id": "unsafe_proximity_while_operating", "when": {"unsafe_proximity_to_machine": "yes", "machine_operating": "yes"}},
+        {"rule_id": "restricted_area_entry", "when": {"restricted_area_entry": "yes"}},
+        {"rule_id": "walkway_violation", "when": {"walkway_violation": "yes"}},
+        {"rule_id": "unsafe_proximity", "when": {"unsafe_proximity_to_machine": "yes"}},
+    ],
+}
+
+
+def load_security_rules(path: str) -> SecurityRuleEngine:
+    if path and os.path.isfile(path):
+        engine = SecurityRuleEngine.from_file(path)
+        print(f"[thinker] loaded {len(engine.rules)} security rules ({engine.version}) from {path}")
+        return engine
+    print(f"[thinker] security rules file not found ({path!r}); using built-in rules")
+    return SecurityRuleEngine.from_dict(DEFAULT_RULES)
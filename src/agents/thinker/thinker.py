@@ -1,30 +1,43 @@
 from __future__ import annotations
 import json
-import re
+from collections import OrderedDict
+import threading
 import time
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime, timezone
-from vertexai.generative_models import GenerativeModel, Part
 from ...config.settings import Settings
 from ...shared.events import StationSessionEvent, ObservationEvent, DecisionEvent
-from ...shared.kafka_client import make_consumer, make_producer, consume_loop, produce_model
-from ...shared.vertex_client import init_vertex
-from ...shared.gcs_client import GcsClient
-from ...rag.vertex_search_answer import answer_query
+from ...shared.kafka_client import header_filter, make_consumer, make_producer, consume_sharded, produce_model
+from ...shared.model_backend import (
+    MAX_OUTPUT_TOKENS,
+    MediaPart,
+    ModelBackend,
+    ModelOutputError,
+    TASK_THINKER_ASSEMBLY,
+    TASK_THINKER_SECURITY,
+    make_model_backend,
+    parse_output,
+)
+from ...shared.model_outputs import AssemblyDecision, SecurityDecision
+from ...shared.gcs_client import make_blob_store
+from ...shared.dead_letter import make_dead_letter
+from ...rag.sop_retrieval import retrieve_sop
 from .prompts import ASSEMBLY_THINKER_SYSTEM, SECURITY_THINKER_SYSTEM
+from ...shared.tracing import carry, finish_stage, stamp
+from .rules import RuleMatch, load_security_rules
+from .incidents import Incident, SecurityWindow
 
-def _parse_json(text: str) -> Dict[str, Any]:
-    m = re.search(r"\{.*\}", text, re.DOTALL)
-    if not m:
-        raise ValueError(f"No JSON returned by model. Raw: {text[:200]}")
-    return json.loads(m.group(0))
+LEGACY_THINKER_GROUP = "thinker-router-v2-llm-security-singleclip"
 
 
-def _parse_json_soft(text: str) -> Dict[str, Any]:
+def _parse_security_decision(text: Optional[str]) -> Dict[str, Any]:
+    # text is None when the model returned nothing usable (empty or truncated).
     try:
-        return _parse_json(text)
-    except Exception:
-        return {
+        if text is not None:
+            return parse_output(TASK_THINKER_SECURITY, SecurityDecision, text).model_dump()
+    except ModelOutputError:
+        pass
+    return {
             "assessment": {"violation": False, "severity": "low", "confidence": 0.0, "risk": "unparsed_llm_output"},
             "recommended_actions": [],
             "rationale": {"short": "LLM output could not be parsed as JSON.", "citations": []},
@@ -67,67 +80,71 @@ def _normalize_recommended_actions(actions: Any) -> List[Dict[str, Any]]:
     return out[:1]
 
 
-def _yn(v: object) -> str:
-    if isinstance(v, str):
-        s = v.strip().lower()
-        if s in ("yes", "no", "uncertain"):
-            return s
-    return "uncertain"
-
 class ThinkerService:
 
     def __init__(
         self,
         cfg: Settings,
-        security_emit_cooldown_s: int = 6,
+        model: Optional[ModelBackend] = None,
     ):
         self.cfg = cfg
-        init_vertex(cfg)
-        self.model = GenerativeModel(cfg.gemini_thinker_model)
-        self.gcs = GcsClient(project=cfg.gcp_project)
+        self.model = model or make_model_backend(cfg, cfg.gemini_thinker_model)
+        self.gcs = make_blob_store(cfg)
         self.producer = make_producer(cfg)
-        self.consumer = make_consumer(
+        # Separate consumer groups per lane so a long assembly session never
+        # sits in front of security observations in one poll loop. Both lanes
+        # pick up where the single pre-split group stopped.
+        self.security_consumer = make_consumer(
             cfg,
-            group_id="thinker-router-v2-llm-security-singleclip",
-            topics=[cfg.topic_sessions, cfg.topic_observations],
+            group_id="thinker-security-v1",
+            topics=[cfg.topic_observations],
             offset_reset="latest",
+            seed_from=LEGACY_THINKER_GROUP,
+        )
+        self.assembly_consumer = make_consumer(
+            cfg,
+            group_id="thinker-assembly-v1",
+            topics=[cfg.topic_sessions],
+            offset_reset="latest",
+            seed_from=LEGACY_THINKER_GROUP,
+        )
+        self._security_lock = threading.Lock()
+        # Incidents whose LLM confirmation failed, keyed by observation_id, so
+        # a retry (or a DLQ replay) resumes them instead of being dropped as a
+        # duplicate clip by the window.
+        self._security_pending: "OrderedDict[str, Tuple[RuleMatch, Incident]]" = OrderedDict()
+        self.security_dead_letter = make_dead_letter(cfg, "thinker-security-v1", self.producer)
+        self.assembly_dead_letter = make_dead_letter(cfg, "thinker-assembly-v1", self.producer)
+        self.security_rules = load_security_rules(cfg.security_rules_path)
+        self.security_window = SecurityWindow(
+            window_clips=cfg.security_window_clips,
+            min_hits=cfg.security_window_hits,
+            rule_min_hits=self.security_rules.min_hits(),
         )
-        self.security_emit_cooldown_s = int(security_emit_cooldown_s)
-        self._security_last_emit: Dict[str, float] = {}
-
-    def _security_cooldown_ok(self, key: str) -> bool:
-        if self.security_emit_cooldown_s <= 0:
-            return True
-        now = time.time()
-        last = self._security_last_emit.get(key, 0.0)
-        if now - last < self.security_emit_cooldown_s:
-            return False
-        self._security_last_emit[key] = now
-        return True
 
-    def _security_should_trigger(self, obs: ObservationEvent) -> Tuple[bool, str]:
-        s = obs.signals or {}
-        walkway = _yn(s.get("walkway_violation")) == "yes"
-        restricted = _yn(s.get("restricted_area_entry")) == "yes"
-        prox = _yn(s.get("unsafe_proximity_to_machine")) == "yes"
-        machine = _yn(s.get("machine_operating")) == "yes"
-        panel = _yn(s.get("panel_open")) == "yes"
-        guard = _yn(s.get("guard_open")) == "yes"
-        if panel and machine:
-            return True, "panel_open_while_operating"
-        if guard and machine:
-            return True, "guard_open_while_operating"
-        if prox and machine:
-            return True, "unsafe_proximity_while_operating"
-        if restricted:
-            return True, "restricted_area_entry"
-        if walkway:
-            return True, "walkway_violation"
-        if prox:
-            return True, "unsafe_proximity"
-        return False, ""
+    def _security_rule_decide(self, obs: ObservationEvent, match: RuleMatch) -> Dict[str, Any]:
+        r = match.rule
+        return {
+            "assessment": {
+                "violation": True,
+                "rule_id": r.rule_id,
+                "severity": r.severity,
+                "confidence": r.confidence,
+                "risk": r.risk,
+            },
+            "recommended_actions": _normalize_recommended_actions([r.action]),
+            "rationale": {"short": f"Deterministic security rule {r.rule_id} matched observer signals.", "citations": []},
+            "evidence": {
+                "reason": "security_rule_fast_path",
+                "rules_version": self.security_rules.version,
+                "signals": obs.signals or {},
+                "clip_range": [obs.clip_index, obs.clip_index],
+            },
+        }
 
-    def _security_llm_decide_single_clip(self, obs: ObservationEvent, trigger_rule: str) -> Dict[str, Any]:
+    def _security_llm_decide_single_clip(
+        self, obs: ObservationEvent, trigger_rule: str, incident: Optional[Incident] = None
+    ) -> Dict[str, Any]:
         payload = {
             "camera_id": obs.camera_id,
             "use_case": obs.use_case,
@@ -137,11 +154,20 @@ class ThinkerService:
             "signals": obs.signals or {},
             "trigger_rule": trigger_rule,
         }
-        raw = self.model.generate_content(
-            [SECURITY_THINKER_SYSTEM, f"OBS={json.dumps(payload)}"],
-            generation_config={"temperature": 0.1, "max_output_tokens": 10000},
-        ).text
-        out = _parse_json_soft(raw)
+        if incident is not None:
+            payload["window"] = {"clip_range": incident.clip_range, "positive_clips": incident.hits}
+        try:
+            raw: Optional[str] = self.model.generate(
+                TASK_THINKER_SECURITY,
+                [SECURITY_THINKER_SYSTEM, f"OBS={json.dumps(payload)}"],
+                temperature=0.1,
+                max_output_tokens=MAX_OUTPUT_TOKENS[TASK_THINKER_SECURITY],
+                response_schema=SecurityDecision,
+            ).text
+        except ModelOutputError as e:
+            print(f"[thinker] {e}")
+            raw = None
+        out = _parse_security_decision(raw)
         out["recommended_actions"] = _normalize_recommended_actions(out.get("recommended_actions"))
         if not isinstance(out.get("evidence"), dict):
             out["evidence"] = {}
@@ -156,17 +182,60 @@ class ThinkerService:
         obs = ObservationEvent(**msg)
         if obs.use_case != "security":
             return
-        should_trigger, trigger_rule = self._security_should_trigger(obs)
-        if not should_trigger:
-            return
-        dedup_key = f"{obs.camera_id}:{trigger_rule}"
-        if not self._security_cooldown_ok(dedup_key):
-            return
-        out = self._security_llm_decide_single_clip(obs, trigger_rule)
+        spans = stamp(carry(obs.spans), "thinker.consume")
+        with self._security_lock:
+            pending = self._security_pending.pop(obs.observation_id, None)
+        if pending is not None:
+            match, incident = pending
+        else:
+            match = self.security_rules.evaluate(obs.signals)
+            with self._security_lock:
+                incident, closed = self.security_window.observe(
+                    obs.camera_id, obs.clip_index, obs.clip_end_ts or obs.ts, match.rule_id if match else None
+                )
+            for c in closed:
+                print(
+                    f"[thinker][security] incident closed camera={c.camera_id} rule={c.rule_id} "
+                    f"clips={c.start_clip}-{c.end_clip} hits={c.hits}"
+                )
+            # The open incident is the dedup: later hits extend it instead of
+            # triggering, so no wall-clock cooldown is needed on top.
+            if match is None or incident is None:
+                return
+        trigger_rule = match.rule_id
+        t0 = time.time()
+        if match.rule.llm_confirm:
+            stamp(spans, "thinker.model_start")
+            try:
+                out = self._security_llm_decide_single_clip(obs, trigger_rule, incident)
+            except Exception:
+                with self._security_lock:
+                    self._security_pending[obs.observation_id] = (match, incident)
+                    while len(self._security_pending) > 1024:
+                        self._security_pending.popitem(last=False)
+                raise
+            stamp(spans, "thinker.model_end")
+            model_name = self.model.name
+        else:
+            out = self._security_rule_decide(obs, match)
+            model_name = f"rules:{self.security_rules.version}"
+        latency_ms = int((time.time() - t0) * 1000)
+        if not isinstance(out.get("evidence"), dict):
+            out["evidence"] = {}
+        out["evidence"]["clip_range"] = incident.clip_range
+        out["evidence"]["incident_id"] = incident.incident_id
+        out["evidence"]["positive_clips"] = incident.hits
         assessment = out.get("assessment", {}) if isinstance(out.get("assessment"), dict) else {}
         violation = bool(assessment.get("violation", False))
         actions = out.get("recommended_actions", [])
         if not violation or not actions:
+            # Keep the incident open but ask again once it has grown.
+            with self._security_lock:
+                self.security_window.reject(incident)
+            print(
+                f"[thinker][security] incident rejected camera={obs.camera_id} rule={trigger_rule} "
+                f"clips={incident.start_clip}-{incident.end_clip} hits={incident.hits}"
+            )
             return
         confidence = float(assessment.get("confidence", 0.0) or 0.0)
         sev = str(assessment.get("severity", "medium"))
@@ -190,22 +259,29 @@ class ThinkerService:
             recommended_actions=actions,
             rationale=out.get("rationale", {"short": "LLM security decision.", "citations": []}),
             evidence=out.get("evidence", {"reason": "security_clip", "clip_range": [obs.clip_index, obs.clip_index]}),
-            model={"name": self.cfg.gemini_thinker_model, "latency_ms": 0},
+            model={"name": model_name, "latency_ms": latency_ms},
         )
+        decision.spans = stamp(spans, "thinker.produce")
         produce_model(self.producer, self.cfg.topic_decisions, decision, key=obs.camera_id)
+        finish_stage("thinker", obs.use_case, obs.trace_id, spans)
 
 
     def handle_assembly_session(self, msg: dict) -> None:
         sess = StationSessionEvent(**msg)
+        spans = stamp(carry(sess.spans), "thinker.consume")
         station = sess.station_id or "S4"
         sku = sess.sku_id or "S1345780"
         sop_query = (
             f"SOP for process Board Assembly at station {station} for SKU {sku}. "
             f"List the complete steps in order with step_id with necessary info like expected tool, expected part, action, order_index."
         )
-        sr = answer_query(self.cfg, sop_query)
+        stamp(spans, "thinker.retrieval_start")
+        sr = retrieve_sop(self.cfg, sop_query, station_id=station, sku_id=sku)
+        stamp(spans, "thinker.retrieval_end")
         sop_chunks = []
-        if sr.snippets:
+        if sr.sources:
+            sop_chunks = sr.sources[:8]
+        elif sr.snippets:
             for i, snip in enumerate(sr.snippets[:6]):
                 sop_chunks.append(
                     {"chunk_id": f"search_snip_{i}", "chunk_text": snip, "metadata": {"source": "vertex_ai_search"}}
@@ -222,14 +298,21 @@ class ThinkerService:
         if sess.session_video_gcs_uri:
             video_bytes = self.gcs.download_bytes(sess.session_video_gcs_uri)
             if video_bytes and len(video_bytes) > 1024:
-                parts.append(Part.from_data(data=video_bytes, mime_type="video/mp4"))
+                parts.append(MediaPart(data=video_bytes, mime_type="video/mp4"))
         t0 = time.time()
-        raw = self.model.generate_content(
+        stamp(spans, "thinker.model_start")
+        raw = self.model.generate(
+            TASK_THINKER_ASSEMBLY,
             parts,
-            generation_config={"temperature": 0.1, "max_output_tokens": 10000},
+            temperature=0.1,
+            max_output_tokens=MAX_OUTPUT_TOKENS[TASK_THINKER_ASSEMBLY],
+            response_schema=AssemblyDecision,
         ).text
+        stamp(spans, "thinker.model_end")
         latency_ms = int((time.time() - t0) * 1000)
-        out = _parse_json(raw)
+        # An empty, truncated or undecodable reply raises ModelOutputError: the
+        # session is retried, then dead-lettered.
+        out = parse_output(TASK_THINKER_ASSEMBLY, AssemblyDecision, raw).model_dump()
         out["recommended_actions"] = _normalize_recommended_actions(out.get("recommended_actions"))
         assessment = out.get(
             "assessment",
@@ -260,9 +343,11 @@ class ThinkerService:
                     "evidence",
                     {"reason": "session_sop_inference", "clip_range": [sess.start_clip_index, sess.end_clip_index]},
                 ),
-                model={"name": self.cfg.gemini_thinker_model, "latency_ms": latency_ms},
+                model={"name": self.model.name, "latency_ms": latency_ms},
             )
+            decision.spans = stamp(spans, "thinker.produce")
             produce_model(self.producer, self.cfg.topic_decisions, decision, key=sess.camera_id)
+            finish_stage("thinker", sess.use_case, sess.trace_id, spans)
             print(
                 f"[thinker][assembly] session={sess.session_id} missing={len(missing)} completed={len(completed)} severity={assessment.get('severity')}"
             )
@@ -270,21 +355,39 @@ class ThinkerService:
             print(f"[thinker][assembly] session={sess.session_id} no violation (conf={assessment.get('confidence')})")
 
     def handle_message(self, msg: dict) -> None:
+        # Errors propagate to the lane's dead-letter policy (retry, then DLQ).
         if "session_id" in msg:
-            try:
-                if str(msg.get("use_case", "")).lower() == "assembly":
-                    self.handle_assembly_session(msg)
-            except Exception as e:
-                print("[thinker][assembly] error:", e)
+            if str(msg.get("use_case", "")).lower() == "assembly":
+                self.handle_assembly_session(msg)
             return
         if "observation_id" in msg:
-            try:
-                if str(msg.get("use_case", "")).lower() == "security":
-                    self.handle_security_observation(msg)
-            except Exception as e:
-                print("[thinker][security] error:", e)
+            if str(msg.get("use_case", "")).lower() == "security":
+                self.handle_security_observation(msg)
             return
         return
 
+    def run_assembly_lane(self) -> None:
+        consume_sharded(
+            self.assembly_consumer,
+            self.handle_message,
+            workers=self.cfg.thinker_assembly_workers,
+            key=lambda m: str(m.get("camera_id", "")),
+            name="thinker.assembly",
+            dead_letter=self.assembly_dead_letter,
+            accept=header_filter(event_type="session", use_case="assembly"),
+        )
+
+    def run_security_lane(self) -> None:
+        consume_sharded(
+            self.security_consumer,
+            self.handle_message,
+            workers=self.cfg.thinker_security_workers,
+            key=lambda m: str(m.get("camera_id", "")),
+            name="thinker.security",
+            dead_letter=self.security_dead_letter,
+            accept=header_filter(event_type="observation", use_case="security"),
+        )
+
     def run(self) -> None:
-        consume_loop(self.consumer, self.handle_message)
\ No newline at end of file
+        threading.Thread(target=self.run_assembly_lane, name="thinker-assembly", daemon=True).start()
+        self.run_security_lane()
\ No newline at end of file
@@ -0,0 +1,81 @@
+from __future__ import annotations
+import argparse
+import json
+import time
+from collections import Counter
+from pydantic import ValidationError
+from ..config.settings import load_settings
+from ..shared.events import DeadLetterEvent
+from ..shared import kafka_client
+from ..shared.kafka_client import bind_topic_models, make_consumer, make_producer, produce_model
+from ..shared.rate_limit import TokenBucket
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(
+        description="Re-drive dead-lettered messages to their source topics at a controlled rate. "
+        "Replays go to the source topic, so every group subscribed to it sees them again."
+    )
+    ap.add_argument("--rate", type=float, default=5.0, help="replayed messages per second")
+    ap.add_argument("--group", default=None, help="only messages dead-lettered by this consumer group")
+    ap.add_argument("--error", default=None, help="only this error class (e.g. ModelThrottledError)")
+    ap.add_argument("--source-topic", default=None, help="only messages from this topic")
+    ap.add_argument("--max", type=int, default=0, help="stop after N replays (0 = no limit)")
+    ap.add_argument("--idle-s", type=float, default=10.0, help="stop after this long without a DLQ message")
+    ap.add_argument("--consumer-group", default="dlq-replay-v1", help="offsets are committed, so a rerun resumes")
+    ap.add_argument("--dry-run", action="store_true", help="print what would be replayed")
+    ap.add_argument("--env", default=".env")
+    args = ap.parse_args()
+
+    cfg = load_settings(args.env)
+    bind_topic_models(cfg)
+    consumer = make_consumer(cfg, group_id=args.consumer_group, topics=[cfg.topic_dead_letter], offset_reset="earliest")
+    producer = make_producer(cfg)
+    bucket = TokenBucket(args.rate, capacity=1.0) if args.rate > 0 else None
+    stats: Counter = Counter()
+    last_msg = time.monotonic()
+    try:
+        while not (args.max and stats["replayed"] >= args.max):
+            msg = consumer.poll(1.0)
+            if msg is None:
+                if time.monotonic() - last_msg >= args.idle_s:
+                    break
+                continue
+            if msg.error():
+                print("[dlq-replay] Kafka error:", msg.error())
+                continue
+            last_msg = time.monotonic()
+            dl = DeadLetterEvent(**json.loads(msg.value().decode("utf-8")))
+            if (args.group and dl.group != args.group) or (args.error and dl.error_class != args.error) or (
+                args.source_topic and dl.source_topic != args.source_topic
+            ):
+                stats["filtered"] += 1
+                continue
+            model = kafka_client.MODEL_BY_TOPIC.get(dl.source_topic)
+            if dl.payload is None or model is None:
+                stats["unreplayable"] += 1
+                print(f"[dlq-replay] skip {dl.dead_letter_id}: no decodable payload for {dl.source_topic}")
+                continue
+            try:
+                event = model(**dl.payload)
+            except ValidationError as e:
+                stats["unreplayable"] += 1
+                print(f"[dlq-replay] skip {dl.dead_letter_id}: payload no longer matches {model.__name__}: {e.error_count()} errors")
+                continue
+            if args.dry_run:
+                stats["replayed"] += 1
+                print(f"[dlq-replay] would replay {dl.source_topic} key={dl.key} group={dl.group} {dl.error_class} x{dl.attempts}")
+                continue
+            if bucket is not None:
+                bucket.acquire()
+            produce_model(producer, dl.source_topic, event, key=dl.key)
+            producer.poll(0)
+            stats["replayed"] += 1
+    finally:
+        producer.flush(10)
+        consumer.close()
+    print(f"[dlq-replay] replayed={stats['replayed']} filtered={stats['filtered']} unreplayable={stats['unreplayable']}")
+
+
+if __name__ == "__main__":
+    main()
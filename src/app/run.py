@@ -1,20 +1,27 @@
 from __future__ import annotations
+import os
 import threading
+import time
 import uvicorn
-from ..config.settings import load_settings
-from ..shared.kafka_client import ensure_schemas, bind_topic_models
+from ..config.settings import Settings, load_settings
+from ..shared.kafka_client import ensure_schemas, bind_topic_models, memory_broker
+from ..shared.metrics import start_metrics_server
+from ..shared.tracing import configure_tracing
 from ..ingest.producer import publish_clips_from_video
 from ..agents.observer.observer import ObserverService
 from ..agents.sessionizer.sessionizer import SessionizerService
 from ..agents.thinker.thinker import ThinkerService
 from ..agents.doer.doer import DoerService
-from ..audit.bq_writer import BigQueryAuditWriter
+from ..audit.bq_writer import make_audit_writer
 from ..chat.api import build_app
 from ..rag.ingest_sop import ingest_sop_to_vertex
 
 
 def main():
     cfg = load_settings(".env")
+    configure_tracing(cfg)
+    if cfg.metrics_port:
+        start_metrics_server(cfg.metrics_port)
 
     ids = ensure_schemas(cfg)
     bind_topic_models(cfg)
@@ -26,7 +33,7 @@ def main():
     sessionizer = SessionizerService(cfg)
     thinker = ThinkerService(cfg)
     doer = DoerService(cfg)
-    audit = BigQueryAuditWriter(cfg)
+    audit = make_audit_writer(cfg)
 
     threading.Thread(target=observer.run, daemon=True).start()
     threading.Thread(target=sessionizer.run, daemon=True).start()
@@ -34,6 +41,10 @@ def main():
     threading.Thread(target=doer.run, daemon=True).start()
     threading.Thread(target=audit.run, daemon=True).start()
 
+    if cfg.kafka_transport == "memory":
+        run_local(cfg)
+        return
+
     RUN_ASSEMBLY = False
     RUN_SECURITY = False
 
@@ -68,5 +79,48 @@ def main():
     print(f"[run] Demo UI: http://{cfg.chat_host}:{cfg.chat_port}/ui")
     uvicorn.run(app, host=cfg.chat_host, port=cfg.chat_port, access_log=False)
 
+def run_local(cfg: Settings, report_every_s: float = 10.0) -> None:
+    # Everything shares one in-process broker, so the API (which reads from
+    # BigQuery and Vertex AI Search) is not started; audit rows go to the local sink.
+    jobs = [
+        (cfg.assembly_video_path, "cam-assembly-s4", "assembly", "S4", "S1345780"),
+        (cfg.security_video_path, "cam-security-1", "security", None, None),
+    ]
+    for video_path, camera_id, use_case, station_id, sku_id in jobs:
+        if not os.path.isfile(video_path):
+            print(f"[run] local: {use_case} video not found ({video_path}); skipped")
+            continue
+        threading.Thread(
+            target=publish_clips_from_video,
+            kwargs=dict(
+                cfg=cfg,
+                video_path=video_path,
+                camera_id=camera_id,
+                use_case=use_case,
+                station_id=station_id,
+                sku_id=sku_id,
+                max_clips=None,
+            ),
+            daemon=True,
+        ).start()
+    broker = memory_broker(cfg)
+    topics = [cfg.topic_clips, cfg.topic_observations, cfg.topic_sessions, cfg.topic_decisions, cfg.topic_actions]
+    print(f"[run] local pipeline: model={cfg.model_backend} blobs={cfg.blob_store} audit={cfg.audit_sink}")
+    t0 = time.time()
+    last = {t: 0 for t in topics}
+    try:
+        while True:
+            time.sleep(report_every_s)
+            counts = {t: sum(broker.watermarks(t, p)[1] for p in range(broker.num_partitions)) for t in topics}
+            elapsed = time.time() - t0
+            print(
+                f"[run] t={elapsed:.0f}s "
+                + " ".join(f"{t}={counts[t]} (+{(counts[t] - last[t]) / report_every_s:.1f}/s)" for t in topics)
+            )
+            last = counts
+    except KeyboardInterrupt:
+        print("[run] local pipeline stopped")
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,27 +1,163 @@
 from __future__ import annotations
 import json
+import os
+import threading
 from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
 from google.cloud import bigquery
 from ..config.settings import Settings
-from ..shared.kafka_client import make_consumer
-from ..shared.events import AuditEvent
+from ..shared.kafka_client import make_consumer, consume_loop
+from ..shared.dead_letter import make_dead_letter
+from ..shared.events import AuditEvent, event_kind
 
-def ensure_audit_table(cfg: Settings) -> None:
-    bq = bigquery.Client(project=cfg.gcp_project)
-    table_id = f"{cfg.gcp_project}.{cfg.bigquery_dataset}.{cfg.bigquery_audit_table}"
-    schema = [
+
+AUDIT_PARTITION_FIELD = "ts"
+AUDIT_CLUSTER_FIELDS = ["kind", "camera_id", "use_case"]
+
+
+def audit_table_id(cfg: Settings, table: Optional[str] = None) -> str:
+    return f"{cfg.gcp_project}.{cfg.bigquery_dataset}.{table or cfg.bigquery_audit_table}"
+
+
+def audit_schema() -> List[bigquery.SchemaField]:
+    return [
         bigquery.SchemaField("audit_id", "STRING", mode="REQUIRED"),
         bigquery.SchemaField("ts", "TIMESTAMP", mode="REQUIRED"),
         bigquery.SchemaField("kind", "STRING", mode="REQUIRED"),
         bigquery.SchemaField("trace_id", "STRING", mode="REQUIRED"),
         bigquery.SchemaField("payload_json", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("use_case", "STRING"),
+        bigquery.SchemaField("camera_id", "STRING"),
+        bigquery.SchemaField("action_type", "STRING"),
+        bigquery.SchemaField("priority", "STRING"),
+        bigquery.SchemaField("rule_id", "STRING"),
+        bigquery.SchemaField("severity", "STRING"),
+        bigquery.SchemaField("confidence", "FLOAT64"),
+        bigquery.SchemaField("latency_ms", "INT64"),
     ]
+
+
+def ensure_audit_table(cfg: Settings, table: Optional[str] = None) -> None:
+    bq = bigquery.Client(project=cfg.gcp_project)
+    table_id = audit_table_id(cfg, table)
     try:
-        bq.get_table(table_id)
+        existing = bq.get_table(table_id)
     except Exception:
-        table = bigquery.Table(table_id, schema=schema)
-        bq.create_table(table)
+        t = bigquery.Table(table_id, schema=audit_schema())
+        t.time_partitioning = bigquery.TimePartitioning(
+            type_=bigquery.TimePartitioningType.DAY,
+            field=AUDIT_PARTITION_FIELD,
+        )
+        t.clustering_fields = AUDIT_CLUSTER_FIELDS
+        bq.create_table(t)
         print("[audit] created BigQuery audit table:", table_id)
+        return
+    # Tables created before the promoted columns existed get them added in
+    # place; BigQuery only allows adding NULLABLE columns to a live table.
+    have = {f.name for f in existing.schema}
+    missing = [
+        f if f.mode == "NULLABLE" else bigquery.SchemaField(f.name, f.field_type, mode="NULLABLE")
+        for f in audit_schema()
+        if f.name not in have
+    ]
+    if missing:
+        existing.schema = list(existing.schema) + missing
+        bq.update_table(existing, ["schema"])
+        print("[audit] updated audit schema; added:", [f.name for f in missing])
+    if existing.time_partitioning is None:
+        print(
+            f"[audit] WARNING: {table_id} is not partitioned; "
+            "run `python -m src.audit.migrate_audit_table` to migrate it."
+        )
+
+
+def _str_or_none(v: Any) -> Optional[str]:
+    if v is None:
+        return None
+    s = str(v).strip()
+    return s or None
+
+
+def _float_or_none(v: Any) -> Optional[float]:
+    try:
+        return float(v) if v is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _int_or_none(v: Any) -> Optional[int]:
+    try:
+        return int(v) if v is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def promoted_columns(payload: Dict[str, Any]) -> Dict[str, Any]:
+    action = payload.get("action") if isinstance(payload.get("action"), dict) else {}
+    recs = payload.get("recommended_actions") if isinstance(payload.get("recommended_actions"), list) else []
+    if not action and recs and isinstance(recs[0], dict):
+        action = recs[0]
+    assessment = payload.get("assessment") if isinstance(payload.get("assessment"), dict) else {}
+    model = payload.get("model") if isinstance(payload.get("model"), dict) else {}
+    return {
+        "use_case": _str_or_none(payload.get("use_case")),
+        "camera_id": _str_or_none(payload.get("camera_id")),
+        "action_type": _str_or_none(action.get("type")),
+        "priority": _str_or_none(action.get("priority")),
+        "rule_id": _str_or_none(assessment.get("rule_id")),
+        "severity": _str_or_none(assessment.get("severity")),
+        "confidence": _float_or_none(assessment.get("confidence")),
+        "latency_ms": _int_or_none(model.get("latency_ms")),
+    }
+
+
+PROMOTED_COLUMNS_SQL = {
+    "use_case": "NULLIF(JSON_VALUE(payload_json, '$.use_case'), '')",
+    "camera_id": "NULLIF(JSON_VALUE(payload_json, '$.camera_id'), '')",
+    "action_type": (
+        "NULLIF(COALESCE(JSON_VALUE(payload_json, '$.action.type'), "
+        "JSON_VALUE(payload_json, '$.recommended_actions[0].type')), '')"
+    ),
+    "priority": (
+        "NULLIF(COALESCE(JSON_VALUE(payload_json, '$.action.priority'), "
+        "JSON_VALUE(payload_json, '$.recommended_actions[0].priority')), '')"
+    ),
+    "rule_id": "NULLIF(JSON_VALUE(payload_json, '$.assessment.rule_id'), '')",
+    "severity": "NULLIF(JSON_VALUE(payload_json, '$.assessment.severity'), '')",
+    "confidence": "SAFE_CAST(JSON_VALUE(payload_json, '$.assessment.confidence') AS FLOAT64)",
+    "latency_ms": "SAFE_CAST(JSON_VALUE(payload_json, '$.model.latency_ms') AS INT64)",
+}
+
+
+def audit_row(kind: str, trace_id: str, payload: dict) -> Dict[str, Any]:
+    evt = AuditEvent(
+        ts=datetime.now(timezone.utc),
+        kind=kind,
+        trace_id=trace_id,
+        payload=payload,
+    )
+    return {
+        "audit_id": evt.audit_id,
+        "ts": evt.ts.isoformat(),
+        "kind": evt.kind,
+        "trace_id": evt.trace_id,
+        "payload_json": json.dumps(evt.payload),
+        **promoted_columns(evt.payload),
+    }
+
+
+def _audit_consumer(cfg: Settings):
+    return make_consumer(
+        cfg,
+        group_id="audit-writer-v3",
+        topics=[
+            cfg.topic_observations,
+            cfg.topic_sessions,
+            cfg.topic_decisions,
+            cfg.topic_actions,
+        ],
+        offset_reset="latest",
+    )
 
 
 class BigQueryAuditWriter:
@@ -29,58 +165,41 @@ class BigQueryAuditWriter:
         self.cfg = cfg
         ensure_audit_table(cfg)
         self.bq = bigquery.Client(project=cfg.gcp_project)
-        self.consumer = make_consumer(
-            cfg,
-            group_id="audit-writer-v3",
-            topics=[
-                cfg.topic_observations,
-                cfg.topic_sessions,
-                cfg.topic_decisions,
-                cfg.topic_actions,
-            ],
-            offset_reset="latest",
-        )
+        self.consumer = _audit_consumer(cfg)
+        self.dead_letter = make_dead_letter(cfg, "audit-writer-v3")
 
     def _insert(self, kind: str, trace_id: str, payload: dict):
-        table_id = f"{self.cfg.gcp_project}.{self.cfg.bigquery_dataset}.{self.cfg.bigquery_audit_table}"
-        evt = AuditEvent(
-            ts=datetime.now(timezone.utc),
-            kind=kind,
-            trace_id=trace_id,
-            payload=payload,
-        )
-        row = {
-            "audit_id": evt.audit_id,
-            "ts": evt.ts.isoformat(),
-            "kind": evt.kind,
-            "trace_id": evt.trace_id,
-            "payload_json": json.dumps(evt.payload),
-        }
+        table_id = audit_table_id(self.cfg)
+        row = audit_row(kind, trace_id, payload)
         errors = self.bq.insert_rows_json(table_id, [row])
         if errors:
-            print("[audit] BigQuery insert errors:", errors)
+            raise RuntimeError(f"BigQuery insert errors: {errors}")
+
+    def handle_message(self, payload: dict, headers: Optional[Dict[str, str]] = None) -> None:
+        kind = (headers or {}).get("event_type") or event_kind(payload)
+        self._insert(kind, payload.get("trace_id", ""), payload)
 
     def run(self):
-        import json as _json
-
-        while True:
-            msg = self.consumer.poll(1.0)
-            if msg is None:
-                continue
-            if msg.error():
-                print("[audit] Kafka error:", msg.error())
-                continue
-            payload = _json.loads(msg.value().decode("utf-8"))
-            if "action_id" in payload:
-                kind, trace = "action", payload.get("trace_id", "")
-            elif "decision_id" in payload:
-                kind, trace = "decision", payload.get("trace_id", "")
-            elif "session_id" in payload:
-                kind, trace = "session", payload.get("trace_id", "")
-            elif "observation_id" in payload:
-                kind, trace = "observation", payload.get("trace_id", "")
-            elif "clip_id" in payload and "gcs_uri" in payload:
-                kind, trace = "clip", payload.get("trace_id", "")
-            else:
-                kind, trace = "unknown", payload.get("trace_id", "")
-            self._insert(kind, trace, payload)
\ No newline at end of file
+        consume_loop(self.consumer, self.handle_message, dead_letter=self.dead_letter, with_headers=True)
+
+
+class JsonlAuditWriter(BigQueryAuditWriter):
+    # Local sink with the same row shape as the BigQuery table, for offline runs.
+    def __init__(self, cfg: Settings):
+        self.cfg = cfg
+        self.path = cfg.local_audit_path
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self.consumer = _audit_consumer(cfg)
+        self.dead_letter = make_dead_letter(cfg, "audit-writer-v3")
+
+    def _insert(self, kind: str, trace_id: str, payload: dict):
+        line = json.dumps(audit_row(kind, trace_id, payload))
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def make_audit_writer(cfg: Settings) -> BigQueryAuditWriter:
+    if cfg.audit_sink == "jsonl":
+        return JsonlAuditWriter(cfg)
+    return BigQueryAuditWriter(cfg)
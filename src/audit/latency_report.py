@@ -0,0 +1,79 @@
+from __future__ import annotations
+import argparse
+import json
+from typing import Any, Dict, Iterable, List
+from ..config.settings import load_settings, Settings
+from ..shared.tracing import carry, stage_durations, summarize_action_spans
+from .bq_writer import audit_table_id
+
+STAGES = ("ingest", "observer", "sessionizer", "thinker", "doer")
+
+
+def _bigquery_rows(cfg: Settings, hours: int) -> List[Dict[str, Any]]:
+    from google.cloud import bigquery
+
+    bq = bigquery.Client(project=cfg.gcp_project)
+    q = f"""
+    SELECT use_case, JSON_QUERY(payload_json, '$.spans') AS spans
+    FROM `{audit_table_id(cfg)}`
+    WHERE ts >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {int(hours)} HOUR)
+      AND kind = 'action'
+      AND JSON_VALUE(payload_json, '$.status') = 'sent'
+    """
+    return [{"use_case": r["use_case"], "spans": json.loads(r["spans"] or "{}")} for r in bq.query(q).result()]
+
+
+def _jsonl_rows(path: str) -> List[Dict[str, Any]]:
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            if row.get("kind") != "action":
+                continue
+            payload = json.loads(row.get("payload_json") or "{}")
+            if payload.get("status") != "sent":
+                continue
+            out.append({"use_case": payload.get("use_case", ""), "spans": payload.get("spans") or {}})
+    return out
+
+
+def _pct(v: List[float], p: float) -> float:
+    return round(v[min(len(v) - 1, int(p * (len(v) - 1) + 0.5))], 3)
+
+
+def stage_report(rows: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    acc: Dict[str, List[float]] = {}
+    for r in rows:
+        spans = carry(r.get("spans"))
+        for stage in STAGES:
+            for name, secs in stage_durations(stage, spans).items():
+                acc.setdefault(f"{r.get('use_case', '')}:{name}", []).append(secs)
+    out = {}
+    for k, v in sorted(acc.items()):
+        v.sort()
+        out[k] = {"n": len(v), "p50": _pct(v, 0.5), "p95": _pct(v, 0.95), "p99": _pct(v, 0.99)}
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Clip-end -> action latency percentiles per use case, from audited action spans.")
+    ap.add_argument("--hours", type=int, default=24, help="BigQuery lookback window")
+    ap.add_argument("--jsonl", default=None, help="read a local audit JSONL file instead of BigQuery")
+    ap.add_argument("--stages", action="store_true", help="also print per-stage percentiles")
+    ap.add_argument("--env", default=".env")
+    args = ap.parse_args()
+    cfg = load_settings(args.env)
+    path = args.jsonl or (cfg.local_audit_path if cfg.audit_sink == "jsonl" else None)
+    rows = _jsonl_rows(path) if path else _bigquery_rows(cfg, args.hours)
+    print(f"{'use_case':<12}{'n':>8}{'p50 s':>10}{'p95 s':>10}{'p99 s':>10}")
+    for uc, r in summarize_action_spans(rows).items():
+        print(f"{uc:<12}{r['n']:>8}{r['p50']:>10.3f}{r['p95']:>10.3f}{r['p99']:>10.3f}")
+    if args.stages:
+        print()
+        print(f"{'stage':<36}{'n':>8}{'p50 s':>10}{'p95 s':>10}{'p99 s':>10}")
+        for k, r in stage_report(rows).items():
+            print(f"{k:<36}{r['n']:>8}{r['p50']:>10.3f}{r['p95']:>10.3f}{r['p99']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+from __future__ import annotations
+import argparse
+from datetime import date, timedelta
+from typing import Optional
+from google.cloud import bigquery
+from ..config.settings import load_settings, Settings
+from .bq_writer import PROMOTED_COLUMNS_SQL, audit_table_id, ensure_audit_table
+
+
+def _backfill_day(bq: bigquery.Client, src: str, dst: str, day: date) -> int:
+    cols = ", ".join(PROMOTED_COLUMNS_SQL.keys())
+    exprs = ",\n          ".join(f"{expr} AS {name}" for name, expr in PROMOTED_COLUMNS_SQL.items())
+    q = f"""
+        INSERT INTO `{dst}` (audit_id, ts, kind, trace_id, payload_json, {cols})
+        SELECT
+          s.audit_id, s.ts, s.kind, s.trace_id, s.payload_json,
+          {exprs}
+        FROM `{src}` AS s
+        WHERE s.ts >= TIMESTAMP(@day) AND s.ts < TIMESTAMP(DATE_ADD(@day, INTERVAL 1 DAY))
+          AND NOT EXISTS (
+            SELECT 1 FROM `{dst}` AS d
+            WHERE d.audit_id = s.audit_id
+              AND d.ts >= TIMESTAMP(@day) AND d.ts < TIMESTAMP(DATE_ADD(@day, INTERVAL 1 DAY))
+          )
+    """
+    job = bq.query(
+        q,
+        job_config=bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("day", "DATE", day)],
+        ),
+    )
+    job.result()
+    return int(job.num_dml_affected_rows or 0)
+
+
+def _day_range(bq: bigquery.Client, src: str) -> Optional[tuple[date, date]]:
+    rows = list(bq.query(f"SELECT DATE(MIN(ts)) AS lo, DATE(MAX(ts)) AS hi FROM `{src}`").result())
+    if not rows or rows[0]["lo"] is None:
+        return None
+    return rows[0]["lo"], rows[0]["hi"]
+
+
+def migrate_audit_table(
+    cfg: Settings,
+    source_table: str,
+    dest_table: str,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+) -> int:
+    bq = bigquery.Client(project=cfg.gcp_project)
+    src = audit_table_id(cfg, source_table)
+    dst = audit_table_id(cfg, dest_table)
+    if src == dst:
+        raise ValueError("source and destination audit tables must differ")
+    ensure_audit_table(cfg, dest_table)
+    rng = _day_range(bq, src)
+    if rng is None:
+        print(f"[audit-migrate] {src} is empty; nothing to backfill.")
+        return 0
+    lo = max(rng[0], since) if since else rng[0]
+    hi = min(rng[1], until) if until else rng[1]
+    total = 0
+    day = lo
+    while day <= hi:
+        n = _backfill_day(bq, src, dst, day)
+        total += n
+        print(f"[audit-migrate] {day.isoformat()} rows={n}")
+        day += timedelta(days=1)
+    print(f"[audit-migrate] done: {total} rows {src} -> {dst}")
+    return total
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(
+        description="Backfill a legacy audit table into the partitioned/clustered schema with typed columns.",
+    )
+    ap.add_argument("--source", required=True, help="legacy audit table name (in BIGQUERY_DATASET)")
+    ap.add_argument("--dest", default=None, help="destination table (default: BIGQUERY_AUDIT_TABLE)")
+    ap.add_argument("--since", type=date.fromisoformat, default=None, help="first day to copy (YYYY-MM-DD)")
+    ap.add_argument("--until", type=date.fromisoformat, default=None, help="last day to copy (YYYY-MM-DD)")
+    ap.add_argument("--env", default=".env")
+    args = ap.parse_args()
+    cfg = load_settings(args.env)
+    migrate_audit_table(
+        cfg,
+        source_table=args.source,
+        dest_table=args.dest or cfg.bigquery_audit_table,
+        since=args.since,
+        until=args.until,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,24 @@
 from __future__ import annotations
 import json
 import threading
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, FileResponse, StreamingResponse, Response
 from pydantic import BaseModel
 from google.cloud import bigquery
 from ..config.settings import Settings
 from ..shared.vertex_client import init_vertex
 from ..rag.vertex_search_answer import answer_query
 from ..ingest.producer import publish_clips_from_video
+from ..audit.bq_writer import audit_table_id
+from .kpi import KpiService
+from .live_feed import LiveFeedService
+from .backend import BackendPool
+from ..rag.answer_cache import AnswerCache, HashingEmbedder, SopVersion
+from ..rag.ingest_sop import sop_table_id, sop_table_version
+from .static_assets import build_pages
+from ..shared.metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE
+from ..shared.tracing import latency_summary
+from ..shared.model_backend import PRIORITY_CHAT, model_limiter
 
 
 class ChatIn(BaseModel):
@@ -1068,7 +1078,10 @@ def _ui_html() -> str:
       let useCase = "security";
       let seen = new Set();
       let traceToGcs = new Map();
+      let decisionsByKey = new Map();
       let latestDecision = null;
+      let liveSource = null;
+      let pollTimer = null;
 
       const feedEl = document.getElementById("feed");
       const thinkingPanel = document.getElementById("thinkingPanel");
@@ -1495,6 +1508,11 @@ def _ui_html() -> str:
         `;
       }
 
+      function eventKey(ev) {
+        const p = ev?.payload || {};
+        return String(p.action_id || p.decision_id || p.session_id || p.observation_id || ev?.audit_id || "");
+      }
+
       function renderCard(ev) {
         const ts = ev.ts || "";
         const kind = ev.kind || "";
@@ -1513,7 +1531,7 @@ def _ui_html() -> str:
         return `
           <div class="rounded-2xl bg-zinc-950/45 ring-1 ring-zinc-800/70 p-5 hover:ring-zinc-600/80 transition cursor-${kind === "decision" ? "pointer" : "default"}"
                ${clickHint}
-               data-audit-id="${escapeHtml(ev.audit_id || "")}">
+               data-audit-id="${escapeHtml(eventKey(ev))}">
             <div class="flex items-start justify-between gap-3">
               <div class="min-w-0">
                 <div class="t-18 font-semibold text-zinc-100">${escapeHtml(kind.charAt(0).toUpperCase() + kind.slice(1))}</div>
@@ -1528,60 +1546,90 @@ def _ui_html() -> str:
         `;
       }
 
-      async function poll() {
-        try {
-          const r = await fetch("/recent?limit=260");
-          const items = await r.json();
-
-          items.forEach(learnClipUri);
+      function ingest(items) {
+        items.forEach(learnClipUri);
 
-          items.reverse().forEach(ev => {
-            const auditId = ev.audit_id || "";
-            if (!auditId) return;
-            if (seen.has(auditId)) return;
+        items.forEach(ev => {
+          const key = eventKey(ev);
+          if (!key) return;
+          if (seen.has(key)) return;
 
-            const html = renderCard(ev);
-            if (html) {
-              feedEl.insertAdjacentHTML("beforeend", html);
-              feedEl.scrollTop = feedEl.scrollHeight;
+          const html = renderCard(ev);
+          if (html) {
+            feedEl.insertAdjacentHTML("beforeend", html);
+            feedEl.scrollTop = feedEl.scrollHeight;
 
-              if (ev.kind === "decision" && relevantToUseCase(ev.payload || {})) {
-                latestDecision = ev;
-                renderDecisionPanel(latestDecision);
-              }
+            if (ev.kind === "decision" && relevantToUseCase(ev.payload || {})) {
+              decisionsByKey.set(key, ev);
+              latestDecision = ev;
+              renderDecisionPanel(latestDecision);
+            }
 
-              if (relevantToUseCase(ev.payload || {})) {
-                maybeToastCritical(ev);
-              }
+            if (relevantToUseCase(ev.payload || {})) {
+              maybeToastCritical(ev);
             }
-            seen.add(auditId);
-          });
+          }
+          seen.add(key);
+        });
+      }
 
+      async function poll() {
+        try {
+          const r = await fetch("/recent?limit=260");
+          const items = await r.json();
+          ingest(items.reverse());
         } catch (e) {}
       }
 
+      function startPolling() {
+        if (pollTimer) return;
+        poll();
+        pollTimer = setInterval(poll, 1000);
+      }
+
+      function stopPolling() {
+        if (!pollTimer) return;
+        clearInterval(pollTimer);
+        pollTimer = null;
+      }
+
+      // Server-push feed; falls back to polling /recent while the stream is down.
+      function connectLive() {
+        if (!window.EventSource) {
+          startPolling();
+          return;
+        }
+        if (liveSource) liveSource.close();
+        liveSource = new EventSource("/events/stream?limit=260");
+        liveSource.addEventListener("audit", (m) => {
+          try { ingest([JSON.parse(m.data)]); } catch (_) {}
+        });
+        liveSource.onopen = () => stopPolling();
+        liveSource.onerror = () => {
+          startPolling();
+          if (liveSource && liveSource.readyState === EventSource.CLOSED) {
+            liveSource = null;
+            setTimeout(connectLive, 5000);
+          }
+        };
+      }
+
       // Click-to-pin decision
       feedEl.addEventListener("click", (e) => {
         const card = e.target.closest('[data-click="decision"]');
         if (!card) return;
-        const auditId = card.getAttribute("data-audit-id");
-        (async () => {
-          try {
-            const r = await fetch("/recent?limit=260");
-            const items = await r.json();
-            const found = items.find(x => x.audit_id === auditId);
-            if (found && found.kind === "decision") {
-              latestDecision = found;
-              renderDecisionPanel(latestDecision);
-            }
-          } catch (_) {}
-        })();
+        const found = decisionsByKey.get(card.getAttribute("data-audit-id"));
+        if (found) {
+          latestDecision = found;
+          renderDecisionPanel(latestDecision);
+        }
       });
 
       btnClear.addEventListener("click", () => {
         feedEl.innerHTML = "";
         seen = new Set();
         traceToGcs = new Map();
+        decisionsByKey = new Map();
         latestDecision = null;
         renderDecisionPanel(null);
         chatLog.innerHTML = "";
@@ -1621,11 +1669,12 @@ def _ui_html() -> str:
         feedEl.innerHTML = "";
         seen = new Set();
         traceToGcs = new Map();
+        decisionsByKey = new Map();
         latestDecision = null;
         renderDecisionPanel(null);
 
         refreshStreamStatus();
-        poll();
+        connectLive();
       }
 
       ucSecurity.addEventListener("click", () => setUseCase("security"));
@@ -1673,10 +1722,8 @@ def _ui_html() -> str:
       loadMeta();
       loadKpi();
       setUseCase("security");
-      poll();
       refreshStreamStatus();
 
-      setInterval(poll, 1000);
       setInterval(loadKpi, 15000);
       setInterval(refreshStreamStatus, 3000);
     </script>
@@ -1685,11 +1732,52 @@ def _ui_html() -> str:
 """
 
 
+def ui_pages() -> dict[str, tuple[str, str]]:
+    return {
+        "/": (
+            "home",
+            _home_html(
+                linkedin_url="https://www.linkedin.com/in/niketshah-9033959570",
+                github_url="https://github.com/Niket93/sentinel",
+                youtube_embed_url="https://www.youtube.com/embed/n2nL2sf2FAU",
+            ),
+        ),
+        "/ui": ("ui", _ui_html()),
+    }
+
+
+def _chat_cache_embedder(cfg: Settings):
+    if cfg.chat_cache_embedder == "vertex":
+        from ..rag.vertex_embed import VertexEmbedder
+        return VertexEmbedder(cfg).embed
+    if cfg.chat_cache_embedder == "local":
+        return HashingEmbedder().embed
+    return None
+
+
 def build_app(cfg: Settings) -> FastAPI:
     app = FastAPI()
     init_vertex(cfg)
     bq = bigquery.Client(project=cfg.gcp_project)
-    table_id = f"{cfg.gcp_project}.{cfg.bigquery_dataset}.{cfg.bigquery_audit_table}"
+    table_id = audit_table_id(cfg)
+    kpi_service = KpiService(cfg)
+    kpi_service.start()
+    live_feed = LiveFeedService(cfg)
+    live_feed.start()
+    backend = BackendPool(cfg.api_bigquery_concurrency, cfg.api_search_concurrency)
+    app.add_event_handler("shutdown", backend.shutdown)
+    chat_cache = AnswerCache(
+        max_entries=cfg.chat_cache_max_entries,
+        ttl_s=cfg.chat_cache_ttl_s,
+        embed_fn=_chat_cache_embedder(cfg),
+        similarity_threshold=cfg.chat_cache_similarity,
+    )
+    sop_version = SopVersion(
+        cfg.assembly_sop_path,
+        probe=lambda: sop_table_version(bq, sop_table_id(cfg)),
+        ttl_s=cfg.sop_version_ttl_s,
+    )
+    static = build_pages(ui_pages(), tailwind_css_path=cfg.ui_tailwind_css)
 
     stream_stop_events: dict[str, threading.Event] = {}
     stream_threads: dict[str, threading.Thread] = {}
@@ -1746,7 +1834,7 @@ def build_app(cfg: Settings) -> FastAPI:
             ev.set()
 
     @app.get("/meta")
-    def meta():
+    async def meta():
         def red(s: str) -> str:
             if not s:
                 return ""
@@ -1772,114 +1860,53 @@ def build_app(cfg: Settings) -> FastAPI:
         }
 
     @app.get("/stream/status")
-    def stream_status():
+    async def stream_status():
         return {"running": stream_running}
 
     @app.post("/stream/start")
-    def stream_start(req: StreamReq):
+    async def stream_start(req: StreamReq):
         _start_stream(req.use_case)
         return {"ok": True, "running": stream_running}
 
     @app.post("/stream/stop")
-    def stream_stop(req: StreamReq):
+    async def stream_stop(req: StreamReq):
         _stop_stream(req.use_case)
         return {"ok": True, "running": stream_running}
 
     @app.get("/kpi")
-    def kpi():
-        q = f"""
-        WITH recent AS (
-          SELECT kind, ts, payload_json
-          FROM `{table_id}`
-          WHERE ts >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 24 HOUR)
-        ),
-        actions AS (
-          SELECT
-            ts,
-            JSON_VALUE(payload_json, '$.use_case') AS use_case,
-            JSON_VALUE(payload_json, '$.action.type') AS action_type,
-            JSON_VALUE(payload_json, '$.action.priority') AS priority
-          FROM recent
-          WHERE kind = 'action'
-        )
-        SELECT
-          (SELECT COUNT(*) FROM actions WHERE action_type = 'stop_line') AS stop_line_24h,
-          (SELECT COUNT(*) FROM actions WHERE action_type = 'alert') AS alert_24h,
-          (SELECT COUNT(*) FROM recent WHERE kind = 'decision') AS decisions_24h,
-          (SELECT COUNT(*) FROM recent WHERE kind = 'observation') AS observations_24h,
-          (SELECT MAX(ts) FROM actions WHERE action_type = 'stop_line') AS last_stop_line_ts,
-          (SELECT COUNT(*) FROM actions WHERE use_case = 'security' AND action_type = 'stop_line') AS stop_sec,
-          (SELECT COUNT(*) FROM actions WHERE use_case = 'security' AND action_type = 'alert') AS alert_sec,
-          (SELECT COUNT(*) FROM actions WHERE use_case = 'assembly' AND action_type = 'stop_line') AS stop_asm,
-          (SELECT COUNT(*) FROM actions WHERE use_case = 'assembly' AND action_type = 'alert') AS alert_asm,
-          (SELECT COUNT(*) FROM actions WHERE priority = 'P1') AS p1,
-          (SELECT COUNT(*) FROM actions WHERE priority = 'P2') AS p2,
-          (SELECT COUNT(*) FROM actions WHERE priority = 'P3') AS p3
-        """
-        rows = list(bq.query(q).result())
-        if not rows:
-            return {
-                "stop_line_24h": 0,
-                "alert_24h": 0,
-                "decisions_24h": 0,
-                "observations_24h": 0,
-                "last_stop_line_ts": None,
-                "by_use_case": {"security": {"stop_line": 0, "alert": 0}, "assembly": {"stop_line": 0, "alert": 0}},
-                "priorities": {"P1": 0, "P2": 0, "P3": 0},
-                "top_rules": [],
-            }
+    async def kpi():
+        return kpi_service.agg.snapshot()
 
-        r = rows[0]
-
-        q_rules = f"""
-        WITH recent_decisions AS (
-          SELECT JSON_VALUE(payload_json, '$.assessment.rule_id') AS rule_id
-          FROM `{table_id}`
-          WHERE kind = 'decision'
-            AND ts >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL 24 HOUR)
-        )
-        SELECT rule_id, COUNT(*) AS cnt
-        FROM recent_decisions
-        WHERE rule_id IS NOT NULL AND rule_id != ''
-        GROUP BY rule_id
-        ORDER BY cnt DESC
-        LIMIT 8
-        """
-        rules_rows = list(bq.query(q_rules).result())
-        top_rules = [{"rule_id": rr["rule_id"], "count": int(rr["cnt"])} for rr in rules_rows]
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
 
-        return {
-            "stop_line_24h": int(r["stop_line_24h"] or 0),
-            "alert_24h": int(r["alert_24h"] or 0),
-            "decisions_24h": int(r["decisions_24h"] or 0),
-            "observations_24h": int(r["observations_24h"] or 0),
-            "last_stop_line_ts": (r["last_stop_line_ts"].isoformat() if r["last_stop_line_ts"] else None),
-            "by_use_case": {
-                "security": {"stop_line": int(r["stop_sec"] or 0), "alert": int(r["alert_sec"] or 0)},
-                "assembly": {"stop_line": int(r["stop_asm"] or 0), "alert": int(r["alert_asm"] or 0)},
-            },
-            "priorities": {"P1": int(r["p1"] or 0), "P2": int(r["p2"] or 0), "P3": int(r["p3"] or 0)},
-            "top_rules": top_rules,
-        }
+    @app.get("/metrics/latency")
+    async def metrics_latency():
+        return latency_summary()
 
     @app.get("/ui", response_class=HTMLResponse)
-    def ui():
-        return _ui_html()
+    async def ui(request: Request):
+        return static.response(request, "/ui")
 
     @app.get("/", response_class=HTMLResponse, include_in_schema=False)
-    def home():
-        return _home_html(linkedin_url="https://www.linkedin.com/in/niketshah-9033959570", github_url="https://github.com/Niket93/sentinel", youtube_embed_url="https://www.youtube.com/embed/n2nL2sf2FAU")
+    async def home(request: Request):
+        return static.response(request, "/")
+
+    @app.get("/static/{name}", include_in_schema=False)
+    async def static_asset(name: str, request: Request):
+        return static.response(request, f"/static/{name}")
 
     @app.get("/video")
-    def video(use_case: str = "security"):
+    async def video(use_case: str = "security"):
         path = cfg.assembly_video_path if use_case == "assembly" else cfg.security_video_path
         return FileResponse(path, media_type="video/mp4")
 
-    @app.get("/recent")
-    def recent(limit: int = 80):
+    def _recent_rows(limit: int) -> list[dict]:
         q = f"""
         SELECT audit_id, ts, kind, trace_id, payload_json
         FROM `{table_id}`
+        WHERE ts >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {int(cfg.audit_recent_lookback_hours)} HOUR)
         ORDER BY ts DESC
         LIMIT {int(limit)}
         """
@@ -1897,12 +1924,27 @@ def build_app(cfg: Settings) -> FastAPI:
             )
         return out
 
-    @app.post("/chat")
-    def chat(inp: ChatIn):
-        q = (inp.question or "").strip()
-        if not q:
-            return {"answer": "Please provide a question.", "source": "vertex_ai_search"}
-        sr = answer_query(cfg, q, session_id=inp.session_id)
+    @app.get("/recent")
+    async def recent(limit: int = 80):
+        limit = int(limit)
+        return await backend.coalesce(("recent", limit), backend.bigquery, _recent_rows, limit)
+
+    @app.get("/events/stream")
+    async def events_stream(request: Request, since: int | None = None, limit: int = 260):
+        last_id = since
+        if last_id is None:
+            hdr = request.headers.get("last-event-id", "").strip()
+            last_id = int(hdr) if hdr.isdigit() else None
+        return StreamingResponse(
+            live_feed.feed.sse(request.is_disconnected, last_id, int(limit)),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    answer_limiter = model_limiter(cfg, "vertex-search-answer")
+
+    def _answer(q: str, session_id: str | None) -> dict:
+        sr = answer_limiter.call(lambda: answer_query(cfg, q, session_id=session_id), priority=PRIORITY_CHAT)
         answer = sr.answer_text.strip() if sr.answer_text else ""
         if not answer:
             if sr.snippets:
@@ -1916,4 +1958,24 @@ def build_app(cfg: Settings) -> FastAPI:
             "snippets_count": len(sr.snippets),
         }
 
+    @app.post("/chat")
+    async def chat(inp: ChatIn):
+        q = (inp.question or "").strip()
+        if not q:
+            return {"answer": "Please provide a question.", "source": "vertex_ai_search"}
+        if inp.session_id:
+            out = await backend.coalesce(("chat", q, inp.session_id), backend.search, _answer, q, inp.session_id)
+            return {**out, "cache": {"hit": False, "match": None, **chat_cache.stats()}}
+        # The version probe is a BigQuery query and the cache may embed remotely,
+        # so both run on the bounded lanes; every request asks for the same
+        # version, so concurrent probes coalesce into one.
+        version = sop_version.fresh() or await backend.coalesce(("sop_version",), backend.bigquery, sop_version.current)
+        hit = await backend.search.run(chat_cache.get, q, version)
+        if hit.value is not None:
+            return {**hit.value, "cache": {"hit": True, "match": hit.match, "similarity": hit.similarity, **chat_cache.stats()}}
+        out = await backend.coalesce(("chat", q, None), backend.search, _answer, q, None)
+        if out["answer"] != "I don't know.":
+            await backend.search.run(chat_cache.put, q, version, out, hit.vector)
+        return {**out, "cache": {"hit": False, "match": None, **chat_cache.stats()}}
+
     return app
\ No newline at end of file
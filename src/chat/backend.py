@@ -0,0 +1,60 @@
+from __future__ import annotations
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+from ..shared.metrics import QUEUE_DEPTH
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(fn())
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda f, k=key: self._drop(k, f))
+        return await asyncio.shield(fut)
+
+    def _drop(self, key: Hashable, fut: asyncio.Future) -> None:
+        if self._inflight.get(key) is fut:
+            del self._inflight[key]
+        if not fut.cancelled():
+            fut.exception()
+
+
+class BlockingLane:
+    def __init__(self, name: str, concurrency: int):
+        self.name = name
+        self.concurrency = max(1, int(concurrency))
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f"api-{name}")
+        self._depth = QUEUE_DEPTH.labels(f"api.{name}")
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        loop = asyncio.get_running_loop()
+        self._depth.inc()
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            self._depth.dec()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class BackendPool:
+    def __init__(self, bigquery_concurrency: int, search_concurrency: int):
+        self.bigquery = BlockingLane("bigquery", bigquery_concurrency)
+        self.search = BlockingLane("search", search_concurrency)
+        self._flight = SingleFlight()
+
+    async def coalesce(self, key: Hashable, lane: BlockingLane, fn: Callable[..., T], *args: Any) -> T:
+        return await self._flight.do((lane.name, key), lambda: lane.run(fn, *args))
+
+    def shutdown(self) -> None:
+        self.bigquery.shutdown()
+        self.search.shutdown()
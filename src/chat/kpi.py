@@ -0,0 +1,174 @@
+from __future__ import annotations
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+from google.cloud import bigquery
+from ..config.settings import Settings
+from ..shared.events import event_kind
+from ..shared.kafka_client import make_tail_consumer, consume_loop
+from ..audit.bq_writer import audit_table_id, promoted_columns
+
+KPI_KINDS = ("observation", "decision", "action")
+USE_CASES = ("security", "assembly")
+PRIORITIES = ("P1", "P2", "P3")
+
+Key = Tuple[str, ...]
+
+
+def _keys_for(kind: str, use_case: Optional[str], action_type: Optional[str], priority: Optional[str], rule_id: Optional[str]) -> list[Key]:
+    keys: list[Key] = [("kind", kind)]
+    if kind == "action":
+        keys.append(("action", use_case or "", action_type or ""))
+        if priority:
+            keys.append(("priority", priority))
+    elif kind == "decision" and rule_id:
+        keys.append(("rule", rule_id))
+    return keys
+
+
+def _event_time(payload: Dict[str, Any]) -> float:
+    try:
+        return datetime.fromisoformat(str(payload["ts"]).replace("Z", "+00:00")).timestamp()
+    except (KeyError, ValueError):
+        return time.time()
+
+
+class KpiAggregator:
+    def __init__(self, window_s: int = 24 * 3600, bucket_s: int = 60):
+        self.window_s = int(window_s)
+        self.bucket_s = int(bucket_s)
+        self.n_buckets = max(1, self.window_s // self.bucket_s)
+        self._buckets: Dict[int, Counter] = {}
+        self._totals: Counter = Counter()
+        self._last_stop_line: Optional[float] = None
+        self._evicted_upto: int = 0
+        self._lock = threading.Lock()
+
+    def _bucket_of(self, t: float) -> int:
+        return int(t) // self.bucket_s
+
+    def _evict(self, now_bucket: int) -> None:
+        horizon = now_bucket - self.n_buckets + 1
+        if horizon <= self._evicted_upto:
+            return
+        for b in [b for b in self._buckets if b < horizon]:
+            self._totals.subtract(self._buckets.pop(b))
+        self._totals = +self._totals
+        self._evicted_upto = horizon
+
+    def add(self, t: float, keys: list[Key], n: int = 1) -> None:
+        b = self._bucket_of(t)
+        with self._lock:
+            self._evict(self._bucket_of(time.time()))
+            if b < self._evicted_upto:
+                return
+            c = self._buckets.setdefault(b, Counter())
+            for k in keys:
+                c[k] += n
+                self._totals[k] += n
+            if any(k[0] == "action" and k[2] == "stop_line" for k in keys):
+                if self._last_stop_line is None or t > self._last_stop_line:
+                    self._last_stop_line = t
+
+    def record(self, kind: str, payload: Dict[str, Any], t: Optional[float] = None) -> None:
+        # Events are bucketed by their own ts, so a consumer that falls behind
+        # (or catches up after a pause) still counts them in the right minute.
+        if kind not in KPI_KINDS:
+            return
+        p = promoted_columns(payload)
+        keys = _keys_for(kind, p["use_case"], p["action_type"], p["priority"], p["rule_id"])
+        self.add(_event_time(payload) if t is None else t, keys)
+
+    def snapshot(self, top_rules: int = 8) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            self._evict(self._bucket_of(now))
+            tot = dict(self._totals)
+            last = self._last_stop_line
+        if last is not None and now - last > self.window_s:
+            last = None
+
+        def action_count(use_case: Optional[str], action_type: str) -> int:
+            return sum(
+                v for k, v in tot.items()
+                if k[0] == "action" and k[2] == action_type and (use_case is None or k[1] == use_case)
+            )
+
+        rules = sorted(((k[1], v) for k, v in tot.items() if k[0] == "rule" and v > 0), key=lambda x: -x[1])
+        return {
+            "stop_line_24h": action_count(None, "stop_line"),
+            "alert_24h": action_count(None, "alert"),
+            "decisions_24h": int(tot.get(("kind", "decision"), 0)),
+            "observations_24h": int(tot.get(("kind", "observation"), 0)),
+            "last_stop_line_ts": (datetime.fromtimestamp(last, tz=timezone.utc).isoformat() if last else None),
+            "by_use_case": {
+                uc: {"stop_line": action_count(uc, "stop_line"), "alert": action_count(uc, "alert")}
+                for uc in USE_CASES
+            },
+            "priorities": {p: int(tot.get(("priority", p), 0)) for p in PRIORITIES},
+            "top_rules": [{"rule_id": r, "count": int(c)} for r, c in rules[:top_rules]],
+        }
+
+
+def bootstrap_from_bigquery(cfg: Settings, agg: KpiAggregator, until: datetime) -> int:
+    bq = bigquery.Client(project=cfg.gcp_project)
+    q = f"""
+    SELECT
+      DIV(UNIX_SECONDS(ts), @bucket_s) * @bucket_s AS bucket,
+      kind, use_case, action_type, priority, rule_id,
+      COUNT(*) AS cnt,
+      UNIX_MILLIS(MAX(ts)) AS max_ts_ms
+    FROM `{audit_table_id(cfg)}`
+    WHERE ts >= TIMESTAMP_SUB(@until, INTERVAL @window_s SECOND)
+      AND ts < @until
+      AND kind IN ('observation', 'decision', 'action')
+    GROUP BY bucket, kind, use_case, action_type, priority, rule_id
+    """
+    job = bq.query(
+        q,
+        job_config=bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("bucket_s", "INT64", agg.bucket_s),
+                bigquery.ScalarQueryParameter("window_s", "INT64", agg.window_s),
+                bigquery.ScalarQueryParameter("until", "TIMESTAMP", until),
+            ],
+        ),
+    )
+    rows = 0
+    for r in job.result():
+        keys = _keys_for(r["kind"], r["use_case"], r["action_type"], r["priority"], r["rule_id"])
+        t = (r["max_ts_ms"] / 1000.0) if r["max_ts_ms"] is not None else float(r["bucket"])
+        agg.add(t, keys, int(r["cnt"]))
+        rows += 1
+    return rows
+
+
+class KpiService:
+    def __init__(self, cfg: Settings, agg: Optional[KpiAggregator] = None):
+        self.cfg = cfg
+        self.agg = agg or KpiAggregator()
+        self.consumer = make_tail_consumer(
+            cfg,
+            "kpi-aggregator-v1",
+            topics=[cfg.topic_observations, cfg.topic_decisions, cfg.topic_actions],
+        )
+
+    def handle_message(self, payload: dict) -> None:
+        self.agg.record(event_kind(payload), payload)
+
+    def _bootstrap(self, until: datetime) -> None:
+        try:
+            n = bootstrap_from_bigquery(self.cfg, self.agg, until)
+            print(f"[kpi] bootstrapped {n} bucket rows from BigQuery")
+        except Exception as e:
+            print("[kpi] BigQuery bootstrap failed:", e)
+
+    def start(self) -> None:
+        started_at = datetime.now(timezone.utc)
+        threading.Thread(target=self.run, daemon=True).start()
+        threading.Thread(target=self._bootstrap, args=(started_at,), daemon=True).start()
+
+    def run(self) -> None:
+        consume_loop(self.consumer, self.handle_message)
@@ -0,0 +1,122 @@
+from __future__ import annotations
+import asyncio
+import json
+import threading
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+from google.cloud import bigquery
+from ..config.settings import Settings
+from ..shared.events import event_kind
+from ..shared.kafka_client import make_tail_consumer, consume_loop
+from ..audit.bq_writer import audit_table_id
+
+
+def _event_key(kind: str, payload: Dict[str, Any]) -> str:
+    for k in ("action_id", "decision_id", "session_id", "observation_id", "clip_id"):
+        v = payload.get(k)
+        if v:
+            return str(v)
+    return str(uuid.uuid4())
+
+
+class LiveFeed:
+    def __init__(self, capacity: int = 2000):
+        self.capacity = int(capacity)
+        self._buf: Deque[Dict[str, Any]] = deque(maxlen=self.capacity)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, kind: str, trace_id: str, payload: Dict[str, Any], ts: Optional[str] = None) -> int:
+        with self._lock:
+            self._seq += 1
+            self._buf.append({
+                "id": self._seq,
+                "audit_id": _event_key(kind, payload),
+                "ts": ts or datetime.now(timezone.utc).isoformat(),
+                "kind": kind,
+                "trace_id": trace_id,
+                "payload": payload,
+            })
+            seq = self._seq
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake)
+        return seq
+
+    def _wake(self) -> None:
+        ev, self._changed = self._changed, asyncio.Event()
+        ev.set()
+
+    def since(self, last_id: Optional[int], backlog: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            if last_id is None or last_id > self._seq:
+                return list(self._buf)[-backlog:] if backlog > 0 else []
+            return [e for e in self._buf if e["id"] > last_id]
+
+    async def sse(self, is_disconnected, last_id: Optional[int], backlog: int, keepalive_s: float = 15.0) -> AsyncIterator[str]:
+        self._loop = asyncio.get_running_loop()
+        yield "retry: 3000\n\n"
+        cursor = last_id
+        while not await is_disconnected():
+            changed = self._changed
+            items = self.since(cursor, backlog)
+            if items:
+                for e in items:
+                    yield f"id: {e['id']}\nevent: audit\ndata: {json.dumps(e)}\n\n"
+                cursor = items[-1]["id"]
+                continue
+            if cursor is None:
+                cursor = 0
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=keepalive_s)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+
+
+def seed_from_bigquery(cfg: Settings, feed: LiveFeed, limit: int) -> int:
+    bq = bigquery.Client(project=cfg.gcp_project)
+    q = f"""
+    SELECT ts, kind, trace_id, payload_json
+    FROM `{audit_table_id(cfg)}`
+    WHERE ts >= TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {int(cfg.audit_recent_lookback_hours)} HOUR)
+    ORDER BY ts DESC
+    LIMIT {int(limit)}
+    """
+    rows = list(bq.query(q).result())
+    for rr in reversed(rows):
+        feed.publish(rr["kind"], rr["trace_id"], json.loads(rr["payload_json"]), ts=rr["ts"].isoformat())
+    return len(rows)
+
+
+class LiveFeedService:
+    def __init__(self, cfg: Settings, feed: Optional[LiveFeed] = None):
+        self.cfg = cfg
+        self.feed = feed or LiveFeed()
+        self.consumer = make_tail_consumer(
+            cfg,
+            "live-feed-v1",
+            topics=[
+                cfg.topic_observations,
+                cfg.topic_sessions,
+                cfg.topic_decisions,
+                cfg.topic_actions,
+            ],
+        )
+
+    def handle_message(self, payload: dict) -> None:
+        self.feed.publish(event_kind(payload), payload.get("trace_id", ""), payload)
+
+    def start(self, seed_limit: int = 260) -> None:
+        try:
+            n = seed_from_bigquery(self.cfg, self.feed, seed_limit)
+            print(f"[live] seeded {n} events from BigQuery")
+        except Exception as e:
+            print("[live] BigQuery seed failed:", e)
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def run(self) -> None:
+        consume_loop(self.consumer, self.handle_message)
@@ -0,0 +1,154 @@
+from __future__ import annotations
+import argparse
+import gzip
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+TAILWIND_CDN_TAG = '<script src="https://cdn.tailwindcss.com"></script>'
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+_INLINE_SCRIPT = re.compile(r"<script>(.*?)</script>", re.DOTALL)
+_INLINE_STYLE = re.compile(r"<style>(.*?)</style>", re.DOTALL)
+
+
+@dataclass(frozen=True)
+class Asset:
+    body: bytes
+    gzip: bytes
+    br: Optional[bytes]
+    etag: str
+    media_type: str
+    cache_control: str
+
+
+def build_asset(body: bytes, media_type: str, cache_control: str) -> Asset:
+    return Asset(
+        body=body,
+        gzip=gzip.compress(body, compresslevel=9, mtime=0),
+        br=(brotli.compress(body, quality=11) if brotli is not None else None),
+        etag='"' + hashlib.sha256(body).hexdigest()[:32] + '"',
+        media_type=media_type,
+        cache_control=cache_control,
+    )
+
+
+def _accepts(request: Request, coding: str) -> bool:
+    for part in request.headers.get("accept-encoding", "").split(","):
+        token, _, params = part.strip().partition(";")
+        if token.strip().lower() != coding:
+            continue
+        q = params.strip().replace(" ", "")
+        if q.startswith("q="):
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+class AssetStore:
+    def __init__(self):
+        self._assets: Dict[str, Asset] = {}
+
+    def add(self, path: str, body: bytes, media_type: str, cache_control: str = IMMUTABLE) -> str:
+        self._assets[path] = build_asset(body, media_type, cache_control)
+        return path
+
+    def add_fingerprinted(self, stem: str, ext: str, body: bytes, media_type: str) -> str:
+        h = hashlib.sha256(body).hexdigest()[:12]
+        return self.add(f"/static/{stem}.{h}.{ext}", body, media_type, IMMUTABLE)
+
+    def get(self, path: str) -> Optional[Asset]:
+        return self._assets.get(path)
+
+    def items(self):
+        return self._assets.items()
+
+    def response(self, request: Request, path: str) -> Response:
+        a = self._assets.get(path)
+        if a is None:
+            return Response(status_code=404)
+        headers = {"ETag": a.etag, "Cache-Control": a.cache_control, "Vary": "Accept-Encoding"}
+        inm = request.headers.get("if-none-match", "")
+        if inm and (inm.strip() == "*" or a.etag in [t.strip().removeprefix("W/") for t in inm.split(",")]):
+            return Response(status_code=304, headers=headers)
+        if a.br is not None and _accepts(request, "br"):
+            return Response(a.br, media_type=a.media_type, headers={**headers, "Content-Encoding": "br"})
+        if _accepts(request, "gzip"):
+            return Response(a.gzip, media_type=a.media_type, headers={**headers, "Content-Encoding": "gzip"})
+        return Response(a.body, media_type=a.media_type, headers=headers)
+
+
+def _externalize(html: str, stem: str, store: AssetStore) -> str:
+    def css(m: "re.Match[str]") -> str:
+        url = store.add_fingerprinted(stem, "css", m.group(1).encode("utf-8"), "text/css")
+        return f'<link rel="stylesheet" href="{url}" />'
+
+    def js(m: "re.Match[str]") -> str:
+        url = store.add_fingerprinted(stem, "js", m.group(1).encode("utf-8"), "application/javascript")
+        return f'<script src="{url}"></script>'
+
+    html = _INLINE_STYLE.sub(css, html)
+    return _INLINE_SCRIPT.sub(js, html)
+
+
+def build_pages(pages: Dict[str, Tuple[str, str]], tailwind_css_path: str = "") -> AssetStore:
+    store = AssetStore()
+    tailwind_tag = None
+    if tailwind_css_path and os.path.isfile(tailwind_css_path):
+        with open(tailwind_css_path, "rb") as f:
+            url = store.add_fingerprinted("tailwind", "css", f.read(), "text/css")
+        tailwind_tag = f'<link rel="stylesheet" href="{url}" />'
+    for route, (stem, html) in pages.items():
+        if tailwind_tag:
+            html = html.replace(TAILWIND_CDN_TAG, tailwind_tag)
+        html = _externalize(html, stem, store)
+        store.add(route, html.encode("utf-8"), "text/html; charset=utf-8", REVALIDATE)
+    return store
+
+
+def write_static(store: AssetStore, out_dir: str) -> int:
+    n = 0
+    for path, a in store.items():
+        rel = path.strip("/") or "index"
+        if not os.path.splitext(rel)[1]:
+            rel = f"{rel}.html"
+        fp = os.path.join(out_dir, rel)
+        os.makedirs(os.path.dirname(fp) or out_dir, exist_ok=True)
+        with open(fp, "wb") as f:
+            f.write(a.body)
+        with open(fp + ".gz", "wb") as f:
+            f.write(a.gzip)
+        if a.br is not None:
+            with open(fp + ".br", "wb") as f:
+                f.write(a.br)
+        n += 1
+    return n
+
+
+def main() -> None:
+    from .api import ui_pages
+
+    ap = argparse.ArgumentParser(description="Pre-render the Sentinel UI into fingerprinted, precompressed static files.")
+    ap.add_argument("--out", default="build/static")
+    ap.add_argument("--tailwind-css", default=os.getenv("UI_TAILWIND_CSS", ""))
+    args = ap.parse_args()
+    store = build_pages(ui_pages(), tailwind_css_path=args.tailwind_css)
+    n = write_static(store, args.out)
+    print(f"[static] wrote {n} assets to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,8 @@ from dotenv import load_dotenv
 
 @dataclass(frozen=True)
 class Settings:
+    kafka_transport: str
+    kafka_memory_partitions: int
     kafka_bootstrap: str
     kafka_security_protocol: str
     kafka_sasl_mechanisms: str
@@ -21,24 +23,75 @@ class Settings:
     topic_decisions: str
     topic_actions: str
     topic_audit: str
+    topic_dead_letter: str
+    consumer_group_suffix: str
+    dlq_max_attempts: int
+    dlq_backoff_s: float
     gcp_project: str
     gcp_region: str
     gcs_bucket: str
+    blob_store: str
+    local_blob_dir: str
     bigquery_dataset: str
     bigquery_audit_table: str
+    audit_sink: str
+    local_audit_path: str
+    audit_recent_lookback_hours: int
     gemini_observer_model: str
     gemini_thinker_model: str
+    model_backend: str
+    model_stub_latency_ms: float
+    model_stub_jitter_ms: float
+    model_stub_error_rate: float
+    model_stub_replay_path: str
+    model_stub_seed: int
+    model_record_path: str
+    model_rpm: float
+    model_tpm: float
+    model_min_concurrency: int
+    model_max_concurrency: int
+    model_target_latency_s: float
+    model_max_retries: int
+    model_thinking_budget: int
+    trace_exporter: str
+    trace_file_path: str
+    metrics_port: int
     vertex_embed_model: str
+    vertex_embed_batch_size: int
+    vertex_embed_concurrency: int
+    vertex_embed_rpm: int
+    embed_cache_path: str
+    observation_cache_path: str
+    observation_cache_entries: int
     vertex_search_location: str
     vertex_search_engine_id: str
     vertex_search_prompt_preamble: str
+    sop_retrieval_backend: str
     assembly_video_path: str
     security_video_path: str
     assembly_sop_path: str
+    security_rules_path: str
+    security_window_clips: int
+    security_window_hits: int
+    thinker_security_workers: int
+    thinker_assembly_workers: int
     clip_seconds: float
     sample_fps: int
+    clip_policy: str
+    clip_clock: str
+    clip_seconds_max: float
+    sample_fps_min: int
+    clip_idle_observations: int
     chat_host: str
     chat_port: int
+    api_bigquery_concurrency: int
+    api_search_concurrency: int
+    chat_cache_max_entries: int
+    chat_cache_ttl_s: float
+    chat_cache_embedder: str
+    chat_cache_similarity: float
+    sop_version_ttl_s: float
+    ui_tailwind_css: str
 
 
 def _require(name: str) -> str:
@@ -49,43 +102,101 @@ def _require(name: str) -> str:
 
 
 def _optional(name: str, default: str = "") -> str:
-    return os.getenv(name, default).strip()
+    return os.getenv(name, "").strip() or default
 
 
 def load_settings(env_path: str = ".env") -> Settings:
     load_dotenv(env_path)
 
+    transport = _optional("KAFKA_TRANSPORT", "confluent").lower()
+    local = transport == "memory"
+    kafka_required = _require if transport == "confluent" else _optional
+    cloud_required = _optional if local else _require
+
     return Settings(
-        kafka_bootstrap=_require("KAFKA_BOOTSTRAP"),
+        kafka_transport=transport,
+        kafka_memory_partitions=int(_optional("KAFKA_MEMORY_PARTITIONS", "6")),
+        kafka_bootstrap=(_require("KAFKA_BOOTSTRAP") if transport == "confluent" else _optional("KAFKA_BOOTSTRAP", "localhost:9092")),
         kafka_security_protocol=_optional("KAFKA_SECURITY_PROTOCOL", "SASL_SSL"),
         kafka_sasl_mechanisms=_optional("KAFKA_SASL_MECHANISMS", "PLAIN"),
-        kafka_api_key=_require("KAFKA_API_KEY"),
-        kafka_api_secret=_require("KAFKA_API_SECRET"),
-        schema_registry_url=_require("SCHEMA_REGISTRY_URL"),
-        schema_registry_api_key=_require("SCHEMA_REGISTRY_API_KEY"),
-        schema_registry_api_secret=_require("SCHEMA_REGISTRY_API_SECRET"),
+        kafka_api_key=kafka_required("KAFKA_API_KEY"),
+        kafka_api_secret=kafka_required("KAFKA_API_SECRET"),
+        schema_registry_url=kafka_required("SCHEMA_REGISTRY_URL"),
+        schema_registry_api_key=kafka_required("SCHEMA_REGISTRY_API_KEY"),
+        schema_registry_api_secret=kafka_required("SCHEMA_REGISTRY_API_SECRET"),
         topic_clips=_optional("TOPIC_CLIPS", "video.clips"),
         topic_observations=_optional("TOPIC_OBSERVATIONS", "video.observations"),
         topic_sessions=_optional("TOPIC_SESSIONS", "station.sessions"),
         topic_decisions=_optional("TOPIC_DECISIONS", "sop.decisions"),
         topic_actions=_optional("TOPIC_ACTIONS", "workflow.actions"),
         topic_audit=_optional("TOPIC_AUDIT", "audit.events"),
-        gcp_project=_require("GCP_PROJECT"),
+        topic_dead_letter=_optional("TOPIC_DEAD_LETTER", "agents.dead_letter"),
+        consumer_group_suffix=_optional("CONSUMER_GROUP_SUFFIX", ""),
+        dlq_max_attempts=int(_optional("DLQ_MAX_ATTEMPTS", "3")),
+        dlq_backoff_s=float(_optional("DLQ_BACKOFF_S", "0.5")),
+        gcp_project=cloud_required("GCP_PROJECT"),
         gcp_region=_optional("GCP_REGION", "us-central1"),
-        gcs_bucket=_require("GCS_BUCKET"),
-        bigquery_dataset=_require("BIGQUERY_DATASET"),
+        gcs_bucket=(cloud_required("GCS_BUCKET") or "local"),
+        blob_store=_optional("BLOB_STORE", "local" if local else "gcs").lower(),
+        local_blob_dir=_optional("LOCAL_BLOB_DIR", ".cache/blobs"),
+        bigquery_dataset=cloud_required("BIGQUERY_DATASET"),
         bigquery_audit_table=_optional("BIGQUERY_AUDIT_TABLE", "audit_events"),
+        audit_sink=_optional("AUDIT_SINK", "jsonl" if local else "bigquery").lower(),
+        local_audit_path=_optional("LOCAL_AUDIT_PATH", ".cache/audit_events.jsonl"),
+        audit_recent_lookback_hours=int(_optional("AUDIT_RECENT_LOOKBACK_HOURS", "24")),
         gemini_observer_model=_optional("GEMINI_OBSERVER_MODEL", "gemini-2.5-flash"),
         gemini_thinker_model=_optional("GEMINI_THINKER_MODEL", "gemini-2.5-flash"),
+        model_backend=_optional("MODEL_BACKEND", "stub" if local else "vertex").lower(),
+        model_stub_latency_ms=float(_optional("MODEL_STUB_LATENCY_MS", "800")),
+        model_stub_jitter_ms=float(_optional("MODEL_STUB_JITTER_MS", "200")),
+        model_stub_error_rate=float(_optional("MODEL_STUB_ERROR_RATE", "0")),
+        model_stub_replay_path=_optional("MODEL_STUB_REPLAY_PATH", ""),
+        model_stub_seed=int(_optional("MODEL_STUB_SEED", "0")),
+        model_record_path=_optional("MODEL_RECORD_PATH", ""),
+        model_rpm=float(_optional("MODEL_RPM", "0")),
+        model_tpm=float(_optional("MODEL_TPM", "0")),
+        model_min_concurrency=int(_optional("MODEL_MIN_CONCURRENCY", "1")),
+        model_max_concurrency=int(_optional("MODEL_MAX_CONCURRENCY", "16")),
+        model_target_latency_s=float(_optional("MODEL_TARGET_LATENCY_S", "15")),
+        model_max_retries=int(_optional("MODEL_MAX_RETRIES", "4")),
+        model_thinking_budget=int(_optional("MODEL_THINKING_BUDGET", "1024")),
+        trace_exporter=_optional("TRACE_EXPORTER", "none").lower(),
+        trace_file_path=_optional("TRACE_FILE_PATH", ".cache/traces.jsonl"),
+        metrics_port=int(_optional("METRICS_PORT", "0")),
         vertex_embed_model=_optional("VERTEX_EMBED_MODEL", "gemini-embedding-001"),
+        vertex_embed_batch_size=int(_optional("VERTEX_EMBED_BATCH_SIZE", "0")),
+        vertex_embed_concurrency=int(_optional("VERTEX_EMBED_CONCURRENCY", "8")),
+        vertex_embed_rpm=int(_optional("VERTEX_EMBED_RPM", "600")),
+        embed_cache_path=_optional("EMBED_CACHE_PATH", ".cache/embeddings.sqlite"),
+        observation_cache_path=_optional("OBSERVATION_CACHE_PATH", ".cache/observations.sqlite"),
+        observation_cache_entries=int(_optional("OBSERVATION_CACHE_ENTRIES", "10000")),
         vertex_search_location=_optional("VERTEX_SEARCH_LOCATION", "us"),
-        vertex_search_engine_id=_require("VERTEX_SEARCH_ENGINE_ID"),
+        vertex_search_engine_id=cloud_required("VERTEX_SEARCH_ENGINE_ID"),
         vertex_search_prompt_preamble=_optional("VERTEX_SEARCH_PROMPT_PREAMBLE", ""),
+        sop_retrieval_backend=_optional("SOP_RETRIEVAL_BACKEND", "local" if local else "vertex_search").lower(),
         assembly_video_path=_require("ASSEMBLY_VIDEO_PATH"),
         security_video_path=_require("SECURITY_VIDEO_PATH"),
         assembly_sop_path=_require("ASSEMBLY_SOP_PATH"),
+        security_rules_path=_optional("SECURITY_RULES_PATH", "data/rules/security_rules.json"),
+        security_window_clips=int(_optional("SECURITY_WINDOW_CLIPS", "4")),
+        security_window_hits=int(_optional("SECURITY_WINDOW_HITS", "2")),
+        thinker_security_workers=int(_optional("THINKER_SECURITY_WORKERS", "4")),
+        thinker_assembly_workers=int(_optional("THINKER_ASSEMBLY_WORKERS", "2")),
         clip_seconds=float(_optional("CLIP_SECONDS", "1.5")),
         sample_fps=int(_optional("SAMPLE_FPS", "10")),
+        clip_policy=_optional("CLIP_POLICY", "fixed").lower(),
+        clip_clock=_optional("CLIP_CLOCK", "ingest").lower(),
+        clip_seconds_max=float(_optional("CLIP_SECONDS_MAX", "6")),
+        sample_fps_min=int(_optional("SAMPLE_FPS_MIN", "2")),
+        clip_idle_observations=int(_optional("CLIP_IDLE_OBSERVATIONS", "3")),
         chat_host=_optional("CHAT_HOST", "127.0.0.1"),
         chat_port=int(_optional("CHAT_PORT", os.getenv("PORT", "8000"))),
+        api_bigquery_concurrency=int(_optional("API_BIGQUERY_CONCURRENCY", "8")),
+        api_search_concurrency=int(_optional("API_SEARCH_CONCURRENCY", "4")),
+        chat_cache_max_entries=int(_optional("CHAT_CACHE_MAX_ENTRIES", "512")),
+        chat_cache_ttl_s=float(_optional("CHAT_CACHE_TTL_S", "3600")),
+        chat_cache_embedder=_optional("CHAT_CACHE_EMBEDDER", "local").lower(),
+        chat_cache_similarity=float(_optional("CHAT_CACHE_SIMILARITY", "0.9")),
+        sop_version_ttl_s=float(_optional("SOP_VERSION_TTL_S", "30")),
+        ui_tailwind_css=_optional("UI_TAILWIND_CSS", ""),
     )
\ No newline at end of file
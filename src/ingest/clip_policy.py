@@ -0,0 +1,111 @@
+from __future__ import annotations
+import socket
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+from ..config.settings import Settings
+from ..shared.kafka_client import consume_loop, make_consumer
+from ..shared.metrics import REGISTRY
+
+CLIP_SECONDS = REGISTRY.gauge("sentinel_clip_seconds", "Current clip length per camera.", ("camera",))
+CLIP_FPS = REGISTRY.gauge("sentinel_clip_fps", "Current sampling rate per camera.", ("camera",))
+CLIP_PROFILE_CHANGES = REGISTRY.counter("sentinel_clip_profile_changes_total", "Clip profile changes per camera and direction.", ("camera", "direction"))
+
+
+def is_active(use_case: str, signals: Dict[str, Any]) -> bool:
+    # Anything short of a confident "nothing is happening" counts as activity,
+    # so a missed board_in can only cost a longer clip, never a skipped one.
+    if not isinstance(signals, dict) or signals.get("confidence_note") == "no_json":
+        return True
+    if use_case == "assembly":
+        return not (signals.get("phase") == "idle" and signals.get("board_present") != "yes")
+    if signals.get("safety_flags"):
+        return True
+    return signals.get("people_present") != "no"
+
+
+@dataclass
+class _CameraState:
+    clip_seconds: float
+    fps: int
+    idle_streak: int = 0
+    last_clip_index: int = -1
+
+
+class AdaptiveClipPolicy:
+    # Activity snaps a camera straight back to the base profile (short clips,
+    # full fps). Each run of `idle_observations` consecutive idle observations
+    # doubles the clip length and halves the fps, up to the configured bounds.
+    def __init__(self, base_seconds: float, max_seconds: float, base_fps: int, min_fps: int, idle_observations: int = 3):
+        self.base_seconds = float(base_seconds)
+        self.max_seconds = max(self.base_seconds, float(max_seconds))
+        self.base_fps = int(base_fps)
+        self.min_fps = max(1, min(self.base_fps, int(min_fps)))
+        self.idle_observations = max(1, int(idle_observations))
+        self._cams: Dict[str, _CameraState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, camera_id: str) -> _CameraState:
+        st = self._cams.get(camera_id)
+        if st is None:
+            st = self._cams[camera_id] = _CameraState(self.base_seconds, self.base_fps)
+        return st
+
+    def profile(self, camera_id: str) -> Tuple[float, int]:
+        with self._lock:
+            st = self._state(camera_id)
+            return st.clip_seconds, st.fps
+
+    def observe(self, camera_id: str, clip_index: int, active: bool) -> None:
+        with self._lock:
+            st = self._state(camera_id)
+            if clip_index == st.last_clip_index:
+                return
+            if clip_index < st.last_clip_index:
+                # The producer restarted numbering (new run, replay): start the
+                # camera over from the base profile instead of ignoring it.
+                st = self._cams[camera_id] = _CameraState(self.base_seconds, self.base_fps)
+            st.last_clip_index = clip_index
+            before = (st.clip_seconds, st.fps)
+            if active:
+                st.idle_streak = 0
+                st.clip_seconds, st.fps = self.base_seconds, self.base_fps
+            else:
+                st.idle_streak += 1
+                if st.idle_streak >= self.idle_observations:
+                    st.idle_streak = 0
+                    st.clip_seconds = min(self.max_seconds, st.clip_seconds * 2)
+                    st.fps = max(self.min_fps, st.fps // 2)
+            if (st.clip_seconds, st.fps) != before:
+                CLIP_PROFILE_CHANGES.labels(camera_id, "active" if active else "idle").inc()
+                print(f"[clip-policy] {camera_id} -> {st.clip_seconds:g}s @ {st.fps}fps ({'active' if active else 'idle'})")
+            CLIP_SECONDS.labels(camera_id).set(st.clip_seconds)
+            CLIP_FPS.labels(camera_id).set(st.fps)
+
+    def handle_observation(self, msg: dict) -> None:
+        # Advisory feedback only: a malformed observation is ignored rather than
+        # ending the loop or landing on the DLQ.
+        camera_id, clip_index = msg.get("camera_id"), msg.get("clip_index")
+        if not camera_id or not isinstance(clip_index, int):
+            return
+        self.observe(camera_id, clip_index, is_active(msg.get("use_case", ""), msg.get("signals") or {}))
+
+    def follow(self, cfg: Settings) -> None:
+        # One group per host: every producer process needs every camera's observations.
+        consumer = make_consumer(cfg, group_id=f"clip-policy-{socket.gethostname()}", topics=[cfg.topic_observations], offset_reset="latest")
+        threading.Thread(target=consume_loop, args=(consumer, self.handle_observation), daemon=True).start()
+
+
+_policy: Optional[AdaptiveClipPolicy] = None
+_policy_lock = threading.Lock()
+
+
+def shared_clip_policy(cfg: Settings) -> Optional[AdaptiveClipPolicy]:
+    global _policy
+    if cfg.clip_policy != "adaptive":
+        return None
+    with _policy_lock:
+        if _policy is None:
+            _policy = AdaptiveClipPolicy(cfg.clip_seconds, cfg.clip_seconds_max, cfg.sample_fps, cfg.sample_fps_min, cfg.clip_idle_observations)
+            _policy.follow(cfg)
+        return _policy
@@ -1,11 +1,16 @@
 from __future__ import annotations
+import json
 import os
 import shutil
 import subprocess
 import tempfile
+import time
 from dataclasses import dataclass
 from datetime import datetime, timezone, timedelta
-from typing import Iterator, Optional
+from typing import Callable, Iterator, List, Optional, Tuple
+
+LIVE_PREFIXES = ("rtsp://", "rtsps://", "rtmp://", "http://", "https://", "udp://", "srt://")
+
 
 @dataclass(frozen=True)
 class ClipLocal:
@@ -13,18 +18,66 @@ class ClipLocal:
     clip_index: int
     start_ts: datetime
     end_ts: datetime
+    sample_fps: Optional[int] = None
+    pts_start_s: Optional[float] = None
+    pts_end_s: Optional[float] = None
+    clock: str = "ingest"
+    # Wall-clock time on this host when the clip was closed. Equals end_ts on
+    # the ingest clock; under CLIP_CLOCK=source it is what SLA spans use.
+    ingest_end_ts: Optional[datetime] = None
+
+
+def is_live_source(video_path: str) -> bool:
+    return video_path.lower().startswith(LIVE_PREFIXES)
+
+
+def _parse_segment_line(line: str) -> Optional[Tuple[str, float, float]]:
+    # ffmpeg -segment_list_type csv: "<file>,<start pts s>,<end pts s>"
+    parts = line.strip().rsplit(",", 2)
+    if len(parts) != 3:
+        return None
+    try:
+        return parts[0].strip('"'), float(parts[1]), float(parts[2])
+    except ValueError:
+        return None
+
 
 class VideoClipper:
-    def __init__(self, clip_seconds: float = 2.0, sample_fps: int = 10):
+    def __init__(self, clip_seconds: float = 2.0, sample_fps: int = 10, clock: str = "ingest"):
         self.clip_seconds = clip_seconds
         self.sample_fps = sample_fps
+        self.clock = clock
         self._tmpdir: Optional[str] = None
 
-    def _run_ffmpeg_segment(self, video_path: str, out_pattern: str) -> None:
+    def _probe(self, video_path: str) -> dict:
+        out = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration,start_time:format_tags=creation_time", "-of", "json", video_path],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        return json.loads(out or "{}").get("format", {})
+
+    def _source_anchor(self, video_path: str) -> Tuple[Optional[datetime], str]:
+        # Wall-clock time of PTS 0. Live sources are stamped as they are read
+        # (anchor = when ffmpeg started). Files use their container
+        # creation_time under CLIP_CLOCK=source, and are otherwise read at
+        # native rate from "now", as if the camera were live.
+        if self.clock != "source" or is_live_source(video_path):
+            return None, "ingest"
+        try:
+            created = self._probe(video_path).get("tags", {}).get("creation_time")
+            if created:
+                return datetime.fromisoformat(created.replace("Z", "+00:00")).astimezone(timezone.utc), "source"
+        except (subprocess.CalledProcessError, ValueError, OSError):
+            pass
+        print(f"[clipper] no creation_time in {os.path.basename(video_path)}; using the ingest clock")
+        return None, "ingest"
+
+    def _segment_cmd(self, video_path: str, out_pattern: str, list_path: str, realtime: bool) -> List[str]:
         seg = float(self.clip_seconds)
         force_kf = f"expr:gte(t,n_forced*{seg})"
-        cmd_encode = [
+        return [
             "ffmpeg", "-hide_banner", "-loglevel", "error",
+            *(["-re"] if realtime else []),
             "-i", video_path,
             "-c:v", "libx264",
             "-preset", "veryfast",
@@ -35,51 +88,133 @@ class VideoClipper:
             "-an",
             "-f", "segment",
             "-segment_time", str(seg),
+            "-segment_list", list_path,
+            "-segment_list_type", "csv",
             "-reset_timestamps", "1",
             out_pattern,
         ]
-        subprocess.run(cmd_encode, check=True)
-        produced = [p for p in os.listdir(os.path.dirname(out_pattern)) if p.endswith(".mp4")]
-        if not produced:
-            subprocess.run(cmd_encode, check=True)
-            return
-        if all(os.path.getsize(os.path.join(os.path.dirname(out_pattern), p)) == 0 for p in produced):
-            for p in produced:
-                try:
-                    os.remove(os.path.join(os.path.dirname(out_pattern), p))
-                except OSError:
-                    pass
-            subprocess.run(cmd_encode, check=True)
+
+    def _follow_segment_list(self, proc: subprocess.Popen, list_path: str) -> Iterator[Tuple[str, float, float]]:
+        # ffmpeg appends a line once a segment is closed, so clips can be
+        # published while the rest of the source is still being encoded.
+        pos, buf = 0, ""
+        while True:
+            done = proc.poll() is not None
+            if os.path.exists(list_path):
+                with open(list_path, "r", encoding="utf-8") as f:
+                    f.seek(pos)
+                    buf += f.read()
+                    pos = f.tell()
+                *lines, buf = buf.split("\n")
+                for line in lines:
+                    entry = _parse_segment_line(line)
+                    if entry:
+                        yield entry
+            if done:
+                entry = _parse_segment_line(buf)
+                if entry:
+                    yield entry
+                return
+            time.sleep(0.1)
 
     def iter_clips(self, video_path: str) -> Iterator[ClipLocal]:
         if shutil.which("ffmpeg") is None:
             raise RuntimeError("ffmpeg not found. Install it (macOS: brew install ffmpeg).")
+        anchor, clock = self._source_anchor(video_path)
         self._tmpdir = tempfile.mkdtemp(prefix="clips_")
         out_pattern = os.path.join(self._tmpdir, "clip_%06d.mp4")
-        self._run_ffmpeg_segment(video_path, out_pattern)
-        files = sorted([f for f in os.listdir(self._tmpdir) if f.endswith(".mp4")])
-        if not files:
-            self.cleanup()
-            raise RuntimeError("No clips produced by ffmpeg. Check input video path/codec.")
-        start0 = datetime.now(timezone.utc)
+        list_path = os.path.join(self._tmpdir, "segments.csv")
+        realtime = clock == "ingest" and not is_live_source(video_path)
+        proc = subprocess.Popen(self._segment_cmd(video_path, out_pattern, list_path, realtime))
+        if anchor is None:
+            anchor = datetime.now(timezone.utc)
         clip_index = 0
-        for fname in files:
-            path = os.path.join(self._tmpdir, fname)
-            size = os.path.getsize(path)
-            if size <= 0:
-                continue
-            start_ts = start0 + timedelta(seconds=clip_index * self.clip_seconds)
-            end_ts = start_ts + timedelta(seconds=self.clip_seconds)
-            yield ClipLocal(
-                path=path,
-                clip_index=clip_index,
-                start_ts=start_ts,
-                end_ts=end_ts,
-            )
-            clip_index += 1
-        self.cleanup()
+        try:
+            for fname, pts_start, pts_end in self._follow_segment_list(proc, list_path):
+                path = os.path.join(self._tmpdir, os.path.basename(fname))
+                if not os.path.isfile(path) or os.path.getsize(path) <= 0:
+                    continue
+                yield ClipLocal(
+                    path=path,
+                    clip_index=clip_index,
+                    start_ts=anchor + timedelta(seconds=pts_start),
+                    end_ts=anchor + timedelta(seconds=pts_end),
+                    sample_fps=self.sample_fps,
+                    pts_start_s=pts_start,
+                    pts_end_s=pts_end,
+                    clock=clock,
+                    ingest_end_ts=anchor + timedelta(seconds=pts_end) if clock == "ingest" else datetime.now(timezone.utc),
+                )
+                clip_index += 1
+            if proc.wait() != 0:
+                raise subprocess.CalledProcessError(proc.returncode, "ffmpeg")
+            if clip_index == 0:
+                raise RuntimeError("No clips produced by ffmpeg. Check input video path/codec.")
+        finally:
+            if proc.poll() is None:
+                proc.terminate()
+                proc.wait(10)
+            self.cleanup()
 
     def cleanup(self) -> None:
         if self._tmpdir and os.path.isdir(self._tmpdir):
             shutil.rmtree(self._tmpdir, ignore_errors=True)
-        self._tmpdir = None
\ No newline at end of file
+        self._tmpdir = None
+
+    def _cut_clip(self, video_path: str, start_s: float, seconds: float, fps: int, out_path: str) -> None:
+        cmd = [
+            "ffmpeg", "-hide_banner", "-loglevel", "error", "-y",
+            "-ss", f"{start_s:.3f}",
+            "-i", video_path,
+            "-t", f"{seconds:.3f}",
+            "-c:v", "libx264",
+            "-preset", "veryfast",
+            "-crf", "28",
+            "-pix_fmt", "yuv420p",
+            "-r", str(fps),
+            "-an",
+            out_path,
+        ]
+        subprocess.run(cmd, check=True)
+
+    def iter_adaptive_clips(self, video_path: str, profile: Callable[[], Tuple[float, int]]) -> Iterator[ClipLocal]:
+        # Cuts one clip at a time so each can use the (clip_seconds, fps) the
+        # policy wants right now. Clips are released on the source clock, as a
+        # live camera would, so observer feedback can catch up between cuts.
+        if shutil.which("ffmpeg") is None or shutil.which("ffprobe") is None:
+            raise RuntimeError("ffmpeg/ffprobe not found. Install it (macOS: brew install ffmpeg).")
+        if is_live_source(video_path):
+            raise RuntimeError("CLIP_POLICY=adaptive needs a seekable file; use the fixed policy for live sources.")
+        duration = float(self._probe(video_path).get("duration") or 0.0)
+        if duration <= 0:
+            raise RuntimeError("Could not read the input video duration. Check input video path/codec.")
+        anchor, clock = self._source_anchor(video_path)
+        self._tmpdir = tempfile.mkdtemp(prefix="clips_")
+        anchor = anchor or datetime.now(timezone.utc)
+        t0 = time.monotonic()
+        offset, clip_index = 0.0, 0
+        try:
+            while offset < duration - 0.05:
+                seconds, fps = profile()
+                seconds = min(float(seconds), duration - offset)
+                wait = t0 + offset + seconds - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                path = os.path.join(self._tmpdir, f"clip_{clip_index:06d}.mp4")
+                self._cut_clip(video_path, offset, seconds, fps, path)
+                if os.path.isfile(path) and os.path.getsize(path) > 0:
+                    yield ClipLocal(
+                        path=path,
+                        clip_index=clip_index,
+                        start_ts=anchor + timedelta(seconds=offset),
+                        end_ts=anchor + timedelta(seconds=offset + seconds),
+                        sample_fps=fps,
+                        pts_start_s=offset,
+                        pts_end_s=offset + seconds,
+                        clock=clock,
+                        ingest_end_ts=anchor + timedelta(seconds=offset + seconds) if clock == "ingest" else datetime.now(timezone.utc),
+                    )
+                    clip_index += 1
+                offset += seconds
+        finally:
+            self.cleanup()
@@ -0,0 +1,229 @@
+from __future__ import annotations
+import argparse
+import dataclasses
+import glob
+import heapq
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from ..config.settings import Settings, load_settings
+from ..shared.events import ClipEvent
+from ..shared.gcs_client import GcsObjectRef, make_blob_store
+from ..shared.kafka_client import bind_topic_models, consumer_lag, ensure_schemas, ensure_topics, make_producer, produce_model
+from ..shared.metrics import QUEUE_DEPTH
+from ..shared.model_backend import model_summary
+from ..shared.tracing import finish_stage, latency_summary, stamp
+from .replay import isolated_settings
+
+# Synthetic fleet: N cameras publishing ClipEvents on their own clip cadence
+# (with jitter), all pointing at a handful of uploaded sample clips. The agents
+# run in this process so their lag and stage histograms can be read directly.
+
+
+def upload_samples(cfg: Settings, paths: List[str], n_random: int, clip_bytes: int) -> List[GcsObjectRef]:
+    store = make_blob_store(cfg)
+    refs = []
+    for i, p in enumerate(paths):
+        with open(p, "rb") as f:
+            refs.append(store.upload_bytes(cfg.gcs_bucket, f"loadgen/samples/{i:03d}_{os.path.basename(p)}", f.read()))
+    for i in range(0 if paths else n_random):
+        refs.append(store.upload_bytes(cfg.gcs_bucket, f"loadgen/samples/random_{i:03d}.mp4", os.urandom(clip_bytes)))
+    return refs
+
+
+class SyntheticFleet:
+    def __init__(
+        self,
+        cfg: Settings,
+        samples: List[GcsObjectRef],
+        cameras: int,
+        security_share: float,
+        clip_seconds: float,
+        jitter: float,
+        seed: int = 0,
+    ):
+        self.cfg = cfg
+        self.samples = samples
+        self.clip_seconds = float(clip_seconds)
+        self.jitter = max(0.0, min(0.9, float(jitter)))
+        self.rng = random.Random(seed)
+        n_sec = int(round(cameras * security_share))
+        self.cameras: List[Tuple[str, str]] = [(f"load-sec-{i:04d}", "security") for i in range(n_sec)] + [
+            (f"load-asm-{i:04d}", "assembly") for i in range(cameras - n_sec)
+        ]
+        self.produced = 0
+        self._stop = threading.Event()
+
+    def _interval(self) -> float:
+        return self.clip_seconds * (1.0 + self.rng.uniform(-self.jitter, self.jitter))
+
+    def run(self, duration_s: float) -> None:
+        producer = make_producer(self.cfg)
+        now = time.monotonic()
+        # Stagger first clips over one interval so cameras don't fire in lockstep.
+        due: List[Tuple[float, int]] = [(now + self.rng.uniform(0, self.clip_seconds), i) for i in range(len(self.cameras))]
+        heapq.heapify(due)
+        index: Dict[int, int] = defaultdict(int)
+        end = now + duration_s
+        while due and not self._stop.is_set():
+            at, i = heapq.heappop(due)
+            if at >= end:
+                break
+            delay = at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            cam, use_case = self.cameras[i]
+            ref = self.samples[(i + index[i]) % len(self.samples)]
+            clip_end = datetime.now(timezone.utc)
+            spans = stamp({}, "clip_end", clip_end.timestamp())
+            evt = ClipEvent(
+                camera_id=cam,
+                station_id="S4" if use_case == "assembly" else None,
+                sku_id="S1345780" if use_case == "assembly" else None,
+                use_case=use_case,
+                clip_index=index[i],
+                clip_start_ts=clip_end - timedelta(seconds=self.clip_seconds),
+                clip_end_ts=clip_end,
+                gcs_uri=ref.gcs_uri,
+                content_sha256=ref.sha256,
+                labels={"loadgen": True},
+            )
+            evt.spans = stamp(spans, "ingest.produce")
+            produce_model(producer, self.cfg.topic_clips, evt, key=cam)
+            producer.poll(0)
+            finish_stage("ingest", use_case, evt.trace_id, spans)
+            index[i] += 1
+            self.produced += 1
+            heapq.heappush(due, (at + self._interval(), i))
+        producer.flush(30)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def _lag_by_group() -> Dict[str, float]:
+    out: Dict[str, float] = defaultdict(float)
+    for (group, _topic), n in consumer_lag():
+        out[group] += n
+    for key, n in QUEUE_DEPTH.samples():
+        if key and key[0].startswith("thinker."):
+            out[f"{key[0]} (queued)"] += n
+    return dict(out)
+
+
+def start_pipeline(cfg: Settings, with_audit: bool) -> None:
+    from ..agents.observer.observer import ObserverService
+    from ..agents.sessionizer.sessionizer import SessionizerService
+    from ..agents.thinker.thinker import ThinkerService
+    from ..agents.doer.doer import DoerService
+    from ..audit.bq_writer import make_audit_writer
+
+    services = [ObserverService(cfg), SessionizerService(cfg), ThinkerService(cfg), DoerService(cfg)]
+    if with_audit:
+        services.append(make_audit_writer(cfg))
+    for svc in services:
+        threading.Thread(target=svc.run, daemon=True).start()
+
+
+def _fmt(v: Optional[float]) -> str:
+    return f"{v:.3f}" if v is not None else "-"
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Synthetic camera fleet: publish ClipEvents for N cameras and report pipeline throughput, lag and latency.")
+    ap.add_argument("--cameras", type=int, default=50)
+    ap.add_argument("--security-share", type=float, default=0.5, help="fraction of cameras on the security use case")
+    ap.add_argument("--clip-seconds", type=float, default=None, help="per-camera clip cadence (default CLIP_SECONDS)")
+    ap.add_argument("--jitter", type=float, default=0.2, help="+/- fraction applied to each camera's cadence")
+    ap.add_argument("--duration", type=float, default=60.0, help="seconds of load")
+    ap.add_argument("--drain", type=float, default=15.0, help="seconds to keep measuring after the load stops")
+    ap.add_argument("--samples", default="", help="glob of sample .mp4 clips (default: random bytes)")
+    ap.add_argument("--clip-bytes", type=int, default=256 * 1024, help="size of random sample clips")
+    ap.add_argument("--report-every", type=float, default=5.0)
+    ap.add_argument("--no-pipeline", action="store_true", help="only publish; the agents run elsewhere")
+    ap.add_argument("--with-audit", action="store_true", help="also run the audit writer")
+    ap.add_argument("--observation-cache", action="store_true", help="keep the observer cache on (every reused sample clip then hits it)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--report", default=None, help="write throughput, latency and model-call stats as JSON here")
+    ap.add_argument("--baseline", default=None, help="a previous --report to print model-call deltas against")
+    ap.add_argument("--env", default=".env")
+    args = ap.parse_args()
+
+    cfg = load_settings(args.env)
+    if not args.observation_cache:
+        cfg = dataclasses.replace(cfg, observation_cache_path="none", observation_cache_entries=0)
+    if cfg.kafka_transport != "memory":
+        # Never join the live consumer groups or write into the live topics.
+        cfg = isolated_settings(cfg, f".loadgen-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}")
+        ensure_topics(cfg, [cfg.topic_clips, cfg.topic_observations, cfg.topic_sessions, cfg.topic_decisions, cfg.topic_actions, cfg.topic_dead_letter])
+        os.environ["KAFKA_OFFSET_RESET"] = "earliest"
+    ensure_schemas(cfg)
+    bind_topic_models(cfg)
+    samples = upload_samples(cfg, sorted(glob.glob(args.samples)) if args.samples else [], 4, args.clip_bytes)
+    if not args.no_pipeline:
+        start_pipeline(cfg, args.with_audit)
+
+    clip_seconds = args.clip_seconds or cfg.clip_seconds
+    fleet = SyntheticFleet(cfg, samples, args.cameras, args.security_share, clip_seconds, args.jitter, seed=args.seed)
+    print(
+        f"[loadgen] {args.cameras} cameras ({args.security_share:.0%} security) every {clip_seconds}s "
+        f"+/-{args.jitter:.0%} for {args.duration:.0f}s -> {cfg.topic_clips} (~{args.cameras / clip_seconds:.0f} clips/s)"
+    )
+    gen = threading.Thread(target=fleet.run, args=(args.duration,), daemon=True)
+    t0 = time.time()
+    gen.start()
+    last_n, last_t = 0, t0
+    last_lag: Dict[str, float] = {}
+    try:
+        while gen.is_alive() or time.time() - t0 < args.duration + args.drain:
+            time.sleep(args.report_every)
+            now = time.time()
+            lag = _lag_by_group()
+            growth = " ".join(f"{g}={int(v)}({v - last_lag.get(g, 0.0):+.0f})" for g, v in sorted(lag.items()))
+            print(f"[loadgen] t={now - t0:.0f}s produced={fleet.produced} ({(fleet.produced - last_n) / (now - last_t):.1f}/s) lag: {growth}")
+            last_n, last_t, last_lag = fleet.produced, now, lag
+    except KeyboardInterrupt:
+        fleet.stop()
+
+    elapsed = time.time() - t0
+    print(f"\n[loadgen] produced {fleet.produced} clips ({fleet.produced / min(elapsed, args.duration):.1f} clips/s while loading)")
+    summary = latency_summary()
+    print(f"{'series':<40}{'n':>8}{'p50 s':>10}{'p95 s':>10}{'p99 s':>10}")
+    for uc, r in sorted(summary["clip_to_action"].items()):
+        print(f"{'clip_to_action:' + uc:<40}{r['count']:>8}{_fmt(r['p50']):>10}{_fmt(r['p95']):>10}{_fmt(r['p99']):>10}")
+    for k, r in sorted(summary["stages"].items()):
+        print(f"{k:<40}{r['count']:>8}{_fmt(r['p50']):>10}{_fmt(r['p95']):>10}{_fmt(r['p99']):>10}")
+
+    models = model_summary()
+    base: Dict[str, Dict[str, float]] = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            base = json.load(f).get("model", {})
+    print(f"\n{'model task':<24}{'calls':>8}{'err':>6}{'p50 s':>10}{'p95 s':>10}{'out tok':>10}{'parse fail':>12}")
+    for task, r in sorted(models.items()):
+        row = f"{task:<24}{int(r['calls']):>8}{int(r['errors']):>6}{_fmt(r.get('p50_s')):>10}{_fmt(r.get('p95_s')):>10}"
+        row += f"{r.get('output_tokens_mean') or '-':>10}{_fmt(r.get('parse_failure_rate')):>12}"
+        b = base.get(task)
+        if b:
+            row += f"  (was p95 {_fmt(b.get('p95_s'))}s, {b.get('output_tokens_mean') or '-'} tok, {_fmt(b.get('parse_failure_rate'))} fail)"
+        print(row)
+    if args.report:
+        report = {
+            "cameras": args.cameras,
+            "duration_s": args.duration,
+            "produced": fleet.produced,
+            "latency": summary,
+            "model": models,
+        }
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[loadgen] report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
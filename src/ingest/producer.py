@@ -6,7 +6,9 @@ from typing import Optional
 from ..config.settings import Settings
 from ..shared.kafka_client import make_producer, produce_model
 from ..shared.events import ClipEvent
-from ..shared.gcs_client import GcsClient
+from ..shared.gcs_client import make_blob_store
+from ..shared.tracing import finish_stage, stamp
+from .clip_policy import shared_clip_policy
 from .clipper import VideoClipper
 
 def _gcs_object_path(
@@ -31,13 +33,21 @@ def publish_clips_from_video(
     stop_event: Optional[threading.Event] = None,
 ) -> None:
     producer = make_producer(cfg)
-    gcs = GcsClient(project=cfg.gcp_project)
-    clipper = VideoClipper(clip_seconds=cfg.clip_seconds, sample_fps=cfg.sample_fps)
+    gcs = make_blob_store(cfg)
+    clipper = VideoClipper(clip_seconds=cfg.clip_seconds, sample_fps=cfg.sample_fps, clock=cfg.clip_clock)
+    policy = shared_clip_policy(cfg)
+    if policy is not None:
+        clips = clipper.iter_adaptive_clips(video_path, lambda: policy.profile(camera_id))
+    else:
+        clips = clipper.iter_clips(video_path)
     count = 0
-    for clip in clipper.iter_clips(video_path):
+    for clip in clips:
         if stop_event is not None and stop_event.is_set():
             print(f"[producer] stop_event set → stopping producer for {use_case}")
             break
+        # SLA spans stay on the ingest clock; source time only goes in clip_*_ts.
+        spans = stamp({}, "clip_end", (clip.ingest_end_ts or clip.end_ts).timestamp())
+        stamp(spans, "ingest.consume")
         local_size = os.path.getsize(clip.path)
         if local_size <= 0:
             print(f"[producer] SKIP zero-byte local clip: {clip.path}")
@@ -51,6 +61,9 @@ def publish_clips_from_video(
             clip_start_ts=clip.start_ts,
             clip_end_ts=clip.end_ts,
             gcs_uri="gs://placeholder/will_set",
+            pts_start_s=clip.pts_start_s,
+            pts_end_s=clip.pts_end_s,
+            clock=clip.clock,
         )
         with open(clip.path, "rb") as f:
             data = f.read()
@@ -58,6 +71,7 @@ def publish_clips_from_video(
             print(f"[producer] SKIP read 0 bytes: {clip.path}")
             continue
         obj_path = _gcs_object_path(use_case, camera_id, evt.clip_id, clip.clip_index, clip.start_ts)
+        stamp(spans, "ingest.upload_start")
         ref = gcs.upload_bytes(
             bucket_name=cfg.gcs_bucket,
             object_path=obj_path,
@@ -69,15 +83,23 @@ def publish_clips_from_video(
                 "camera_id": camera_id,
                 "use_case": use_case,
                 "clip_index": str(clip.clip_index),
+                "clip_start_ts": clip.start_ts.isoformat(),
+                "clip_end_ts": clip.end_ts.isoformat(),
+                "station_id": station_id or "",
+                "sku_id": sku_id or "",
             },
         )
+        stamp(spans, "ingest.upload_end")
         evt.gcs_uri = ref.gcs_uri
         evt.content_sha256 = ref.sha256
         evt.labels.update({
             "source_video": os.path.basename(video_path),
             "local_clip_bytes": len(data),
+            "sample_fps": clip.sample_fps or cfg.sample_fps,
         })
+        evt.spans = stamp(spans, "ingest.produce")
         produce_model(producer, cfg.topic_clips, evt, key=camera_id)
+        finish_stage("ingest", use_case, evt.trace_id, spans)
         try:
             os.remove(clip.path)
         except OSError:
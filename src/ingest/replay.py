@@ -0,0 +1,362 @@
+from __future__ import annotations
+import argparse
+import dataclasses
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from ..config.settings import Settings, load_settings
+from ..shared.events import ClipEvent
+from ..shared.gcs_client import BlobInfo, BlobStore, make_blob_store
+from ..shared.kafka_client import bind_topic_models, ensure_schemas, ensure_topics, make_consumer, make_producer, produce_model
+from ..shared.rate_limit import TokenBucket
+from ..shared.tracing import stamp
+
+# Mirrors producer._gcs_object_path: use_case/camera/yyyy/mm/dd/<index>_<clip_id>.mp4
+_OBJECT_RE = re.compile(
+    r"^(?P<use_case>[^/]+)/(?P<camera>[^/]+)/(?P<y>\d{4})/(?P<m>\d{2})/(?P<d>\d{2})/(?P<idx>\d+)_(?P<clip_id>[^/]+)\.mp4$"
+)
+
+
+@dataclass(frozen=True)
+class ArchivedClip:
+    gcs_uri: str
+    use_case: str
+    camera_id: str
+    clip_index: int
+    clip_id: str
+    start_ts: datetime
+    end_ts: datetime
+    station_id: Optional[str] = None
+    sku_id: Optional[str] = None
+
+
+def _ts(v: Optional[str]) -> Optional[datetime]:
+    if not v:
+        return None
+    try:
+        return datetime.fromisoformat(v)
+    except ValueError:
+        return None
+
+
+def parse_archived_clip(info: BlobInfo, clip_seconds: float) -> Optional[ArchivedClip]:
+    m = _OBJECT_RE.match(info.object_path)
+    if not m or info.size <= 0:
+        return None
+    meta = info.metadata
+    # Clips uploaded before the timestamps went into object metadata fall back
+    # to the object's creation time, which the live producer writes at clip end.
+    end = _ts(meta.get("clip_end_ts")) or info.created
+    if end is None:
+        end = datetime(int(m["y"]), int(m["m"]), int(m["d"]), tzinfo=timezone.utc)
+    start = _ts(meta.get("clip_start_ts")) or end - timedelta(seconds=clip_seconds)
+    return ArchivedClip(
+        gcs_uri=info.gcs_uri,
+        use_case=m["use_case"],
+        camera_id=m["camera"],
+        clip_index=int(m["idx"]),
+        clip_id=m["clip_id"],
+        start_ts=start,
+        end_ts=end,
+        station_id=meta.get("station_id") or None,
+        sku_id=meta.get("sku_id") or None,
+    )
+
+
+def day_prefixes(use_case: str, cameras: Iterable[str], start: date, end: date) -> List[str]:
+    out = []
+    for cam in cameras:
+        d = start
+        while d <= end:
+            out.append(f"{use_case}/{cam}/{d.year:04d}/{d.month:02d}/{d.day:02d}/")
+            d += timedelta(days=1)
+    return out
+
+
+def discover_cameras(store: BlobStore, bucket: str, use_case: str) -> List[str]:
+    return [p.rstrip("/").rsplit("/", 1)[-1] for p in store.list_prefixes(bucket, f"{use_case}/")]
+
+
+def list_archived_clips(
+    store: BlobStore, bucket: str, prefixes: List[str], clip_seconds: float, workers: int = 32
+) -> List[ArchivedClip]:
+    # One listing per camera-day prefix, in parallel; each is an independent
+    # paginated GCS list, so a day of many cameras lists in roughly the time of
+    # the largest single camera-day.
+    def one(prefix: str) -> List[ArchivedClip]:
+        return [c for c in (parse_archived_clip(b, clip_seconds) for b in store.list_blobs(bucket, prefix)) if c]
+
+    clips: List[ArchivedClip] = []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(prefixes) or 1))) as ex:
+        for batch in ex.map(one, prefixes):
+            clips.extend(batch)
+    clips.sort(key=lambda c: (c.end_ts, c.camera_id, c.clip_index))
+    return clips
+
+
+def isolated_settings(cfg: Settings, suffix: str) -> Settings:
+    return dataclasses.replace(
+        cfg,
+        topic_clips=cfg.topic_clips + suffix,
+        topic_observations=cfg.topic_observations + suffix,
+        topic_sessions=cfg.topic_sessions + suffix,
+        topic_decisions=cfg.topic_decisions + suffix,
+        topic_actions=cfg.topic_actions + suffix,
+        topic_audit=cfg.topic_audit + suffix,
+        topic_dead_letter=cfg.topic_dead_letter + suffix,
+        consumer_group_suffix=cfg.consumer_group_suffix + suffix,
+    )
+
+
+def publish_replay(cfg: Settings, clips: List[ArchivedClip], run_id: str, speed: float = 10.0, rate: float = 0.0) -> int:
+    # speed=N replays the archive's own clip cadence N times faster (0 = as
+    # fast as the rate cap allows); rate caps clips/s across all cameras.
+    if not clips:
+        return 0
+    producer = make_producer(cfg)
+    bucket = TokenBucket(rate, capacity=max(1.0, rate)) if rate > 0 else None
+    base = clips[0].end_ts
+    t0 = time.monotonic()
+    last_report = t0
+    for n, c in enumerate(clips, 1):
+        if speed > 0:
+            delay = t0 + (c.end_ts - base).total_seconds() / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        if bucket is not None:
+            bucket.acquire()
+        evt = ClipEvent(
+            camera_id=c.camera_id,
+            station_id=c.station_id,
+            sku_id=c.sku_id,
+            use_case=c.use_case,
+            clip_index=c.clip_index,
+            clip_start_ts=c.start_ts,
+            clip_end_ts=c.end_ts,
+            gcs_uri=c.gcs_uri,
+            labels={"replay_run": run_id, "replay_of": c.clip_id},
+        )
+        spans = stamp({}, "clip_end")
+        evt.spans = stamp(spans, "ingest.produce")
+        produce_model(producer, cfg.topic_clips, evt, key=c.camera_id)
+        producer.poll(0)
+        now = time.monotonic()
+        if now - last_report >= 10:
+            last_report = now
+            print(f"[replay] published {n}/{len(clips)} ({n / (now - t0):.1f} clips/s)")
+    producer.flush(30)
+    return len(clips)
+
+
+class DecisionCollector:
+    def __init__(self, cfg: Settings, group: str):
+        self.consumer = make_consumer(cfg, group_id=group, topics=[cfg.topic_decisions], offset_reset="earliest")
+        self.decisions: List[Dict[str, Any]] = []
+        self.last_at = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="replay-collector", daemon=True)
+
+    def start(self) -> "DecisionCollector":
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            msg = self.consumer.poll(1.0)
+            if msg is None or msg.error():
+                continue
+            self.decisions.append(json.loads(msg.value().decode("utf-8")))
+            self.last_at = time.monotonic()
+
+    def drain(self, idle_s: float, timeout_s: float) -> List[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout_s
+        self.last_at = max(self.last_at, time.monotonic())
+        while time.monotonic() < deadline and time.monotonic() - self.last_at < idle_s:
+            time.sleep(0.5)
+        self._stop.set()
+        self._thread.join(timeout=5)
+        return list(self.decisions)
+
+
+def _bigquery_decisions(cfg: Settings, use_case: str, cameras: List[str], start: date, end: date) -> List[Dict[str, Any]]:
+    from google.cloud import bigquery
+    from ..audit.bq_writer import audit_table_id
+
+    bq = bigquery.Client(project=cfg.gcp_project)
+    q = f"""
+    SELECT payload_json
+    FROM `{audit_table_id(cfg)}`
+    WHERE kind = 'decision'
+      AND use_case = @use_case
+      AND camera_id IN UNNEST(@cameras)
+      AND ts >= TIMESTAMP(@start) AND ts < TIMESTAMP_ADD(TIMESTAMP(@end), INTERVAL 1 DAY)
+    """
+    job = bq.query(
+        q,
+        job_config=bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("use_case", "STRING", use_case),
+                bigquery.ArrayQueryParameter("cameras", "STRING", cameras),
+                bigquery.ScalarQueryParameter("start", "STRING", start.isoformat()),
+                bigquery.ScalarQueryParameter("end", "STRING", end.isoformat()),
+            ]
+        ),
+    )
+    return [json.loads(r["payload_json"]) for r in job.result()]
+
+
+def _jsonl_decisions(path: str, use_case: str, cameras: List[str], start: date, end: date) -> List[Dict[str, Any]]:
+    cams = set(cameras)
+    out = []
+    if not os.path.exists(path):
+        return out
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            if row.get("kind") != "decision":
+                continue
+            d = json.loads(row.get("payload_json") or "{}")
+            day = (_ts(d.get("ts")) or datetime.min.replace(tzinfo=timezone.utc)).date()
+            if d.get("use_case") == use_case and d.get("camera_id") in cams and start <= day <= end:
+                out.append(d)
+    return out
+
+
+def original_decisions(cfg: Settings, use_case: str, cameras: List[str], start: date, end: date) -> List[Dict[str, Any]]:
+    if cfg.audit_sink == "jsonl":
+        return _jsonl_decisions(cfg.local_audit_path, use_case, cameras, start, end)
+    return _bigquery_decisions(cfg, use_case, cameras, start, end)
+
+
+def _decision_rule(d: Dict[str, Any]) -> str:
+    a = d.get("assessment") or {}
+    return str(a.get("rule_id") or ("sop_violation" if a.get("sop_violation") or d.get("use_case") == "assembly" else "other"))
+
+
+def _decision_range(d: Dict[str, Any]) -> Tuple[int, int]:
+    r = (d.get("evidence") or {}).get("clip_range")
+    if isinstance(r, list) and len(r) == 2:
+        try:
+            return int(r[0]), int(r[1])
+        except (TypeError, ValueError):
+            pass
+    i = int(d.get("clip_index") or 0)
+    return i, i
+
+
+def compare_decisions(original: List[Dict[str, Any]], replayed: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # A replayed decision matches an original one for the same camera and rule
+    # whose clip range overlaps it; everything else is new or missing.
+    by_key: Dict[Tuple[str, str], List[List[Any]]] = defaultdict(list)
+    for d in original:
+        by_key[(d.get("camera_id", ""), _decision_rule(d))].append([_decision_range(d), False, d])
+    rows: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(lambda: {"original": 0, "replay": 0, "matched": 0})
+    new: List[Dict[str, Any]] = []
+    for k, lst in by_key.items():
+        rows[k]["original"] = len(lst)
+    for d in replayed:
+        k = (d.get("camera_id", ""), _decision_rule(d))
+        rows[k]["replay"] += 1
+        lo, hi = _decision_range(d)
+        hit = next((o for o in by_key.get(k, []) if not o[1] and o[0][0] <= hi and lo <= o[0][1]), None)
+        if hit is None:
+            new.append(d)
+            continue
+        hit[1] = True
+        rows[k]["matched"] += 1
+    missing = [o[2] for lst in by_key.values() for o in lst if not o[1]]
+    return {
+        "by_camera_rule": {f"{cam}:{rule}": v for (cam, rule), v in sorted(rows.items())},
+        "new": new,
+        "missing": missing,
+    }
+
+
+def _day(s: str) -> date:
+    return date.fromisoformat(s)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(
+        description="Replay archived clips from the blob store through an isolated copy of the pipeline "
+        "and compare the resulting decisions with the audited originals."
+    )
+    ap.add_argument("--use-case", required=True, choices=["assembly", "security"])
+    ap.add_argument("--start", required=True, type=_day, help="first day (UTC, YYYY-MM-DD)")
+    ap.add_argument("--end", type=_day, default=None, help="last day, inclusive (default: --start)")
+    ap.add_argument("--cameras", default="", help="comma-separated camera ids (default: every camera under the use case)")
+    ap.add_argument("--speed", type=float, default=10.0, help="replay N times faster than the archived cadence; 0 = unpaced")
+    ap.add_argument("--rate", type=float, default=0.0, help="cap on published clips per second (0 = none)")
+    ap.add_argument("--max-clips", type=int, default=0)
+    ap.add_argument("--list-workers", type=int, default=32, help="parallel camera-day listings")
+    ap.add_argument("--run-id", default=None, help="suffix for the isolated topics and consumer groups")
+    ap.add_argument("--create-topics", action="store_true", help="create the isolated topics first")
+    ap.add_argument("--no-pipeline", action="store_true", help="only publish; run the agents elsewhere on the isolated topics")
+    ap.add_argument("--no-compare", action="store_true")
+    ap.add_argument("--drain-s", type=float, default=30.0, help="stop collecting after this long without a new decision")
+    ap.add_argument("--timeout-s", type=float, default=3600.0, help="upper bound on collecting after publishing")
+    ap.add_argument("--report", default=None, help="write the full comparison as JSON here")
+    ap.add_argument("--env", default=".env")
+    args = ap.parse_args()
+
+    cfg = load_settings(args.env)
+    end = args.end or args.start
+    run_id = args.run_id or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    iso = isolated_settings(cfg, f".replay-{run_id}")
+    store = make_blob_store(cfg)
+
+    cameras = [c.strip() for c in args.cameras.split(",") if c.strip()] or discover_cameras(store, cfg.gcs_bucket, args.use_case)
+    prefixes = day_prefixes(args.use_case, cameras, args.start, end)
+    t0 = time.time()
+    clips = list_archived_clips(store, cfg.gcs_bucket, prefixes, cfg.clip_seconds, workers=args.list_workers)
+    if args.max_clips:
+        clips = clips[: args.max_clips]
+    print(f"[replay] listed {len(clips)} clips from {len(prefixes)} camera-days ({len(cameras)} cameras) in {time.time() - t0:.1f}s")
+    if not clips:
+        return
+
+    if args.create_topics:
+        ensure_topics(iso, [iso.topic_clips, iso.topic_observations, iso.topic_sessions, iso.topic_decisions, iso.topic_actions, iso.topic_dead_letter])
+    ensure_schemas(iso)
+    bind_topic_models(iso)
+    collector = None if args.no_compare else DecisionCollector(iso, "replay-compare").start()
+
+    if not args.no_pipeline:
+        # Fresh topics per run, so the isolated agents start from the beginning.
+        os.environ["KAFKA_OFFSET_RESET"] = "earliest"
+        from ..agents.observer.observer import ObserverService
+        from ..agents.sessionizer.sessionizer import SessionizerService
+        from ..agents.thinker.thinker import ThinkerService
+
+        for svc in (ObserverService(iso), SessionizerService(iso), ThinkerService(iso)):
+            threading.Thread(target=svc.run, daemon=True).start()
+
+    print(f"[replay] run={run_id} -> {iso.topic_clips} (speed={args.speed}x rate={args.rate or 'unlimited'})")
+    t0 = time.time()
+    n = publish_replay(iso, clips, run_id, speed=args.speed, rate=args.rate)
+    print(f"[replay] published {n} clips in {time.time() - t0:.1f}s")
+    if collector is None:
+        return
+
+    replayed = collector.drain(args.drain_s, args.timeout_s)
+    original = original_decisions(cfg, args.use_case, cameras, args.start, end)
+    result = compare_decisions(original, replayed)
+    print(f"{'camera:rule':<48}{'original':>10}{'replay':>10}{'matched':>10}")
+    for k, v in result["by_camera_rule"].items():
+        print(f"{k:<48}{v['original']:>10}{v['replay']:>10}{v['matched']:>10}")
+    print(f"[replay] original={len(original)} replay={len(replayed)} new={len(result['new'])} missing={len(result['missing'])}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"run_id": run_id, "clips": n, **result}, f, indent=2, default=str)
+        print(f"[replay] report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
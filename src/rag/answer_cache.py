@@ -0,0 +1,232 @@
+from __future__ import annotations
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from ..shared.metrics import CACHE_REQUESTS
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+
+_WS = re.compile(r"\s+")
+_PUNCT = re.compile(r"[^\w\s]")
+_NUM = re.compile(r"\d+")
+
+
+def normalize_question(q: str) -> str:
+    s = _PUNCT.sub(" ", (q or "").lower())
+    return _WS.sub(" ", s).strip()
+
+
+class HashingEmbedder:
+    def __init__(self, dim: int = 512, ngram: int = 3):
+        self.dim = int(dim)
+        self.ngram = int(ngram)
+
+    def _vec(self, text: str) -> List[float]:
+        v = [0.0] * self.dim
+        t = f" {text} "
+        for i in range(max(1, len(t) - self.ngram + 1)):
+            h = int.from_bytes(hashlib.blake2b(t[i : i + self.ngram].encode("utf-8"), digest_size=4).digest(), "little")
+            v[h % self.dim] += 1.0
+        return v
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return [self._vec(t) for t in texts]
+
+
+def _numbers(normalized: str) -> Tuple[str, ...]:
+    return tuple(sorted(_NUM.findall(normalized)))
+
+
+def _unit(v: List[float]) -> List[float]:
+    n = math.sqrt(sum(x * x for x in v))
+    return [x / n for x in v] if n > 0 else v
+
+
+def _dot(a: List[float], b: List[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+@dataclass
+class _Entry:
+    value: Dict[str, Any]
+    created: float
+    vector: Optional[List[float]] = None
+
+
+@dataclass
+class CacheLookup:
+    value: Optional[Dict[str, Any]]
+    match: Optional[str] = None
+    similarity: Optional[float] = None
+    vector: Optional[List[float]] = field(default=None, repr=False)
+
+
+class AnswerCache:
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_s: float = 3600.0,
+        embed_fn: Optional[EmbedFn] = None,
+        similarity_threshold: float = 0.9,
+        name: str = "chat_answer",
+    ):
+        self.name = name
+        self.max_entries = int(max_entries)
+        self.ttl_s = float(ttl_s)
+        self.embed_fn = embed_fn
+        self.similarity_threshold = float(similarity_threshold)
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        _register(self)
+
+    def _expired(self, e: _Entry, now: float) -> bool:
+        return self.ttl_s > 0 and now - e.created > self.ttl_s
+
+    def get(self, question: str, version: str) -> CacheLookup:
+        key = (version, normalize_question(question))
+        now = time.time()
+        with self._lock:
+            e = self._entries.get(key)
+            if e is not None and self._expired(e, now):
+                del self._entries[key]
+                e = None
+            if e is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                CACHE_REQUESTS.labels(self.name, "hit").inc()
+                return CacheLookup(e.value, match="exact", similarity=1.0)
+            if self.embed_fn is None:
+                self.misses += 1
+                CACHE_REQUESTS.labels(self.name, "miss").inc()
+                return CacheLookup(None)
+        vec = _unit(self.embed_fn([key[1]])[0])
+        nums = _numbers(key[1])
+        best_key, best_sim = None, -1.0
+        with self._lock:
+            for k, cand in self._entries.items():
+                if k[0] != version or cand.vector is None or self._expired(cand, now):
+                    continue
+                if _numbers(k[1]) != nums:
+                    continue
+                sim = _dot(vec, cand.vector)
+                if sim > best_sim:
+                    best_key, best_sim = k, sim
+            if best_key is not None and best_sim >= self.similarity_threshold:
+                self._entries.move_to_end(best_key)
+                self.hits += 1
+                self.semantic_hits += 1
+                CACHE_REQUESTS.labels(self.name, "semantic_hit").inc()
+                return CacheLookup(self._entries[best_key].value, match="semantic", similarity=best_sim, vector=vec)
+            self.misses += 1
+        CACHE_REQUESTS.labels(self.name, "miss").inc()
+        return CacheLookup(None, vector=vec)
+
+    def put(self, question: str, version: str, value: Dict[str, Any], vector: Optional[List[float]] = None) -> None:
+        key = (version, normalize_question(question))
+        if vector is None and self.embed_fn is not None:
+            vector = _unit(self.embed_fn([key[1]])[0])
+        with self._lock:
+            self._entries[key] = _Entry(value=value, created=time.time(), vector=vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+_caches: "weakref.WeakSet[AnswerCache]" = weakref.WeakSet()
+
+
+def _register(cache: AnswerCache) -> None:
+    _caches.add(cache)
+
+
+def invalidate_answer_caches() -> None:
+    for c in list(_caches):
+        c.invalidate()
+
+
+class SopVersion:
+    # The cache key for "which SOPs are live". invalidate_answer_caches() only
+    # reaches caches in the ingesting process, so when a probe is given the
+    # version comes from shared state (the sop_chunks table), re-read at most
+    # once per ttl_s. The local SOP file is the fallback when there is no probe
+    # or it has never answered.
+    def __init__(self, sop_path: str, probe: Optional[Callable[[], str]] = None, ttl_s: float = 30.0):
+        self.sop_path = sop_path
+        self.probe = probe
+        self.ttl_s = float(ttl_s)
+        self._mtime: Optional[float] = None
+        self._version = "unknown"
+        self._shared: Optional[str] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _shared_version(self) -> Optional[str]:
+        if self.probe is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            if self._checked and now - self._checked < self.ttl_s:
+                return self._shared
+            self._checked = now
+        try:
+            shared = self.probe()
+        except Exception as e:
+            print(f"[rag] SOP version probe failed; keeping {self._shared or 'file version'}: {type(e).__name__}: {e}")
+            return self._shared
+        with self._lock:
+            self._shared = shared
+        return shared
+
+    def _file_version(self) -> str:
+        try:
+            mtime = os.path.getmtime(self.sop_path)
+        except OSError:
+            return self._version
+        with self._lock:
+            if mtime != self._mtime:
+                with open(self.sop_path, "rb") as f:
+                    data = f.read()
+                try:
+                    declared = str(json.loads(data).get("sop_version", ""))
+                except Exception:
+                    declared = ""
+                self._version = f"{declared}:{hashlib.sha256(data).hexdigest()[:12]}"
+                self._mtime = mtime
+            return self._version
+
+    def fresh(self) -> Optional[str]:
+        # The shared version if it can be returned without a probe, else None.
+        with self._lock:
+            if self.probe is not None and self._shared is not None and time.monotonic() - self._checked < self.ttl_s:
+                return f"table:{self._shared}"
+        return None
+
+    def current(self) -> str:
+        shared = self._shared_version()
+        return f"table:{shared}" if shared is not None else self._file_version()
@@ -0,0 +1,72 @@
+from __future__ import annotations
+import json
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+from google.cloud import bigquery
+from ..config.settings import Settings
+from .ingest_sop import sop_table_id
+from .vertex_embed import VertexEmbedder
+from .vertex_search_answer import SearchAnswer
+
+
+@lru_cache(maxsize=4)
+def _embedder(cfg: Settings) -> VertexEmbedder:
+    return VertexEmbedder(cfg)
+
+
+@lru_cache(maxsize=4)
+def _bq(project: str) -> bigquery.Client:
+    return bigquery.Client(project=project)
+
+
+def vector_search(
+    cfg: Settings,
+    query: str,
+    station_id: Optional[str] = None,
+    sku_id: Optional[str] = None,
+    top_k: int = 8,
+) -> SearchAnswer:
+    qvec = _embedder(cfg).embed([query])[0]
+    q = f"""
+    SELECT base.chunk_id, base.chunk_text, base.metadata_json, distance
+    FROM VECTOR_SEARCH(
+      (
+        SELECT chunk_id, chunk_text, metadata_json, embedding
+        FROM `{sop_table_id(cfg)}`
+        WHERE NOT COALESCE(deleted, FALSE)
+          AND (@station_id IS NULL OR station_id = @station_id)
+          AND (@sku_id IS NULL OR sku_id = @sku_id)
+      ),
+      'embedding',
+      (SELECT @qvec AS embedding),
+      top_k => @top_k,
+      distance_type => 'COSINE'
+    )
+    ORDER BY distance
+    """
+    job = _bq(cfg.gcp_project).query(
+        q,
+        job_config=bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("station_id", "STRING", station_id),
+                bigquery.ScalarQueryParameter("sku_id", "STRING", sku_id),
+                bigquery.ArrayQueryParameter("qvec", "FLOAT64", qvec),
+                bigquery.ScalarQueryParameter("top_k", "INT64", int(top_k)),
+            ],
+        ),
+    )
+    sources: List[Dict[str, Any]] = []
+    for r in job.result():
+        meta = json.loads(r["metadata_json"]) if r["metadata_json"] else {}
+        sources.append({
+            "chunk_id": r["chunk_id"],
+            "chunk_text": r["chunk_text"],
+            "metadata": {**meta, "source": "bigquery_vector_search", "distance": float(r["distance"])},
+        })
+    sources.sort(key=lambda s: (s["metadata"].get("order_index") is None, s["metadata"].get("order_index") or 0))
+    return SearchAnswer(
+        answer_text="",
+        snippets=[s["chunk_text"] for s in sources],
+        raw=job,
+        sources=sources,
+    )
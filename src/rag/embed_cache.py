@@ -0,0 +1,67 @@
+from __future__ import annotations
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+from ..shared.metrics import CACHE_REQUESTS
+
+
+def text_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x1f{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = "", memory_entries: int = 50000):
+        self.path = path
+        self.memory_entries = int(memory_entries)
+        self._mem: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (k TEXT PRIMARY KEY, v BLOB NOT NULL)")
+            self._db.commit()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        out: Dict[str, List[float]] = {}
+        missing: List[str] = []
+        with self._lock:
+            for k in keys:
+                v = self._mem.get(k)
+                if v is not None:
+                    out[k] = v
+                else:
+                    missing.append(k)
+            if missing and self._db is not None:
+                for i in range(0, len(missing), 500):
+                    part = missing[i : i + 500]
+                    q = f"SELECT k, v FROM embeddings WHERE k IN ({','.join('?' * len(part))})"
+                    for k, blob in self._db.execute(q, part):
+                        vec = array("d", blob).tolist()
+                        out[k] = vec
+                        self._remember(k, vec)
+        CACHE_REQUESTS.labels("embedding", "hit").inc(len(out))
+        CACHE_REQUESTS.labels("embedding", "miss").inc(len(keys) - len(out))
+        return out
+
+    def put_many(self, items: List[Tuple[str, List[float]]]) -> None:
+        if not items:
+            return
+        with self._lock:
+            for k, v in items:
+                self._remember(k, v)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (k, v) VALUES (?, ?)",
+                    [(k, array("d", v).tobytes()) for k, v in items],
+                )
+                self._db.commit()
+
+    def _remember(self, k: str, v: List[float]) -> None:
+        if len(self._mem) >= self.memory_entries:
+            self._mem.pop(next(iter(self._mem)))
+        self._mem[k] = v
@@ -1,53 +1,262 @@
 from __future__ import annotations
+import argparse
+import glob
+import hashlib
 import json
+import os
 import uuid
-from typing import Any, Dict, List
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set
 from google.cloud import bigquery
-from ..config.settings import Settings
+from ..config.settings import Settings, load_settings
 from .sop_chunker import sop_to_chunks
 from .vertex_embed import VertexEmbedder
+from .answer_cache import invalidate_answer_caches
 
 
-def ensure_sop_table(cfg: Settings) -> None:
-    bq = bigquery.Client(project=cfg.gcp_project)
-    table_id = f"{cfg.gcp_project}.{cfg.bigquery_dataset}.sop_chunks"
-    schema = [
+def sop_table_id(cfg: Settings) -> str:
+    return f"{cfg.gcp_project}.{cfg.bigquery_dataset}.sop_chunks"
+
+
+def sop_schema() -> List[bigquery.SchemaField]:
+    return [
         bigquery.SchemaField("chunk_id", "STRING", mode="REQUIRED"),
         bigquery.SchemaField("chunk_text", "STRING", mode="REQUIRED"),
         bigquery.SchemaField("metadata_json", "STRING", mode="REQUIRED"),
-        bigquery.SchemaField("embedding_json", "STRING", mode="REQUIRED"),
+        bigquery.SchemaField("embedding", "FLOAT64", mode="REPEATED"),
+        bigquery.SchemaField("sop_key", "STRING"),
+        bigquery.SchemaField("station_id", "STRING"),
+        bigquery.SchemaField("sku_id", "STRING"),
+        bigquery.SchemaField("step_id", "STRING"),
+        bigquery.SchemaField("content_sha256", "STRING"),
+        bigquery.SchemaField("deleted", "BOOL"),
+        bigquery.SchemaField("updated_at", "TIMESTAMP"),
     ]
+
+
+def sop_table_version(bq: bigquery.Client, table_id: str) -> str:
+    # Every insert, tombstone and restore in _merge stamps updated_at, so this
+    # changes whenever any process ingests a SOP.
+    q = f"SELECT FORMAT_TIMESTAMP('%FT%H:%M:%E6S', MAX(updated_at)) AS v, COUNT(*) AS n FROM `{table_id}`"
+    row = next(iter(bq.query(q).result()), None)
+    return f"{row['v'] if row else None}/{row['n'] if row else 0}"
+
+
+SOP_VECTOR_INDEX = "sop_chunks_embedding_idx"
+
+
+def ensure_sop_table(cfg: Settings) -> None:
+    bq = bigquery.Client(project=cfg.gcp_project)
+    table_id = sop_table_id(cfg)
+    schema = sop_schema()
     try:
-        bq.get_table(table_id)
+        table = bq.get_table(table_id)
     except Exception:
         table = bigquery.Table(table_id, schema=schema)
         bq.create_table(table)
         print("[rag] created table sop_chunks")
+        ensure_sop_vector_index(cfg)
+        return
+    have = {f.name: f for f in table.schema}
+    missing = [f for f in schema if f.name not in have]
+    legacy_json = have.get("embedding_json")
+    if missing or (legacy_json is not None and legacy_json.mode == "REQUIRED"):
+        new_schema = []
+        for f in table.schema:
+            if f.name == "embedding_json" and f.mode == "REQUIRED":
+                f = bigquery.SchemaField(f.name, f.field_type, mode="NULLABLE")
+            new_schema.append(f)
+        table.schema = new_schema + missing
+        bq.update_table(table, ["schema"])
+        print("[rag] updated sop_chunks schema; added:", [f.name for f in missing])
+    if legacy_json is not None:
+        _backfill_native_embeddings(bq, table_id)
+    ensure_sop_vector_index(cfg)
+
+
+def _backfill_native_embeddings(bq: bigquery.Client, table_id: str) -> None:
+    q = f"""
+    UPDATE `{table_id}`
+    SET
+      embedding = ARRAY(SELECT CAST(x AS FLOAT64) FROM UNNEST(JSON_VALUE_ARRAY(embedding_json)) AS x WITH OFFSET o ORDER BY o),
+      station_id = COALESCE(station_id, JSON_VALUE(metadata_json, '$.station_id')),
+      sku_id = COALESCE(sku_id, JSON_VALUE(metadata_json, '$.sku_id'))
+    WHERE ARRAY_LENGTH(embedding) = 0 AND embedding_json IS NOT NULL AND embedding_json != ''
+    """
+    try:
+        job = bq.query(q)
+        job.result()
+    except Exception as e:
+        print("[rag] legacy embedding backfill skipped:", e)
+        return
+    if job.num_dml_affected_rows:
+        print(f"[rag] backfilled native embeddings for {job.num_dml_affected_rows} legacy rows")
+
+
+def ensure_sop_vector_index(cfg: Settings) -> None:
+    bq = bigquery.Client(project=cfg.gcp_project)
+    q = f"""
+    CREATE VECTOR INDEX IF NOT EXISTS `{SOP_VECTOR_INDEX}`
+    ON `{sop_table_id(cfg)}`(embedding)
+    STORING (chunk_id, chunk_text, metadata_json, station_id, sku_id, step_id, deleted)
+    OPTIONS (index_type = 'IVF', distance_type = 'COSINE')
+    """
+    try:
+        bq.query(q).result()
+    except Exception as e:
+        print("[rag] vector index not created (VECTOR_SEARCH falls back to brute force):", e)
 
 
-def ingest_sop_to_vertex(cfg: Settings) -> None:
-    with open(cfg.assembly_sop_path, "r", encoding="utf-8") as f:
-        sop = json.load(f)
-    chunks = sop_to_chunks(sop)
-    texts = [c["chunk_text"] for c in chunks]
-    embedder = VertexEmbedder(cfg)
-    vectors = embedder.embed(texts)
+def sop_key(meta: Dict[str, Any]) -> str:
+    return "|".join(str(meta.get(k) or "") for k in ("process_id", "station_id", "sku_id"))
+
+
+def chunk_id_for(meta: Dict[str, Any], text_sha256: str) -> str:
+    parts = [str(meta.get(k) or "") for k in ("process_id", "station_id", "sku_id", "sop_version", "step_id")]
+    return hashlib.sha256("\x1f".join(parts + [text_sha256]).encode("utf-8")).hexdigest()
+
+
+def sop_files(path: str) -> List[str]:
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, "**", "*.json"), recursive=True))
+    return [path]
+
+
+def _load_chunks(paths: List[str]) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    seen: Set[str] = set()
+    for p in paths:
+        with open(p, "r", encoding="utf-8") as f:
+            sop = json.load(f)
+        for c in sop_to_chunks(sop):
+            text_sha = hashlib.sha256(c["chunk_text"].encode("utf-8")).hexdigest()
+            cid = chunk_id_for(c["metadata"], text_sha)
+            if cid in seen:
+                continue
+            seen.add(cid)
+            out.append({
+                **c,
+                "chunk_id": cid,
+                "sop_key": sop_key(c["metadata"]),
+                "step_id": str(c["metadata"].get("step_id") or ""),
+                "content_sha256": text_sha,
+            })
+    return out
+
+
+def _existing_chunk_ids(bq: bigquery.Client, table_id: str, chunk_ids: List[str]) -> Set[str]:
+    q = f"""
+    SELECT chunk_id FROM `{table_id}`
+    WHERE chunk_id IN UNNEST(@ids)
+    """
+    job = bq.query(
+        q,
+        job_config=bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ArrayQueryParameter("ids", "STRING", chunk_ids)],
+        ),
+    )
+    return {r["chunk_id"] for r in job.result()}
+
+
+_LEGACY_SOP_KEY = (
+    "CONCAT(IFNULL(JSON_VALUE(T.metadata_json, '$.process_id'), ''), '|', "
+    "IFNULL(JSON_VALUE(T.metadata_json, '$.station_id'), ''), '|', "
+    "IFNULL(JSON_VALUE(T.metadata_json, '$.sku_id'), ''))"
+)
+
+
+def _merge(bq: bigquery.Client, table_id: str, rows: List[Dict[str, Any]], sop_keys: List[str]) -> Dict[str, int]:
+    staging_id = f"{table_id}_staging_{uuid.uuid4().hex[:12]}"
+    # The finally below drops the staging table; the expiry covers a process
+    # killed before it gets there.
+    staging = bigquery.Table(staging_id, schema=sop_schema())
+    staging.expires = datetime.now(timezone.utc) + timedelta(hours=1)
+    bq.create_table(staging)
+    try:
+        load = bq.load_table_from_json(
+            rows,
+            staging_id,
+            job_config=bigquery.LoadJobConfig(schema=sop_schema(), write_disposition="WRITE_APPEND"),
+        )
+        load.result()
+        q = f"""
+        MERGE `{table_id}` T
+        USING `{staging_id}` S
+        ON T.chunk_id = S.chunk_id
+        WHEN MATCHED AND COALESCE(T.deleted, FALSE) THEN
+          UPDATE SET deleted = FALSE, updated_at = S.updated_at
+        WHEN NOT MATCHED BY TARGET AND ARRAY_LENGTH(S.embedding) > 0 THEN
+          INSERT (chunk_id, chunk_text, metadata_json, embedding, sop_key, station_id, sku_id, step_id, content_sha256, deleted, updated_at)
+          VALUES (S.chunk_id, S.chunk_text, S.metadata_json, S.embedding, S.sop_key, S.station_id, S.sku_id, S.step_id, S.content_sha256, FALSE, S.updated_at)
+        WHEN NOT MATCHED BY SOURCE
+          AND COALESCE(T.sop_key, {_LEGACY_SOP_KEY}) IN UNNEST(@sop_keys)
+          AND NOT COALESCE(T.deleted, FALSE) THEN
+          UPDATE SET deleted = TRUE, updated_at = CURRENT_TIMESTAMP()
+        """
+        job = bq.query(
+            q,
+            job_config=bigquery.QueryJobConfig(
+                query_parameters=[bigquery.ArrayQueryParameter("sop_keys", "STRING", sop_keys)],
+            ),
+        )
+        job.result()
+        stats = getattr(job, "dml_stats", None)
+        return {
+            "inserted": int(getattr(stats, "inserted_row_count", 0) or 0),
+            "updated": int(getattr(stats, "updated_row_count", 0) or 0),
+        }
+    finally:
+        bq.delete_table(staging_id, not_found_ok=True)
+
+
+def ingest_sop_to_vertex(cfg: Settings, path: Optional[str] = None) -> Dict[str, int]:
+    paths = sop_files(path or cfg.assembly_sop_path)
+    chunks = _load_chunks(paths)
     ensure_sop_table(cfg)
     bq = bigquery.Client(project=cfg.gcp_project)
-    table_id = f"{cfg.gcp_project}.{cfg.bigquery_dataset}.sop_chunks"
+    table_id = sop_table_id(cfg)
+    existing = _existing_chunk_ids(bq, table_id, [c["chunk_id"] for c in chunks]) if chunks else set()
+    fresh = [c for c in chunks if c["chunk_id"] not in existing]
+    vectors: Dict[str, List[float]] = {}
+    if fresh:
+        embedder = VertexEmbedder(cfg)
+        for c, v in zip(fresh, embedder.embed([c["chunk_text"] for c in fresh])):
+            vectors[c["chunk_id"]] = v
+    now = datetime.now(timezone.utc).isoformat()
     rows = []
-    for c, v in zip(chunks, vectors):
-        chunk_id = str(uuid.uuid4())
+    for c in chunks:
+        v = vectors.get(c["chunk_id"])
         rows.append({
-            "chunk_id": chunk_id,
+            "chunk_id": c["chunk_id"],
             "chunk_text": c["chunk_text"],
             "metadata_json": json.dumps(c["metadata"]),
-            "embedding_json": json.dumps(v),
+            "embedding": v or [],
+            "sop_key": c["sop_key"],
+            "station_id": c["metadata"].get("station_id"),
+            "sku_id": c["metadata"].get("sku_id"),
+            "step_id": c["step_id"],
+            "content_sha256": c["content_sha256"],
+            "deleted": False,
+            "updated_at": now,
         })
-    errors = bq.insert_rows_json(table_id, rows)
-    if errors:
-        raise RuntimeError(f"BigQuery insert errors (sop_chunks): {errors}")
-    print(f"[rag] ingested {len(rows)} SOP chunks into BigQuery sop_chunks")
+    sop_keys = sorted({c["sop_key"] for c in chunks})
+    stats = _merge(bq, table_id, rows, sop_keys) if rows else {"inserted": 0, "updated": 0}
+    print(
+        f"[rag] SOP ingest: files={len(paths)} chunks={len(chunks)} embedded={len(fresh)} "
+        f"inserted={stats['inserted']} tombstoned/restored={stats['updated']}"
+    )
+    if stats["inserted"] or stats["updated"]:
+        invalidate_answer_caches()
+    return {"files": len(paths), "chunks": len(chunks), "embedded": len(fresh), **stats}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Incrementally ingest SOP JSON files (a file or a directory) into sop_chunks.")
+    ap.add_argument("path", nargs="?", default=None, help="SOP file or directory (default: ASSEMBLY_SOP_PATH)")
+    ap.add_argument("--env", default=".env")
+    args = ap.parse_args()
+    ingest_sop_to_vertex(load_settings(args.env), args.path)
+
 
-    print("[rag] NOTE: Vector Search datapoint upsert step depends on your index config.")
-    print("[rag] For hackathon, we can retrieve via BigQuery embedding search OR wire Vector Search upsert next.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+from __future__ import annotations
+import glob
+import json
+import os
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from ..config.settings import Settings
+from .sop_chunker import sop_to_chunks
+from .vertex_search_answer import SearchAnswer, answer_query
+
+BACKENDS = ("vertex_search", "bigquery_vector", "local")
+
+
+@lru_cache(maxsize=8)
+def _local_chunks(path: str, mtimes: Tuple[float, ...]) -> List[Dict[str, Any]]:
+    files = sorted(glob.glob(os.path.join(path, "**", "*.json"), recursive=True)) if os.path.isdir(path) else [path]
+    out: List[Dict[str, Any]] = []
+    for fp in files:
+        with open(fp, "r", encoding="utf-8") as f:
+            for i, c in enumerate(sop_to_chunks(json.load(f))):
+                out.append({"chunk_id": f"{os.path.basename(fp)}#{i}", **c})
+    return out
+
+
+def local_search(cfg: Settings, station_id: Optional[str] = None, sku_id: Optional[str] = None, top_k: int = 8) -> SearchAnswer:
+    path = cfg.assembly_sop_path
+    if os.path.isdir(path):
+        mtimes = tuple(os.path.getmtime(p) for p in sorted(glob.glob(os.path.join(path, "**", "*.json"), recursive=True)))
+    else:
+        mtimes = (os.path.getmtime(path),)
+    hits = [
+        c
+        for c in _local_chunks(path, mtimes)
+        if (station_id is None or c["metadata"].get("station_id") == station_id)
+        and (sku_id is None or c["metadata"].get("sku_id") == sku_id)
+    ]
+    hits.sort(key=lambda c: (c["metadata"].get("order_index") is None, c["metadata"].get("order_index") or 0))
+    hits = hits[:top_k]
+    return SearchAnswer(
+        answer_text="\n".join(c["chunk_text"] for c in hits),
+        snippets=[c["chunk_text"] for c in hits],
+        raw=None,
+        sources=hits,
+    )
+
+
+def retrieve_sop(
+    cfg: Settings,
+    query: str,
+    station_id: Optional[str] = None,
+    sku_id: Optional[str] = None,
+) -> SearchAnswer:
+    if cfg.sop_retrieval_backend == "bigquery_vector":
+        from .bq_vector_search import vector_search
+        return vector_search(cfg, query, station_id=station_id, sku_id=sku_id)
+    if cfg.sop_retrieval_backend == "local":
+        return local_search(cfg, station_id=station_id, sku_id=sku_id)
+    return answer_query(cfg, query)
@@ -1,16 +1,93 @@
 from __future__ import annotations
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
+from google.api_core import exceptions as gexc
 from vertexai.preview.language_models import TextEmbeddingModel
 from ..shared.vertex_client import init_vertex
+from ..shared.rate_limit import TokenBucket
 from ..config.settings import Settings
+from .embed_cache import EmbeddingCache, text_key
+
+_RETRYABLE = (
+    gexc.ResourceExhausted,
+    gexc.ServiceUnavailable,
+    gexc.DeadlineExceeded,
+    gexc.InternalServerError,
+    gexc.TooManyRequests,
+)
+
+# Per-request limits: gemini-embedding-001 takes a single instance per call,
+# the text-embedding/gecko family up to 250 instances and ~20k tokens.
+MAX_REQUEST_CHARS = 60000
+
+
+def default_batch_size(model_name: str) -> int:
+    return 1 if model_name.startswith("gemini-embedding") else 250
 
 
 class VertexEmbedder:
-    def __init__(self, cfg: Settings):
+    def __init__(self, cfg: Settings, cache: EmbeddingCache | None = None):
         init_vertex(cfg)
         self.cfg = cfg
         self.model = TextEmbeddingModel.from_pretrained(cfg.vertex_embed_model)
+        self.batch_size = cfg.vertex_embed_batch_size or default_batch_size(cfg.vertex_embed_model)
+        self.concurrency = max(1, cfg.vertex_embed_concurrency)
+        self.max_retries = 5
+        self.bucket = TokenBucket(cfg.vertex_embed_rpm / 60.0, capacity=self.concurrency) if cfg.vertex_embed_rpm > 0 else None
+        self.cache = cache if cache is not None else EmbeddingCache(cfg.embed_cache_path)
+
+    def _batches(self, texts: List[str]) -> List[List[int]]:
+        out: List[List[int]] = []
+        cur: List[int] = []
+        chars = 0
+        for i, t in enumerate(texts):
+            if cur and (len(cur) >= self.batch_size or chars + len(t) > MAX_REQUEST_CHARS):
+                out.append(cur)
+                cur, chars = [], 0
+            cur.append(i)
+            chars += len(t)
+        if cur:
+            out.append(cur)
+        return out
+
+    def _call(self, texts: List[str]) -> List[List[float]]:
+        delay = 1.0
+        for attempt in range(self.max_retries + 1):
+            if self.bucket is not None:
+                self.bucket.acquire()
+            try:
+                return [e.values for e in self.model.get_embeddings(texts)]
+            except _RETRYABLE as e:
+                if attempt >= self.max_retries:
+                    raise
+                sleep_s = delay * (0.5 + random.random())
+                print(f"[embed] retry {attempt + 1}/{self.max_retries} in {sleep_s:.1f}s: {type(e).__name__}")
+                time.sleep(sleep_s)
+                delay = min(delay * 2, 30.0)
+        return []
 
     def embed(self, texts: List[str]) -> List[List[float]]:
-        embs = self.model.get_embeddings(texts)
-        return [e.values for e in embs]
\ No newline at end of file
+        model = self.cfg.vertex_embed_model
+        keys = [text_key(model, t) for t in texts]
+        found = self.cache.get_many(list(dict.fromkeys(keys)))
+        todo_idx: List[int] = []
+        seen = set()
+        for i, k in enumerate(keys):
+            if k not in found and k not in seen:
+                seen.add(k)
+                todo_idx.append(i)
+        if todo_idx:
+            todo = [texts[i] for i in todo_idx]
+            batches = self._batches(todo)
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as ex:
+                results = list(ex.map(lambda b: self._call([todo[j] for j in b]), batches))
+            fresh = []
+            for b, vecs in zip(batches, results):
+                for j, v in zip(b, vecs):
+                    k = keys[todo_idx[j]]
+                    found[k] = v
+                    fresh.append((k, v))
+            self.cache.put_many(fresh)
+        return [found[k] for k in keys]
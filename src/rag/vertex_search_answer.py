@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import threading
+from dataclasses import dataclass, field
 from typing import Any, Dict, List, Optional
 
 from google.api_core.client_options import ClientOptions
@@ -14,6 +15,7 @@ class SearchAnswer:
     answer_text: str
     snippets: List[str]
     raw: Any
+    sources: List[Dict[str, Any]] = field(default_factory=list)
 
 def _api_endpoint(location: str) -> Optional[str]:
     if location == "global":
@@ -27,13 +29,23 @@ def _serving_config(project_id: str, location: str, engine_id: str) -> str:
         f"engines/{engine_id}/servingConfigs/default_serving_config"
     )
 
+_clients: Dict[str, discoveryengine.ConversationalSearchServiceClient] = {}
+_clients_lock = threading.Lock()
+
+
+def search_client(cfg: Settings) -> discoveryengine.ConversationalSearchServiceClient:
+    loc = cfg.vertex_search_location
+    with _clients_lock:
+        client = _clients.get(loc)
+        if client is None:
+            client_options = ClientOptions(api_endpoint=_api_endpoint(loc)) if _api_endpoint(loc) else None
+            client = discoveryengine.ConversationalSearchServiceClient(client_options=client_options)
+            _clients[loc] = client
+        return client
+
+
 def answer_query(cfg: Settings, query: str, session_id: str | None = None) -> SearchAnswer:
-    client_options = (
-        ClientOptions(api_endpoint=_api_endpoint(cfg.vertex_search_location))
-        if _api_endpoint(cfg.vertex_search_location)
-        else None
-    )
-    client = discoveryengine.ConversationalSearchServiceClient(client_options=client_options)
+    client = search_client(cfg)
     request = discoveryengine.AnswerQueryRequest(
         serving_config=_serving_config(cfg.gcp_project, cfg.vertex_search_location, cfg.vertex_search_engine_id),
         query=discoveryengine.Query(text=query),
@@ -0,0 +1,120 @@
+from __future__ import annotations
+import json
+import random
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+from pydantic import ValidationError
+from ..config.settings import Settings
+from .events import DeadLetterEvent
+from .kafka_client import AnyProducer, make_producer, produce_model
+from .metrics import REGISTRY
+from .model_backend import ModelThrottledError
+
+DEAD_LETTERS = REGISTRY.counter("sentinel_dead_letters_total", "Messages parked on the dead-letter topic.", ("group", "error"))
+HANDLER_RETRIES = REGISTRY.counter("sentinel_handler_retries_total", "In-process handler retries before success or dead-lettering.", ("group",))
+
+# Errors that retrying the same payload cannot fix: the message itself does
+# not decode or does not match its event model.
+POISON_ERRORS: Tuple[Type[BaseException], ...] = (ValidationError, UnicodeDecodeError, json.JSONDecodeError)
+
+# Errors whose retries already ran further down: the model limiter backs off
+# MODEL_MAX_RETRIES times before raising ModelThrottledError, so retrying the
+# handler again would multiply that schedule by DLQ_MAX_ATTEMPTS.
+EXHAUSTED_ERRORS: Tuple[Type[BaseException], ...] = (ModelThrottledError,)
+
+
+class DeadLetterPolicy:
+    # Common error path for agent consumers: run the handler up to
+    # max_attempts times with jittered exponential backoff, then publish the
+    # original payload with the error class and attempt count to the DLQ and
+    # move on. Poison messages and exhausted model retries skip the retries. The total time a single
+    # message can hold a consumer is bounded by the backoff schedule.
+    def __init__(
+        self,
+        producer: AnyProducer,
+        topic: str,
+        group: str,
+        max_attempts: int = 3,
+        backoff_s: float = 0.5,
+        backoff_cap_s: float = 5.0,
+        on_dead_letter: Optional[Callable[[Optional[Dict[str, Any]]], None]] = None,
+    ):
+        self.producer = producer
+        self.topic = topic
+        self.group = group
+        self.max_attempts = max(1, int(max_attempts))
+        self.backoff_s = float(backoff_s)
+        self.backoff_cap_s = float(backoff_cap_s)
+        # Lets a stateful handler drop state tied to a message it gave up on.
+        self.on_dead_letter = on_dead_letter
+
+    def process(self, msg: Any, handler: Callable[[Dict[str, Any]], None]) -> None:
+        try:
+            payload = json.loads(msg.value().decode("utf-8"))
+        except POISON_ERRORS as e:
+            self.dead_letter(msg, None, e, 0)
+            return
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                handler(payload)
+                return
+            except POISON_ERRORS + EXHAUSTED_ERRORS as e:
+                self.dead_letter(msg, payload, e, attempt)
+                return
+            except Exception as e:
+                if attempt >= self.max_attempts:
+                    self.dead_letter(msg, payload, e, attempt)
+                    return
+                sleep_s = random.uniform(0.5, 1.0) * min(self.backoff_cap_s, self.backoff_s * (2 ** (attempt - 1)))
+                HANDLER_RETRIES.labels(self.group).inc()
+                print(f"[dlq] {self.group} retry {attempt}/{self.max_attempts - 1} in {sleep_s:.1f}s: {type(e).__name__}: {e}")
+                time.sleep(sleep_s)
+
+    def dead_letter(self, msg: Any, payload: Optional[Dict[str, Any]], err: BaseException, attempts: int) -> None:
+        key = msg.key()
+        raw = None
+        if payload is None:
+            raw = (msg.value() or b"").decode("utf-8", errors="replace")[:100000]
+        ev = DeadLetterEvent(
+            ts=datetime.now(timezone.utc),
+            group=self.group,
+            source_topic=msg.topic(),
+            source_partition=msg.partition(),
+            source_offset=msg.offset(),
+            key=key.decode("utf-8", errors="replace") if key else None,
+            error_class=type(err).__name__,
+            error=str(err)[:2000],
+            attempts=attempts,
+            payload=payload,
+            raw=raw,
+        )
+        DEAD_LETTERS.labels(self.group, ev.error_class).inc()
+        print(
+            f"[dlq] {self.group} dead-lettered {ev.source_topic}[{ev.source_partition}]@{ev.source_offset} "
+            f"after {attempts} attempt(s): {ev.error_class}: {ev.error[:200]}"
+        )
+        produce_model(self.producer, self.topic, ev, key=ev.key)
+        if self.on_dead_letter is not None:
+            try:
+                self.on_dead_letter(payload)
+            except Exception as e:
+                print(f"[dlq] {self.group} on_dead_letter failed: {type(e).__name__}: {e}")
+
+
+def make_dead_letter(
+    cfg: Settings,
+    group: str,
+    producer: Optional[AnyProducer] = None,
+    on_dead_letter: Optional[Callable[[Optional[Dict[str, Any]]], None]] = None,
+) -> DeadLetterPolicy:
+    return DeadLetterPolicy(
+        producer if producer is not None else make_producer(cfg),
+        cfg.topic_dead_letter,
+        group,
+        max_attempts=cfg.dlq_max_attempts,
+        backoff_s=cfg.dlq_backoff_s,
+        on_dead_letter=on_dead_letter,
+    )
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Any, Literal, Optional, Dict, List
+from typing import Any, Literal, Optional, Dict, List, Tuple
 from datetime import datetime
 from pydantic import BaseModel, Field
 import uuid
@@ -22,7 +22,13 @@ class ClipEvent(BaseModel):
     clip_end_ts: datetime
     gcs_uri: str
     content_sha256: Optional[str] = None
+    # Segment PTS in seconds from the start of the source; clip_*_ts are these
+    # anchored to the source wall clock ("ingest" or "source", see clock).
+    pts_start_s: Optional[float] = None
+    pts_end_s: Optional[float] = None
+    clock: Optional[str] = None
     labels: Dict[str, Any] = Field(default_factory=dict)
+    spans: Dict[str, float] = Field(default_factory=dict)
 
 
 class ObservationEvent(BaseModel):
@@ -34,10 +40,13 @@ class ObservationEvent(BaseModel):
     use_case: UseCase
     clip_index: int
     ts: datetime
+    clip_start_ts: Optional[datetime] = None
+    clip_end_ts: Optional[datetime] = None
     summary: str
     entities: List[Dict[str, Any]] = Field(default_factory=list)
     signals: Dict[str, Any] = Field(default_factory=dict)
     model: Dict[str, Any] = Field(default_factory=dict)
+    spans: Dict[str, float] = Field(default_factory=dict)
 
 
 class StationSessionEvent(BaseModel):
@@ -55,6 +64,7 @@ class StationSessionEvent(BaseModel):
     session_video_gcs_uri: Optional[str] = None
     timeline: List[Dict[str, Any]] = Field(default_factory=list)
     summary: str = ""
+    spans: Dict[str, float] = Field(default_factory=dict)
 
 
 class DecisionEvent(BaseModel):
@@ -72,6 +82,7 @@ class DecisionEvent(BaseModel):
     rationale: Dict[str, Any]
     evidence: Dict[str, Any] = Field(default_factory=dict)
     model: Dict[str, Any] = Field(default_factory=dict)
+    spans: Dict[str, float] = Field(default_factory=dict)
 
 
 class ActionEvent(BaseModel):
@@ -85,6 +96,8 @@ class ActionEvent(BaseModel):
     status: Literal["sent", "skipped", "failed"]
     provider: str
     error: Optional[str] = None
+    model: Dict[str, Any] = Field(default_factory=dict)
+    spans: Dict[str, float] = Field(default_factory=dict)
 
 
 class AuditEvent(BaseModel):
@@ -95,5 +108,48 @@ class AuditEvent(BaseModel):
     payload: Dict[str, Any]
 
 
+class DeadLetterEvent(BaseModel):
+    dead_letter_id: str = Field(default_factory=new_id)
+    ts: datetime
+    group: str
+    source_topic: str
+    source_partition: int = -1
+    source_offset: int = -1
+    key: Optional[str] = None
+    error_class: str
+    error: str
+    attempts: int
+    payload: Optional[Dict[str, Any]] = None
+    raw: Optional[str] = None
+
+
+# Sent as Kafka headers (event_type, schema_version) by produce_model so
+# consumers can route and filter without decoding the payload. Bump a
+# version when a change is not backward compatible for readers.
+EVENT_TYPES: Dict[type, Tuple[str, str]] = {
+    ClipEvent: ("clip", "2"),
+    ObservationEvent: ("observation", "2"),
+    StationSessionEvent: ("session", "1"),
+    DecisionEvent: ("decision", "1"),
+    ActionEvent: ("action", "1"),
+    AuditEvent: ("audit", "1"),
+    DeadLetterEvent: ("dead_letter", "1"),
+}
+
+
+def event_kind(payload: Dict[str, Any]) -> str:
+    if "action_id" in payload:
+        return "action"
+    if "decision_id" in payload:
+        return "decision"
+    if "session_id" in payload:
+        return "session"
+    if "observation_id" in payload:
+        return "observation"
+    if "clip_id" in payload and "gcs_uri" in payload:
+        return "clip"
+    return "unknown"
+
+
 def schema_for(model_cls: type[BaseModel]) -> Dict[str, Any]:
     return model_cls.model_json_schema()
\ No newline at end of file
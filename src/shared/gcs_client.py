@@ -1,8 +1,16 @@
 from __future__ import annotations
 import hashlib
-from dataclasses import dataclass
-from typing import Optional, Tuple
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 from google.cloud import storage
+from ..config.settings import Settings
+from .metrics import REGISTRY
+
+BLOB_BYTES = REGISTRY.counter("sentinel_blob_bytes_total", "Bytes transferred to/from the blob store.", ("direction",))
+BLOB_OPS = REGISTRY.counter("sentinel_blob_operations_total", "Blob store operations by direction and outcome.", ("direction", "outcome"))
 
 
 @dataclass(frozen=True)
@@ -11,6 +19,15 @@ class GcsObjectRef:
     sha256: str
 
 
+@dataclass(frozen=True)
+class BlobInfo:
+    gcs_uri: str
+    object_path: str
+    size: int
+    created: Optional[datetime] = None
+    metadata: Dict[str, str] = field(default_factory=dict)
+
+
 def _parse_gs_uri(gs_uri: str) -> Tuple[str, str]:
     if not gs_uri.startswith("gs://"):
         raise ValueError(f"Invalid GCS URI: {gs_uri}")
@@ -43,11 +60,122 @@ class GcsClient:
         blob = bucket.blob(object_path)
         if metadata:
             blob.metadata = metadata
-        blob.upload_from_string(data, content_type=content_type)
+        try:
+            blob.upload_from_string(data, content_type=content_type)
+        except Exception:
+            BLOB_OPS.labels("upload", "error").inc()
+            raise
+        BLOB_OPS.labels("upload", "ok").inc()
+        BLOB_BYTES.labels("upload").inc(len(data))
         uri = f"gs://{bucket_name}/{object_path}"
         return GcsObjectRef(gcs_uri=uri, sha256=sha256_bytes(data))
 
     def download_bytes(self, gs_uri: str) -> bytes:
         bucket_name, object_path = _parse_gs_uri(gs_uri)
         blob = self._client.bucket(bucket_name).blob(object_path)
-        return blob.download_as_bytes()
\ No newline at end of file
+        try:
+            data = blob.download_as_bytes()
+        except Exception:
+            BLOB_OPS.labels("download", "error").inc()
+            raise
+        BLOB_OPS.labels("download", "ok").inc()
+        BLOB_BYTES.labels("download").inc(len(data))
+        return data
+
+    def list_blobs(self, bucket_name: str, prefix: str) -> Iterator[BlobInfo]:
+        for b in self._client.list_blobs(bucket_name, prefix=prefix):
+            yield BlobInfo(
+                gcs_uri=f"gs://{bucket_name}/{b.name}",
+                object_path=b.name,
+                size=int(b.size or 0),
+                created=b.time_created,
+                metadata=dict(b.metadata or {}),
+            )
+
+    def list_prefixes(self, bucket_name: str, prefix: str) -> List[str]:
+        it = self._client.list_blobs(bucket_name, prefix=prefix, delimiter="/")
+        for _ in it.pages:
+            pass
+        return sorted(it.prefixes)
+
+
+class LocalBlobStore:
+    # Filesystem stand-in for GcsClient: keeps gs:// URIs (and therefore the
+    # object layout) but stores bytes under <root>/<bucket>/<path>.
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, bucket_name: str, object_path: str) -> str:
+        return os.path.join(self.root, bucket_name, *object_path.split("/"))
+
+    def upload_bytes(
+        self,
+        bucket_name: str,
+        object_path: str,
+        data: bytes,
+        content_type: str = "video/mp4",
+        metadata: Optional[dict] = None,
+    ) -> GcsObjectRef:
+        fp = self._path(bucket_name, object_path)
+        os.makedirs(os.path.dirname(fp), exist_ok=True)
+        tmp = fp + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, fp)
+        BLOB_OPS.labels("upload", "ok").inc()
+        BLOB_BYTES.labels("upload").inc(len(data))
+        if metadata:
+            with open(fp + ".meta.json", "w", encoding="utf-8") as f:
+                json.dump({"content_type": content_type, "metadata": metadata}, f)
+        return GcsObjectRef(gcs_uri=f"gs://{bucket_name}/{object_path}", sha256=sha256_bytes(data))
+
+    def download_bytes(self, gs_uri: str) -> bytes:
+        bucket_name, object_path = _parse_gs_uri(gs_uri)
+        try:
+            with open(self._path(bucket_name, object_path), "rb") as f:
+                data = f.read()
+        except OSError:
+            BLOB_OPS.labels("download", "error").inc()
+            raise
+        BLOB_OPS.labels("download", "ok").inc()
+        BLOB_BYTES.labels("download").inc(len(data))
+        return data
+
+    def list_blobs(self, bucket_name: str, prefix: str) -> Iterator[BlobInfo]:
+        base = os.path.join(self.root, bucket_name)
+        start = self._path(bucket_name, prefix.rsplit("/", 1)[0]) if "/" in prefix else base
+        for dirpath, _, files in os.walk(start):
+            for name in files:
+                if name.endswith((".tmp", ".meta.json")):
+                    continue
+                fp = os.path.join(dirpath, name)
+                object_path = os.path.relpath(fp, base).replace(os.sep, "/")
+                if not object_path.startswith(prefix):
+                    continue
+                meta: Dict[str, str] = {}
+                if os.path.exists(fp + ".meta.json"):
+                    with open(fp + ".meta.json", "r", encoding="utf-8") as f:
+                        meta = dict(json.load(f).get("metadata") or {})
+                st = os.stat(fp)
+                yield BlobInfo(
+                    gcs_uri=f"gs://{bucket_name}/{object_path}",
+                    object_path=object_path,
+                    size=st.st_size,
+                    created=datetime.fromtimestamp(st.st_mtime, tz=timezone.utc),
+                    metadata=meta,
+                )
+
+    def list_prefixes(self, bucket_name: str, prefix: str) -> List[str]:
+        d = self._path(bucket_name, prefix.rstrip("/")) if prefix else os.path.join(self.root, bucket_name)
+        if not os.path.isdir(d):
+            return []
+        return sorted(f"{prefix}{name}/" for name in os.listdir(d) if os.path.isdir(os.path.join(d, name)))
+
+
+BlobStore = Union[GcsClient, LocalBlobStore]
+
+
+def make_blob_store(cfg: Settings) -> BlobStore:
+    if cfg.blob_store == "local":
+        return LocalBlobStore(cfg.local_blob_dir)
+    return GcsClient(project=cfg.gcp_project)
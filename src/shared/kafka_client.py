@@ -111,47 +111,522 @@
 from __future__ import annotations
 import json
 import os
-from typing import Any, Callable, Optional, Type
-from confluent_kafka import Producer, Consumer
+import queue
+import socket
+import threading
+import time
+import uuid
+import zlib
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Type, Union
+from confluent_kafka import OFFSET_END, Producer, Consumer, TopicPartition
 from confluent_kafka.schema_registry import SchemaRegistryClient, Schema
 from confluent_kafka.schema_registry.error import SchemaRegistryError
-from .events import ClipEvent, ObservationEvent, StationSessionEvent, DecisionEvent, ActionEvent, AuditEvent, schema_for
+from .events import EVENT_TYPES, ClipEvent, ObservationEvent, StationSessionEvent, DecisionEvent, ActionEvent, AuditEvent, DeadLetterEvent, schema_for
+from .metrics import QUEUE_DEPTH, REGISTRY
 from ..config.settings import Settings
 
+MESSAGES_PRODUCED = REGISTRY.counter("sentinel_kafka_messages_produced_total", "Messages produced per topic.", ("topic",))
+MESSAGES_CONSUMED = REGISTRY.counter("sentinel_kafka_messages_consumed_total", "Messages consumed per group and topic.", ("group", "topic"))
+MESSAGES_FILTERED = REGISTRY.counter("sentinel_kafka_messages_filtered_total", "Messages skipped on headers without decoding, per group and topic.", ("group", "topic"))
+HANDLER_ERRORS = REGISTRY.counter("sentinel_handler_errors_total", "Handler exceptions and Kafka poll errors per consumer group.", ("group", "kind"))
+HANDLER_SECONDS = REGISTRY.histogram("sentinel_handler_seconds", "Time spent in the message handler per consumer group.", ("group",))
+CONSUMER_LAG = REGISTRY.gauge("sentinel_kafka_consumer_lag", "Messages behind the log end per consumer group and topic.", ("group", "topic"))
+
+TRANSPORTS = ("confluent", "local", "memory")
+
+
+@dataclass
+class _Record:
+    topic: str
+    partition: int
+    offset: int
+    key: Optional[bytes]
+    value: bytes
+    headers: List[Tuple[str, bytes]]
+    timestamp_ms: int
+
+
+class MemoryMessage:
+    def __init__(self, rec: _Record):
+        self._rec = rec
+
+    def error(self):
+        return None
+
+    def value(self) -> bytes:
+        return self._rec.value
+
+    def key(self) -> Optional[bytes]:
+        return self._rec.key
+
+    def topic(self) -> str:
+        return self._rec.topic
+
+    def partition(self) -> int:
+        return self._rec.partition
+
+    def offset(self) -> int:
+        return self._rec.offset
+
+    def headers(self) -> Optional[List[Tuple[str, bytes]]]:
+        return list(self._rec.headers) or None
+
+    def timestamp(self) -> Tuple[int, int]:
+        return (1, self._rec.timestamp_ms)
+
+
+class _Partition:
+    def __init__(self):
+        self.base = 0
+        self.records: List[_Record] = []
+
+    @property
+    def end(self) -> int:
+        return self.base + len(self.records)
+
+
+class MemoryBroker:
+    # In-process partitioned log: keyed partitioning, consumer groups with
+    # round-robin partition assignment and committed offsets. Thread-safe;
+    # consumers block on a shared condition until data arrives.
+    def __init__(self, num_partitions: int = 6, retention: int = 200_000):
+        self.num_partitions = max(1, int(num_partitions))
+        self.retention = int(retention)
+        self._cond = threading.Condition()
+        self._topics: Dict[str, List[_Partition]] = {}
+        self._rr: Dict[str, int] = {}
+        self._committed: Dict[Tuple[str, str, int], int] = {}
+        self._members: Dict[str, Dict[str, List[str]]] = {}
+        self._assignment: Dict[str, Dict[str, List[Tuple[str, int]]]] = {}
+        self._generation: Dict[str, int] = {}
+
+    def _topic(self, topic: str) -> List[_Partition]:
+        parts = self._topics.get(topic)
+        if parts is None:
+            parts = [_Partition() for _ in range(self.num_partitions)]
+            self._topics[topic] = parts
+            for g in self._members:
+                self._rebalance(g)
+        return parts
+
+    def append(self, topic: str, value: bytes, key: Optional[bytes] = None, headers: Optional[List[Tuple[str, bytes]]] = None) -> _Record:
+        with self._cond:
+            parts = self._topic(topic)
+            if key is not None:
+                p = zlib.crc32(key) % len(parts)
+            else:
+                p = self._rr.get(topic, 0) % len(parts)
+                self._rr[topic] = p + 1
+            part = parts[p]
+            rec = _Record(topic, p, part.end, key, value, list(headers or []), int(time.time() * 1000))
+            part.records.append(rec)
+            if self.retention > 0 and len(part.records) > 2 * self.retention:
+                drop = len(part.records) - self.retention
+                del part.records[:drop]
+                part.base += drop
+            self._cond.notify_all()
+            return rec
+
+    def _rebalance(self, group: str) -> None:
+        members = self._members.get(group, {})
+        out: Dict[str, List[Tuple[str, int]]] = {m: [] for m in members}
+        for topic in sorted({t for ts in members.values() for t in ts}):
+            subs = sorted(m for m, ts in members.items() if topic in ts)
+            for p in range(len(self._topic(topic))):
+                out[subs[p % len(subs)]].append((topic, p))
+        self._assignment[group] = out
+        self._generation[group] = self._generation.get(group, 0) + 1
+        self._cond.notify_all()
+
+    def join(self, group: str, member: str, topics: List[str]) -> None:
+        with self._cond:
+            for t in topics:
+                self._topic(t)
+            self._members.setdefault(group, {})[member] = list(topics)
+            self._rebalance(group)
+
+    def leave(self, group: str, member: str) -> None:
+        with self._cond:
+            if self._members.get(group, {}).pop(member, None) is not None:
+                self._rebalance(group)
+
+    def assignment(self, group: str, member: str) -> Tuple[int, List[Tuple[str, int]]]:
+        with self._cond:
+            return self._generation.get(group, 0), list(self._assignment.get(group, {}).get(member, []))
+
+    def partitions(self, topic: str) -> int:
+        with self._cond:
+            return len(self._topic(topic))
+
+    def committed(self, group: str, topic: str, partition: int) -> Optional[int]:
+        with self._cond:
+            return self._committed.get((group, topic, partition))
+
+    def commit(self, group: str, topic: str, partition: int, offset: int) -> None:
+        with self._cond:
+            self._committed[(group, topic, partition)] = offset
+
+    def watermarks(self, topic: str, partition: int) -> Tuple[int, int]:
+        with self._cond:
+            part = self._topic(topic)[partition]
+            return part.base, part.end
+
+    def read(self, topic: str, partition: int, offset: int) -> Optional[_Record]:
+        part = self._topics[topic][partition]
+        i = max(offset, part.base) - part.base
+        return part.records[i] if i < len(part.records) else None
+
+    def wait(self, timeout: float) -> None:
+        with self._cond:
+            self._cond.wait(timeout)
+
+
+_memory_broker: Optional[MemoryBroker] = None
+_memory_lock = threading.Lock()
+
+
+def memory_broker(cfg: Optional[Settings] = None) -> MemoryBroker:
+    global _memory_broker
+    with _memory_lock:
+        if _memory_broker is None:
+            _memory_broker = MemoryBroker(num_partitions=(cfg.kafka_memory_partitions if cfg else 6))
+        return _memory_broker
+
+
+class MemoryProducer:
+    def __init__(self, broker: MemoryBroker):
+        self.broker = broker
+
+    def produce(self, topic: str, value: Optional[bytes] = None, key: Optional[bytes] = None, headers=None, on_delivery=None, callback=None) -> None:
+        if isinstance(headers, dict):
+            headers = list(headers.items())
+        hdrs = [(k, v.encode("utf-8") if isinstance(v, str) else v) for k, v in (headers or [])]
+        rec = self.broker.append(topic, value or b"", key=key, headers=hdrs)
+        cb = on_delivery or callback
+        if cb is not None:
+            cb(None, MemoryMessage(rec))
+
+    def poll(self, timeout: float = 0) -> int:
+        return 0
+
+    def flush(self, timeout: Optional[float] = None) -> int:
+        return 0
+
+    def __len__(self) -> int:
+        return 0
+
+
+class MemoryConsumer:
+    def __init__(self, broker: MemoryBroker, group_id: str, offset_reset: str = "earliest"):
+        self.broker = broker
+        self.group_id = group_id
+        self.offset_reset = offset_reset
+        self.member_id = f"{group_id}-{uuid.uuid4().hex[:8]}"
+        self._generation = -1
+        self._assigned: List[Tuple[str, int]] = []
+        self._positions: Dict[Tuple[str, int], int] = {}
+        self._next = 0
+        self._paused: set = set()
+        self._manual = False
+        self._closed = False
+
+    def subscribe(self, topics: List[str]) -> None:
+        self.broker.join(self.group_id, self.member_id, topics)
+        self._refresh()
+
+    def assign(self, partitions: List[Any]) -> None:
+        # Manual assignment: no group membership and no commits. A negative
+        # offset means the current log end, like OFFSET_END.
+        self._manual = True
+        self._assigned = [(tp.topic, tp.partition) for tp in partitions]
+        self._positions = {
+            (tp.topic, tp.partition): tp.offset if tp.offset >= 0 else self.broker.watermarks(tp.topic, tp.partition)[1]
+            for tp in partitions
+        }
+
+    def _refresh(self) -> None:
+        if self._manual:
+            return
+        gen, assigned = self.broker.assignment(self.group_id, self.member_id)
+        if gen == self._generation:
+            return
+        self._generation = gen
+        self._assigned = assigned
+        positions = {}
+        for t, p in assigned:
+            c = self.broker.committed(self.group_id, t, p)
+            if c is None:
+                lo, hi = self.broker.watermarks(t, p)
+                c = lo if self.offset_reset == "earliest" else hi
+                self.broker.commit(self.group_id, t, p, c)
+            positions[(t, p)] = c
+        self._positions = positions
+
+    def assignment(self) -> List[Tuple[str, int]]:
+        self._refresh()
+        return list(self._assigned)
+
+    def position(self, topic: str, partition: int) -> Optional[int]:
+        return self._positions.get((topic, partition))
+
+    def _try_read(self) -> Optional[MemoryMessage]:
+        n = len(self._assigned)
+        with self.broker._cond:
+            for i in range(n):
+                tp = self._assigned[(self._next + i) % n]
+                if tp in self._paused:
+                    continue
+                rec = self.broker.read(tp[0], tp[1], self._positions[tp])
+                if rec is None:
+                    continue
+                self._next = (self._next + i + 1) % n
+                self._positions[tp] = rec.offset + 1
+                if not self._manual:
+                    self.broker._committed[(self.group_id, tp[0], tp[1])] = rec.offset + 1
+                return MemoryMessage(rec)
+        return None
+
+    def poll(self, timeout: float = 1.0) -> Optional[MemoryMessage]:
+        if self._closed:
+            return None
+        deadline = time.time() + max(0.0, timeout)
+        while True:
+            self._refresh()
+            msg = self._try_read()
+            if msg is not None:
+                return msg
+            left = deadline - time.time()
+            if left <= 0:
+                return None
+            self.broker.wait(min(left, 0.5))
+
+    def pause(self, partitions: List[Any]) -> None:
+        self._paused.update((tp.topic, tp.partition) for tp in partitions)
+
+    def resume(self, partitions: List[Any]) -> None:
+        self._paused.difference_update((tp.topic, tp.partition) for tp in partitions)
+
+    def commit(self, *args, **kwargs) -> None:
+        return None
+
+    def close(self) -> None:
+        self._closed = True
+        if not self._manual:
+            self.broker.leave(self.group_id, self.member_id)
+
+
+class MemorySchemaRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids: Dict[str, int] = {}
+        self._subjects: Dict[str, List[int]] = {}
+        self._schemas: Dict[int, Any] = {}
+
+    def register_schema(self, subject: str, schema: Any, normalize_schemas: bool = False) -> int:
+        key = getattr(schema, "schema_str", None) or str(schema)
+        with self._lock:
+            sid = self._ids.get(key)
+            if sid is None:
+                sid = len(self._ids) + 1
+                self._ids[key] = sid
+                self._schemas[sid] = schema
+            versions = self._subjects.setdefault(subject, [])
+            if sid not in versions:
+                versions.append(sid)
+            return sid
+
+    def get_schema(self, schema_id: int) -> Any:
+        return self._schemas[schema_id]
+
+    def get_subjects(self) -> List[str]:
+        return sorted(self._subjects)
+
+
+_memory_registry = MemorySchemaRegistry()
+
+AnyProducer = Union[Producer, MemoryProducer]
+AnyConsumer = Union[Consumer, MemoryConsumer]
+
+_consumers: Dict[int, Tuple[str, AnyConsumer]] = {}
+_consumers_lock = threading.Lock()
+
+
+def _register_consumer(group_id: str, c: AnyConsumer) -> None:
+    with _consumers_lock:
+        _consumers[id(c)] = (group_id, c)
+
+
+def consumer_group(c: AnyConsumer) -> str:
+    entry = _consumers.get(id(c))
+    return entry[0] if entry else ""
+
+
+def _lag(c: AnyConsumer) -> Dict[str, int]:
+    out: Dict[str, int] = {}
+    if isinstance(c, MemoryConsumer):
+        for t, p in c.assignment():
+            pos = c.position(t, p)
+            if pos is None:
+                continue
+            _, hi = c.broker.watermarks(t, p)
+            out[t] = out.get(t, 0) + max(0, hi - pos)
+        return out
+    for tp in c.position(c.assignment()):
+        if tp.offset < 0:
+            continue
+        _, hi = c.get_watermark_offsets(TopicPartition(tp.topic, tp.partition), timeout=1.0, cached=True)
+        if hi >= 0:
+            out[tp.topic] = out.get(tp.topic, 0) + max(0, hi - tp.offset)
+    return out
+
+
+def consumer_lag() -> List[Tuple[Tuple[str, str], float]]:
+    with _consumers_lock:
+        entries = list(_consumers.values())
+    out = []
+    for group, c in entries:
+        try:
+            lag = _lag(c)
+        except Exception:
+            continue
+        out.extend(((group, t), float(n)) for t, n in lag.items())
+    return out
 
-def make_producer(cfg: Settings) -> Producer:
-    return Producer({
+
+CONSUMER_LAG.set_function(consumer_lag)
+
+
+def _client_config(cfg: Settings) -> Dict[str, Any]:
+    if cfg.kafka_transport == "local":
+        return {"bootstrap.servers": cfg.kafka_bootstrap or "localhost:9092"}
+    return {
         "bootstrap.servers": cfg.kafka_bootstrap,
         "security.protocol": cfg.kafka_security_protocol,
         "sasl.mechanisms": cfg.kafka_sasl_mechanisms,
         "sasl.username": cfg.kafka_api_key,
         "sasl.password": cfg.kafka_api_secret,
+    }
+
+
+def make_producer(cfg: Settings) -> AnyProducer:
+    if cfg.kafka_transport == "memory":
+        return MemoryProducer(memory_broker(cfg))
+    return Producer({
+        **_client_config(cfg),
         "linger.ms": 5,
         "acks": "all",
     })
 
 
-def make_consumer(cfg: Settings, group_id: str, topics: list[str], offset_reset: str = "earliest") -> Consumer:
+def ensure_topics(cfg: Settings, topics: List[str], partitions: int = 6) -> List[str]:
+    if cfg.kafka_transport == "memory":
+        return []
+    from confluent_kafka.admin import AdminClient, NewTopic
+
+    admin = AdminClient(_client_config(cfg))
+    existing = set(admin.list_topics(timeout=10).topics)
+    replication = 1 if cfg.kafka_transport == "local" else 3
+    new = [NewTopic(t, num_partitions=partitions, replication_factor=replication) for t in topics if t not in existing]
+    created = []
+    for t, fut in (admin.create_topics(new).items() if new else []):
+        fut.result()
+        created.append(t)
+        print(f"[kafka] created topic {t}")
+    return created
+
+
+def _seed_offsets(cfg: Settings, c: AnyConsumer, group_id: str, seed_from: str, topics: List[str]) -> int:
+    # A renamed group starts where the old one stopped instead of at
+    # auto.offset.reset. Only partitions the new group has never committed are
+    # seeded, so this is a no-op after the first start.
+    if isinstance(c, MemoryConsumer):
+        seeded = 0
+        for t in topics:
+            for p in range(c.broker.partitions(t)):
+                old = c.broker.committed(seed_from, t, p)
+                if old is not None and c.broker.committed(group_id, t, p) is None:
+                    c.broker.commit(group_id, t, p, old)
+                    seeded += 1
+        return seeded
+    tps = [TopicPartition(t, p) for t in topics for p in (c.list_topics(t, timeout=10).topics[t].partitions or {})]
+    if not tps:
+        return 0
+    prev = Consumer({**_client_config(cfg), "group.id": seed_from, "enable.auto.commit": False})
+    try:
+        old = {(tp.topic, tp.partition): tp.offset for tp in prev.committed(tps, timeout=10)}
+    finally:
+        prev.close()
+    seed = [
+        TopicPartition(tp.topic, tp.partition, old[(tp.topic, tp.partition)])
+        for tp in c.committed(tps, timeout=10)
+        if tp.offset < 0 and old.get((tp.topic, tp.partition), -1) >= 0
+    ]
+    if seed:
+        c.commit(offsets=seed, asynchronous=False)
+    return len(seed)
+
+
+def make_consumer(
+    cfg: Settings,
+    group_id: str,
+    topics: list[str],
+    offset_reset: str = "earliest",
+    seed_from: Optional[str] = None,
+) -> AnyConsumer:
     offset_reset = os.getenv("KAFKA_OFFSET_RESET", offset_reset)
-    c = Consumer({
-        "bootstrap.servers": cfg.kafka_bootstrap,
-        "group.id": group_id,
-        "auto.offset.reset": offset_reset,
-        "enable.auto.commit": True,
-        "security.protocol": cfg.kafka_security_protocol,
-        "sasl.mechanisms": cfg.kafka_sasl_mechanisms,
-        "sasl.username": cfg.kafka_api_key,
-        "sasl.password": cfg.kafka_api_secret,
-    })
+    group_id = group_id + cfg.consumer_group_suffix
+    if cfg.kafka_transport == "memory":
+        c: AnyConsumer = MemoryConsumer(memory_broker(cfg), group_id, offset_reset=offset_reset)
+    else:
+        c = Consumer({
+            **_client_config(cfg),
+            "group.id": group_id,
+            "auto.offset.reset": offset_reset,
+            "enable.auto.commit": True,
+        })
+    if seed_from:
+        try:
+            seeded = _seed_offsets(cfg, c, group_id, seed_from + cfg.consumer_group_suffix, topics)
+            if seeded:
+                print(f"[kafka] seeded {seeded} partition offsets for {group_id} from {seed_from}{cfg.consumer_group_suffix}")
+        except Exception as e:
+            print(f"[kafka] could not seed {group_id} from {seed_from}; starting at {offset_reset}: {e}")
     c.subscribe(topics)
+    _register_consumer(group_id, c)
     return c
 
 
-def make_schema_registry(cfg: Settings) -> SchemaRegistryClient:
-    return SchemaRegistryClient({
-        "url": cfg.schema_registry_url,
-        "basic.auth.user.info": f"{cfg.schema_registry_api_key}:{cfg.schema_registry_api_secret}",
-    })
+def make_tail_consumer(cfg: Settings, name: str, topics: List[str]) -> AnyConsumer:
+    # For per-process views (KPIs, live feed) that need every partition from
+    # "now" on: partitions are assigned manually at the log end and nothing is
+    # committed, so no consumer group is created on the broker and restarts
+    # leave nothing behind. The id only labels this host's lag metrics.
+    group_id = f"{name}-{socket.gethostname()}{cfg.consumer_group_suffix}"
+    if cfg.kafka_transport == "memory":
+        broker = memory_broker(cfg)
+        c: AnyConsumer = MemoryConsumer(broker, group_id, offset_reset="latest")
+        c.assign([TopicPartition(t, p, OFFSET_END) for t in topics for p in range(broker.partitions(t))])
+    else:
+        c = Consumer({
+            **_client_config(cfg),
+            "group.id": group_id,
+            "enable.auto.commit": False,
+            "enable.auto.offset.store": False,
+        })
+        meta = c.list_topics(timeout=10).topics
+        c.assign([TopicPartition(t, p, OFFSET_END) for t in topics for p in (meta[t].partitions if t in meta else {})])
+    _register_consumer(group_id, c)
+    return c
+
+
+def make_schema_registry(cfg: Settings) -> Union[SchemaRegistryClient, MemorySchemaRegistry]:
+    if cfg.kafka_transport == "memory" or not cfg.schema_registry_url:
+        return _memory_registry
+    conf: Dict[str, Any] = {"url": cfg.schema_registry_url}
+    if cfg.schema_registry_api_key:
+        conf["basic.auth.user.info"] = f"{cfg.schema_registry_api_key}:{cfg.schema_registry_api_secret}"
+    return SchemaRegistryClient(conf)
 
 
 def _subject_name(topic: str, record_name: str) -> str:
@@ -159,7 +634,7 @@ def _subject_name(topic: str, record_name: str) -> str:
 
 
 def register_json_schema(
-    sr: SchemaRegistryClient,
+    sr: Union[SchemaRegistryClient, MemorySchemaRegistry],
     topic: str,
     record_name: str,
     schema_dict: dict[str, Any],
@@ -183,6 +658,7 @@ def ensure_schemas(cfg: Settings) -> dict[str, int]:
     ids["ActionEvent"] = register_json_schema(sr, cfg.topic_actions, "ActionEvent", schema_for(ActionEvent))
     ids["AuditEvent"] = register_json_schema(sr, cfg.topic_audit, "AuditEvent", schema_for(AuditEvent))
     ids["StationSessionEvent"] = register_json_schema(sr, cfg.topic_sessions, "StationSessionEvent", schema_for(StationSessionEvent))
+    ids["DeadLetterEvent"] = register_json_schema(sr, cfg.topic_dead_letter, "DeadLetterEvent", schema_for(DeadLetterEvent))
     return ids
 
 
@@ -198,22 +674,162 @@ def bind_topic_models(cfg: Settings) -> None:
         cfg.topic_actions: ActionEvent,
         cfg.topic_audit: AuditEvent,
         cfg.topic_sessions: StationSessionEvent,
+        cfg.topic_dead_letter: DeadLetterEvent,
     }
 
 
-def produce_model(p: Producer, topic: str, model_obj: Any, key: Optional[str] = None) -> None:
+def event_headers(model_obj: Any) -> List[Tuple[str, bytes]]:
+    event_type, version = EVENT_TYPES.get(type(model_obj), (type(model_obj).__name__, "1"))
+    headers = [("event_type", event_type.encode("utf-8")), ("schema_version", version.encode("utf-8"))]
+    for name in ("use_case", "camera_id"):
+        v = getattr(model_obj, name, None)
+        if v:
+            headers.append((name, str(v).encode("utf-8")))
+    return headers
+
+
+def message_headers(msg: Any) -> Dict[str, str]:
+    return {k: (v or b"").decode("utf-8", errors="replace") for k, v in (msg.headers() or [])}
+
+
+def header_filter(**expected: str) -> Callable[[Dict[str, str]], bool]:
+    # Accepts a message unless a header it carries contradicts `expected`;
+    # messages from producers that predate headers fall through to the handler.
+    def accept(headers: Dict[str, str]) -> bool:
+        return all(headers.get(k, v) == v for k, v in expected.items())
+
+    return accept
+
+
+def produce_model(p: AnyProducer, topic: str, model_obj: Any, key: Optional[str] = None) -> None:
     payload = model_obj.model_dump(mode="json")
     data = json.dumps(payload).encode("utf-8")
-    p.produce(topic, value=data, key=(key.encode("utf-8") if key else None))
+    p.produce(topic, value=data, key=(key.encode("utf-8") if key else None), headers=event_headers(model_obj))
+    MESSAGES_PRODUCED.labels(topic).inc()
+
+
+def _poll(c: AnyConsumer, group: str, accept: Optional[Callable[[Dict[str, str]], bool]], timeout: float) -> Optional[Any]:
+    msg = c.poll(timeout)
+    if msg is None:
+        return None
+    if msg.error():
+        HANDLER_ERRORS.labels(group, "kafka").inc()
+        print("Kafka error:", msg.error())
+        return None
+    MESSAGES_CONSUMED.labels(group, msg.topic()).inc()
+    if accept is not None and not accept(message_headers(msg)):
+        MESSAGES_FILTERED.labels(group, msg.topic()).inc()
+        return None
+    return msg
+
+
+def _messages(c: AnyConsumer, group: str, accept: Optional[Callable[[Dict[str, str]], bool]] = None) -> Iterator[Any]:
+    while True:
+        msg = _poll(c, group, accept, 1.0)
+        if msg is not None:
+            yield msg
+
 
+def _handle(msg: Any, handler: Callable[..., None], group: str, dead_letter: Optional[Any], with_headers: bool = False) -> None:
+    t0 = time.perf_counter()
+    if with_headers:
+        headers = message_headers(msg)
+        inner = handler
+        handler = lambda payload: inner(payload, headers)
+    try:
+        if dead_letter is not None:
+            dead_letter.process(msg, handler)
+        else:
+            handler(json.loads(msg.value().decode("utf-8")))
+    except Exception:
+        HANDLER_ERRORS.labels(group, "handler").inc()
+        raise
+    finally:
+        HANDLER_SECONDS.labels(group).observe(time.perf_counter() - t0)
+
+
+def consume_loop(
+    c: AnyConsumer,
+    handler: Callable[..., None],
+    dead_letter: Optional[Any] = None,
+    accept: Optional[Callable[[Dict[str, str]], bool]] = None,
+    with_headers: bool = False,
+) -> None:
+    # Without a dead_letter policy a handler exception ends the loop; with one
+    # it is retried and then parked on the DLQ (see shared/dead_letter.py).
+    # `accept` sees only the headers, so rejected messages are never decoded;
+    # with_headers passes them to the handler as a second argument.
+    group = consumer_group(c)
+    for msg in _messages(c, group, accept):
+        _handle(msg, handler, group, dead_letter, with_headers)
+
+
+def consume_sharded(
+    c: AnyConsumer,
+    handler: Callable[[dict[str, Any]], None],
+    workers: int,
+    key: Callable[[dict[str, Any]], str],
+    name: str,
+    queue_size: int = 32,
+    dead_letter: Optional[Any] = None,
+    accept: Optional[Callable[[Dict[str, str]], bool]] = None,
+) -> None:
+    # Fans messages out to `workers` threads by key, so per-key order holds.
+    # A message whose shard is full is held and its source partition paused;
+    # later messages from that partition queue behind it, while the other
+    # partitions keep feeding their shards. A slow key therefore stalls its
+    # shard and its own partition (and any keys sharing that partition), not
+    # the whole poll loop, and nothing is buffered without bound.
+    if workers <= 1:
+        consume_loop(c, handler, dead_letter=dead_letter, accept=accept)
+        return
+    group = consumer_group(c)
+    depth = QUEUE_DEPTH.labels(name)
+    shards = [queue.Queue(maxsize=queue_size) for _ in range(workers)]
+
+    def work(q: "queue.Queue[Any]") -> None:
+        while True:
+            msg = q.get()
+            try:
+                _handle(msg, handler, group, dead_letter)
+            except Exception as e:
+                print(f"[{name}] handler error:", e)
+            finally:
+                depth.dec()
+
+    for i, q in enumerate(shards):
+        threading.Thread(target=work, args=(q,), name=f"{name}-{i}", daemon=True).start()
+
+    held: Dict[Tuple[str, int], List[Tuple["queue.Queue[Any]", Any]]] = {}
+
+    def offer(q: "queue.Queue[Any]", msg: Any) -> bool:
+        try:
+            q.put_nowait(msg)
+            return True
+        except queue.Full:
+            return False
 
-def consume_loop(c: Consumer, handler: Callable[[dict[str, Any]], None]) -> None:
     while True:
-        msg = c.poll(1.0)
+        for tp, pending in list(held.items()):
+            while pending and offer(*pending[0]):
+                pending.pop(0)
+            if not pending:
+                del held[tp]
+                c.resume([TopicPartition(*tp)])
+        msg = _poll(c, group, accept, 0.05 if held else 1.0)
         if msg is None:
             continue
-        if msg.error():
-            print("Kafka error:", msg.error())
-            continue
-        payload = json.loads(msg.value().decode("utf-8"))
-        handler(payload)
\ No newline at end of file
+        k = msg.key()
+        if k is None:
+            try:
+                k = str(key(json.loads(msg.value().decode("utf-8")))).encode("utf-8")
+            except ValueError:
+                k = b""
+        depth.inc()
+        q = shards[zlib.crc32(k) % workers]
+        tp = (msg.topic(), msg.partition())
+        if tp in held:
+            held[tp].append((q, msg))
+        elif not offer(q, msg):
+            held[tp] = [(q, msg)]
+            c.pause([TopicPartition(*tp)])
@@ -0,0 +1,245 @@
+from __future__ import annotations
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v))
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, n: float = 1.0) -> None:
+        with self._lock:
+            self.value += n
+
+    def dec(self, n: float = 1.0) -> None:
+        with self._lock:
+            self.value -= n
+
+    def set(self, v: float) -> None:
+        self.value = float(v)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, _Value] = {}
+        self._lock = threading.Lock()
+        self._fn: Optional[Callable[[], Iterable[Tuple[LabelValues, float]]]] = None
+
+    def labels(self, *values: str, **kv: str) -> _Value:
+        key = tuple(str(v) for v in values) if values else tuple(str(kv.get(n, "")) for n in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, _Value())
+        return child
+
+    def set_function(self, fn: Callable[[], Iterable[Tuple[LabelValues, float]]]) -> None:
+        self._fn = fn
+
+    def samples(self) -> List[Tuple[LabelValues, float]]:
+        with self._lock:
+            out = [(k, c.value) for k, c in self._children.items()]
+        if self._fn is not None:
+            try:
+                out.extend((tuple(str(x) for x in k), float(v)) for k, v in self._fn())
+            except Exception as e:
+                print(f"[metrics] {self.name} collector failed:", e)
+        return out
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, v in self.samples():
+            out.append(f"{self.name}{_labels(self.labelnames, key)} {_fmt(v)}")
+        return out
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, n: float = 1.0, **kv: str) -> None:
+        self.labels(**kv).inc(n)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_counts", "_sum", "_count", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, v: float) -> None:
+        i = bisect.bisect_left(self._bounds, v)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += v
+            self._count += 1
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        with self._lock:
+            return list(self._counts), self._sum, self._count
+
+    def quantile(self, q: float) -> Optional[float]:
+        counts, _, total = self.snapshot()
+        if total == 0:
+            return None
+        rank = q * total
+        seen = 0
+        for i, c in enumerate(counts):
+            if c and seen + c >= rank:
+                lo = self._bounds[i - 1] if i > 0 else 0.0
+                if i >= len(self._bounds):
+                    return lo
+                hi = self._bounds[i]
+                return lo + (hi - lo) * ((rank - seen) / c)
+            seen += c
+        return self._bounds[-1]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS_S):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        self._children: Dict[LabelValues, _HistogramChild] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values: str, **kv: str) -> _HistogramChild:
+        key = tuple(str(v) for v in values) if values else tuple(str(kv.get(n, "")) for n in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, _HistogramChild(self.buckets))
+        return child
+
+    def observe(self, v: float, **kv: str) -> None:
+        self.labels(**kv).observe(v)
+
+    def series(self) -> List[Tuple[LabelValues, _HistogramChild]]:
+        with self._lock:
+            return list(self._children.items())
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, child in self.series():
+            counts, total_sum, total = child.snapshot()
+            acc = 0
+            for b, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, ('le', _fmt(b)))} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total_sum}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {total}")
+        return out
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = cls(name, *args, **kwargs)
+                self._metrics[name] = m
+            elif not isinstance(m, cls):
+                raise ValueError(f"metric {name} already registered as {type(m).__name__}")
+            return m
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS_S) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets)
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for m in metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+CACHE_REQUESTS = REGISTRY.counter("sentinel_cache_requests_total", "Cache lookups by cache and result.", ("cache", "result"))
+QUEUE_DEPTH = REGISTRY.gauge("sentinel_queue_depth", "Items waiting or in progress per in-process queue.", ("queue",))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = REGISTRY
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        return
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0", registry: MetricsRegistry = REGISTRY) -> ThreadingHTTPServer:
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, int(port)), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    print(f"[metrics] exporter listening on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+from typing import List, Literal
+from pydantic import BaseModel, Field
+
+# Output contracts for every agent's model call. They are sent as the
+# response schema (model_backend.gemini_response_schema) and decoded once with
+# model_validate_json; the prompts describe meaning, not layout.
+
+YesNo = Literal["yes", "no", "uncertain"]
+Level = Literal["low", "medium", "high"]
+ActionType = Literal["stop_line", "alert"]
+Priority = Literal["P1", "P2", "P3"]
+
+
+class AssemblySignals(BaseModel):
+    phase: Literal["idle", "board_in", "work", "board_out", "uncertain"]
+    board_present: YesNo
+    motion: Literal["left_to_right", "none", "uncertain"]
+    primary_action: Literal["acquire", "place", "insert", "inspect", "use_tool", "advance", "none", "uncertain"]
+    tools_seen: List[str] = Field(default_factory=list)
+    uncertainty: Level
+    confidence_note: str
+
+
+class AssemblyObservation(BaseModel):
+    summary: str
+    signals: AssemblySignals
+
+
+class SecuritySignals(BaseModel):
+    people_present: YesNo
+    people_count: Literal["0", "1", "2", "3+", "uncertain"]
+    walkway_violation: YesNo
+    restricted_area_entry: YesNo
+    machine_operating: YesNo
+    panel_open: YesNo
+    guard_open: YesNo
+    unsafe_proximity_to_machine: YesNo
+    safety_flags: List[
+        Literal[
+            "walkway_violation",
+            "restricted_area",
+            "panel_open_while_operating",
+            "guard_open_while_operating",
+            "unsafe_proximity",
+            "distracted_operator",
+            "ppe_missing",
+            "near_miss",
+        ]
+    ] = Field(default_factory=list)
+    notable_actions: List[str] = Field(default_factory=list)
+    uncertainty: Level
+    confidence_note: str
+
+
+class SecurityObservation(BaseModel):
+    summary: str
+    signals: SecuritySignals
+
+
+class RecommendedAction(BaseModel):
+    type: ActionType
+    target: str = "console"
+    message: str
+    priority: Priority
+
+
+class Citation(BaseModel):
+    chunk_id: str = ""
+    step_id: str = ""
+    sop_version: str = ""
+
+
+class Rationale(BaseModel):
+    short: str
+    citations: List[Citation] = Field(default_factory=list)
+
+
+class Evidence(BaseModel):
+    reason: str
+    clip_range: List[int]
+
+
+class SecurityAssessment(BaseModel):
+    violation: bool
+    rule_id: str
+    severity: Level
+    confidence: float = Field(ge=0.0, le=1.0)
+    risk: str
+
+
+class SecurityDecision(BaseModel):
+    assessment: SecurityAssessment
+    recommended_actions: List[RecommendedAction] = Field(default_factory=list)
+    rationale: Rationale
+    evidence: Evidence
+
+
+class CompletedStep(BaseModel):
+    step_id: str
+    evidence: str
+    confidence: float = Field(ge=0.0, le=1.0)
+
+
+class MissingStep(BaseModel):
+    step_id: str
+    why_missing: str
+    confidence: float = Field(ge=0.0, le=1.0)
+
+
+class SopAssessment(BaseModel):
+    sop_violation: bool
+    severity: Level
+    confidence: float = Field(ge=0.0, le=1.0)
+    risk: str
+
+
+class AssemblyDecision(BaseModel):
+    completed_steps: List[CompletedStep] = Field(default_factory=list)
+    missing_steps: List[MissingStep] = Field(default_factory=list)
+    assessment: SopAssessment
+    recommended_actions: List[RecommendedAction] = Field(default_factory=list)
+    rationale: Rationale
+    evidence: Evidence
+
+
+class DoerAction(BaseModel):
+    type: ActionType
+    target: str = "console"
+    priority: Priority
+    message: str
+    execution_steps: List[str] = Field(default_factory=list)
+    notes: str = ""
+
+
+class DoerPlan(BaseModel):
+    actions: List[DoerAction] = Field(default_factory=list)
@@ -0,0 +1,175 @@
+from __future__ import annotations
+import heapq
+import itertools
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Type, TypeVar
+from .metrics import REGISTRY
+
+T = TypeVar("T")
+
+LIMITER_WAIT_SECONDS = REGISTRY.histogram("sentinel_limiter_wait_seconds", "Time spent waiting for a limiter slot.", ("limiter", "priority"))
+LIMITER_RETRIES = REGISTRY.counter("sentinel_limiter_retries_total", "Retried calls after a retryable error.", ("limiter", "priority"))
+LIMITER_CONCURRENCY = REGISTRY.gauge("sentinel_limiter_concurrency", "Adaptive concurrency limit and calls in flight.", ("limiter", "kind"))
+
+
+class TokenBucket:
+    def __init__(self, rate_per_s: float, capacity: float | None = None):
+        self.rate = float(rate_per_s)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate_per_s))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self, n: float = 1.0) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= n:
+                self._tokens -= n
+                return 0.0
+            return (n - self._tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def refund(self, n: float = 1.0) -> None:
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + n)
+
+    def acquire(self, n: float = 1.0) -> None:
+        if self.rate <= 0:
+            return
+        n = min(float(n), self.capacity)
+        while True:
+            wait = self.try_acquire(n)
+            if wait <= 0:
+                return
+            time.sleep(min(wait, 1.0))
+
+
+class AdaptiveLimiter:
+    # Admission for one upstream quota (a model). Callers queue by priority
+    # (lower value first) and are admitted while in-flight calls are under an
+    # AIMD limit: +1/limit per call that finishes under the latency target,
+    # halved on a retryable error or a call slower than twice the target.
+    # Callers above the top priority may not take the last slot, so a burst
+    # of low-priority work never blocks the most urgent path outright.
+    # Optional request and token buckets cap the sustained rate on top.
+    def __init__(
+        self,
+        name: str,
+        rpm: float = 0.0,
+        tpm: float = 0.0,
+        min_concurrency: int = 1,
+        max_concurrency: int = 16,
+        target_latency_s: float = 0.0,
+        max_retries: int = 4,
+        retryable: Tuple[Type[BaseException], ...] = (),
+        backoff_base_s: float = 0.5,
+        backoff_cap_s: float = 20.0,
+    ):
+        self.name = name
+        self.min_limit = max(1, int(min_concurrency))
+        self.max_limit = max(self.min_limit, int(max_concurrency))
+        self.limit = float(self.max_limit)
+        self.target_latency_s = float(target_latency_s)
+        self.max_retries = int(max_retries)
+        self.retryable = tuple(retryable)
+        self.backoff_base_s = float(backoff_base_s)
+        self.backoff_cap_s = float(backoff_cap_s)
+        self.requests = TokenBucket(rpm / 60.0, capacity=max(1.0, rpm / 60.0 * 5)) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm / 60.0, capacity=max(1.0, tpm / 60.0 * 5)) if tpm > 0 else None
+        self.in_flight = 0
+        self._waiters: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._limit_gauge = LIMITER_CONCURRENCY.labels(name, "limit")
+        self._in_flight_gauge = LIMITER_CONCURRENCY.labels(name, "in_flight")
+        self._limit_gauge.set(self.limit)
+
+    def _bucket_wait(self, cost: float) -> float:
+        if self.requests is not None:
+            wait = self.requests.try_acquire(1.0)
+            if wait > 0:
+                return wait
+        if self.tokens is not None:
+            wait = self.tokens.try_acquire(min(cost, self.tokens.capacity))
+            if wait > 0:
+                if self.requests is not None:
+                    self.requests.refund(1.0)
+                return wait
+        return 0.0
+
+    def acquire(self, priority: int = 0, cost: float = 0.0) -> None:
+        t0 = time.monotonic()
+        me = (int(priority), next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, me)
+            try:
+                while True:
+                    headroom = 1 if priority > 0 and self.limit >= 2 else 0
+                    wait = None
+                    if self._waiters[0] == me and self.in_flight < int(self.limit) - headroom:
+                        wait = self._bucket_wait(cost)
+                        if wait <= 0:
+                            break
+                    self._cond.wait(timeout=min(wait, 1.0) if wait else 1.0)
+            finally:
+                self._waiters.remove(me)
+                heapq.heapify(self._waiters)
+            self.in_flight += 1
+            self._in_flight_gauge.set(self.in_flight)
+            self._cond.notify_all()
+        LIMITER_WAIT_SECONDS.labels(self.name, str(priority)).observe(time.monotonic() - t0)
+
+    def release(self, latency_s: Optional[float] = None, throttled: bool = False) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            slow = self.target_latency_s > 0 and latency_s is not None and latency_s > 2 * self.target_latency_s
+            if throttled or slow:
+                self.limit = max(float(self.min_limit), self.limit / 2)
+            elif latency_s is not None and (self.target_latency_s <= 0 or latency_s <= self.target_latency_s):
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self._limit_gauge.set(self.limit)
+            self._in_flight_gauge.set(self.in_flight)
+            self._cond.notify_all()
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_cap_s, self.backoff_base_s * (2 ** attempt)))
+
+    def call(self, fn: Callable[[], T], priority: int = 0, cost: float = 0.0) -> T:
+        attempt = 0
+        while True:
+            self.acquire(priority, cost)
+            t0 = time.monotonic()
+            try:
+                out = fn()
+            except self.retryable as e:
+                self.release(throttled=True)
+                if attempt >= self.max_retries:
+                    raise
+                sleep_s = self.backoff(attempt)
+                attempt += 1
+                LIMITER_RETRIES.labels(self.name, str(priority)).inc()
+                print(f"[limiter] {self.name} p{priority} retry {attempt}/{self.max_retries} in {sleep_s:.1f}s: {type(e).__name__}")
+                time.sleep(sleep_s)
+                continue
+            except BaseException:
+                self.release()
+                raise
+            self.release(time.monotonic() - t0)
+            return out
+
+
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def shared_limiter(name: str, factory: Callable[[], AdaptiveLimiter]) -> AdaptiveLimiter:
+    with _limiters_lock:
+        lim = _limiters.get(name)
+        if lim is None:
+            lim = _limiters[name] = factory()
+        return lim
@@ -0,0 +1,173 @@
+from __future__ import annotations
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from ..config.settings import Settings
+from .metrics import REGISTRY
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+# Span stamps are wall-clock epoch seconds keyed "<stage>.<point>" (plus
+# "clip_end", when the source clip was closed on the ingest host, even under
+# CLIP_CLOCK=source). Points are consume/produce and
+# <name>_start/<name>_end pairs. Every event copies its upstream stamps and
+# adds its own, so the final ActionEvent carries the whole path.
+Spans = Dict[str, float]
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "sentinel_stage_seconds",
+    "Per-stage latency: queue (upstream produce to consume), model call, and handle (consume to produce).",
+    ("stage", "use_case"),
+)
+CLIP_TO_ACTION_SECONDS = REGISTRY.histogram(
+    "sentinel_clip_to_action_seconds",
+    "End-to-end latency from clip end to the produced action.",
+    ("use_case",),
+)
+
+
+def stamp(spans: Spans, name: str, t: Optional[float] = None) -> Spans:
+    spans[name] = round(time.time() if t is None else t, 3)
+    return spans
+
+
+def carry(spans: Optional[Dict[str, Any]]) -> Spans:
+    out: Spans = {}
+    for k, v in (spans or {}).items():
+        try:
+            out[str(k)] = float(v)
+        except (TypeError, ValueError):
+            continue
+    return out
+
+
+def _upstream_produce(spans: Spans, stage: str, before: float) -> Optional[float]:
+    best = None
+    for k, v in spans.items():
+        if k.endswith(".produce") and not k.startswith(stage + ".") and v <= before:
+            best = v if best is None or v > best else best
+    return best
+
+
+def stage_durations(stage: str, spans: Spans) -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    prefix = stage + "."
+    consumed = spans.get(prefix + "consume")
+    if consumed is not None:
+        up = _upstream_produce(spans, stage, consumed)
+        if up is None:
+            up = spans.get("clip_end")
+        if up is not None:
+            out[prefix + "queue"] = consumed - up
+        if prefix + "produce" in spans:
+            out[prefix + "handle"] = spans[prefix + "produce"] - consumed
+    for k, start in spans.items():
+        if k.startswith(prefix) and k.endswith("_start"):
+            end = spans.get(k[: -len("_start")] + "_end")
+            if end is not None:
+                out[k[: -len("_start")]] = end - start
+    return out
+
+
+def finish_stage(stage: str, use_case: str, trace_id: str, spans: Spans) -> None:
+    for name, secs in stage_durations(stage, spans).items():
+        if secs >= 0:
+            STAGE_SECONDS.labels(name, use_case).observe(secs)
+    if stage == "doer" and "clip_end" in spans and "doer.produce" in spans:
+        CLIP_TO_ACTION_SECONDS.labels(use_case).observe(max(0.0, spans["doer.produce"] - spans["clip_end"]))
+    exporter = _exporter
+    if exporter is not None:
+        exporter.export(stage, use_case, trace_id, spans)
+
+
+def latency_summary(quantiles=(0.5, 0.95, 0.99)) -> Dict[str, Any]:
+    def q(child) -> Dict[str, Any]:
+        _, total_sum, total = child.snapshot()
+        out = {f"p{int(x * 100)}": (round(child.quantile(x), 4) if total else None) for x in quantiles}
+        out["count"] = total
+        out["mean"] = round(total_sum / total, 4) if total else None
+        return out
+
+    return {
+        "clip_to_action": {key[0]: q(c) for key, c in CLIP_TO_ACTION_SECONDS.series()},
+        "stages": {f"{key[1]}:{key[0]}": q(c) for key, c in STAGE_SECONDS.series()},
+    }
+
+
+class SpanExporter:
+    # "console"/"file" write one JSON line per finished stage; "otel" replays
+    # the stamps as OpenTelemetry spans on whatever tracer provider is configured.
+    def __init__(self, kind: str, path: str = ""):
+        self.kind = kind
+        self.path = path
+        self._lock = threading.Lock()
+        self._tracer = otel_trace.get_tracer("sentinel") if (kind == "otel" and otel_trace is not None) else None
+
+    def export(self, stage: str, use_case: str, trace_id: str, spans: Spans) -> None:
+        if self.kind == "otel":
+            self._export_otel(stage, use_case, trace_id, spans)
+            return
+        rec = {"trace_id": trace_id, "stage": stage, "use_case": use_case, "spans": spans, "durations": stage_durations(stage, spans)}
+        line = json.dumps(rec)
+        with self._lock:
+            if self.kind == "file":
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            else:
+                sys.stdout.write(f"[trace] {line}\n")
+
+    def _export_otel(self, stage: str, use_case: str, trace_id: str, spans: Spans) -> None:
+        if self._tracer is None:
+            return
+        start = spans.get(f"{stage}.consume")
+        end = spans.get(f"{stage}.produce")
+        if start is None or end is None:
+            return
+        attrs = {"sentinel.trace_id": trace_id, "sentinel.use_case": use_case}
+        parent = self._tracer.start_span(stage, start_time=int(start * 1e9), attributes=attrs)
+        ctx = otel_trace.set_span_in_context(parent)
+        for k, t0 in spans.items():
+            if k.startswith(stage + ".") and k.endswith("_start") and k[:-6] + "_end" in spans:
+                child = self._tracer.start_span(k[:-6], context=ctx, start_time=int(t0 * 1e9), attributes=attrs)
+                child.end(end_time=int(spans[k[:-6] + "_end"] * 1e9))
+        parent.end(end_time=int(end * 1e9))
+
+
+_exporter: Optional[SpanExporter] = None
+
+
+def configure_tracing(cfg: Settings) -> Optional[SpanExporter]:
+    global _exporter
+    kind = cfg.trace_exporter
+    if kind in ("", "none"):
+        _exporter = None
+    elif kind == "otel" and otel_trace is None:
+        print("[trace] TRACE_EXPORTER=otel but opentelemetry is not installed; span export disabled")
+        _exporter = None
+    elif kind in ("console", "file", "otel"):
+        if kind == "file":
+            os.makedirs(os.path.dirname(cfg.trace_file_path) or ".", exist_ok=True)
+        _exporter = SpanExporter(kind, cfg.trace_file_path)
+    else:
+        raise ValueError(f"Unknown TRACE_EXPORTER: {kind!r} (expected none|console|file|otel)")
+    return _exporter
+
+
+def summarize_action_spans(rows: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    by_uc: Dict[str, List[float]] = {}
+    for r in rows:
+        spans = carry(r.get("spans"))
+        if "clip_end" in spans and "doer.produce" in spans:
+            by_uc.setdefault(str(r.get("use_case", "")), []).append(spans["doer.produce"] - spans["clip_end"])
+    out: Dict[str, Dict[str, Any]] = {}
+    for uc, v in sorted(by_uc.items()):
+        v.sort()
+        pick = lambda p: round(v[min(len(v) - 1, int(p * (len(v) - 1) + 0.5))], 3)
+        out[uc] = {"n": len(v), "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99)}
+    return out
@@ -0,0 +1,97 @@
+from __future__ import annotations
+import json
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+from src.agents.thinker import thinker as thinker_mod
+from src.agents.thinker.incidents import SecurityWindow
+from src.config.settings import load_settings
+from src.shared.events import ObservationEvent
+from src.shared.model_backend import ModelBackend, ModelResponse
+
+ROOT = Path(__file__).resolve().parents[1]
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def test_rejected_incident_is_handed_back_after_k_more_hits():
+    w = SecurityWindow(window_clips=4, min_hits=2)
+    assert w.observe("cam", 0, T0, "walkway")[0] is None
+    inc, _ = w.observe("cam", 1, T0, "walkway")
+    assert inc is not None and inc.hits == 2
+    w.reject(inc)
+    assert w.observe("cam", 2, T0, "walkway")[0] is None
+    again, _ = w.observe("cam", 3, T0, "walkway")
+    assert again is inc and inc.hits == 4 and inc.clip_range == [0, 3]
+    assert w.observe("cam", 4, T0, "walkway")[0] is None
+
+
+class _ScriptedModel(ModelBackend):
+    name = "scripted"
+
+    def __init__(self, violations):
+        self.violations = list(violations)
+        self.calls = 0
+
+    def generate(self, task, parts, temperature=0.0, max_output_tokens=10000, response_schema=None):
+        violation = self.violations[min(self.calls, len(self.violations) - 1)]
+        self.calls += 1
+        out = {
+            "assessment": {"violation": violation, "rule_id": "restricted_area_entry", "severity": "medium", "confidence": 0.8, "risk": "entry"},
+            "recommended_actions": [{"type": "alert", "target": "console", "message": "entry", "priority": "P2"}] if violation else [],
+            "rationale": {"short": "scripted", "citations": []},
+            "evidence": {"reason": "scripted", "clip_range": [0, 0]},
+        }
+        return ModelResponse(text=json.dumps(out), model=self.name, latency_ms=0)
+
+
+@pytest.fixture
+def thinker(monkeypatch):
+    monkeypatch.setenv("KAFKA_TRANSPORT", "memory")
+    monkeypatch.setenv("MODEL_BACKEND", "stub")
+    monkeypatch.setenv("SECURITY_RULES_PATH", str(ROOT / "data/rules/security_rules.json"))
+    monkeypatch.setenv("ASSEMBLY_SOP_PATH", str(ROOT / "data/sop/assembly_sop.json"))
+    monkeypatch.setenv("ASSEMBLY_VIDEO_PATH", "unused.mp4")
+    monkeypatch.setenv("SECURITY_VIDEO_PATH", "unused.mp4")
+    decisions = []
+    monkeypatch.setattr(thinker_mod, "produce_model", lambda p, topic, ev, key=None: decisions.append(ev))
+
+    def make(model):
+        svc = thinker_mod.ThinkerService(load_settings(str(ROOT / "tests/.env.none")), model=model)
+        return svc, decisions
+
+    return make
+
+
+def _obs(clip_index, signals):
+    return ObservationEvent(
+        trace_id="t",
+        clip_id=f"c{clip_index}",
+        clip_gcs_uri=f"gs://b/c{clip_index}.mp4",
+        camera_id="cam-1",
+        use_case="security",
+        clip_index=clip_index,
+        ts=T0 + timedelta(seconds=2 * clip_index),
+        summary="",
+        signals=signals,
+    ).model_dump(mode="json")
+
+
+def test_rejected_violation_that_keeps_going_is_reevaluated(thinker):
+    model = _ScriptedModel([False, True])
+    svc, decisions = thinker(model)
+    for i in range(6):
+        svc.handle_security_observation(_obs(i, {"restricted_area_entry": "yes"}))
+    assert model.calls == 2
+    assert len(decisions) == 1
+    assert decisions[0].evidence["clip_range"] == [0, 3]
+
+
+def test_backlog_burst_is_not_swallowed_by_a_wall_clock_cooldown(thinker):
+    svc, decisions = thinker(_ScriptedModel([True]))
+    hit = {"panel_open": "yes", "machine_operating": "yes"}
+    svc.handle_security_observation(_obs(0, hit))
+    for i in range(5, 13):
+        svc.handle_security_observation(_obs(i, hit))
+    assert [d.evidence["clip_range"][0] for d in decisions] == [0, 5]